@@ -16,15 +16,26 @@
 
 import logging
 import os
+import threading
+import time
 
 from oslo_concurrency import processutils
+import yaml
 
+from os_net_config import bridge
+from os_net_config import ethtool
 from os_net_config import objects
+from os_net_config import steering
+from os_net_config import topology
 from os_net_config import utils
+from os_net_config import version
 
 
 logger = logging.getLogger(__name__)
 
+# The line identifying the link up hooks os-net-config wrote
+_HOOK_HEADER = '# This file is autogenerated by os-net-config'
+
 
 class NotImplemented(Exception):
     pass
@@ -33,10 +44,119 @@ class NotImplemented(Exception):
 class NetConfig(object):
     """Common network config methods class."""
 
+    # An optional render_cache.RenderCache shared by the provider
+    render_cache = None
+    # An optional state.StateStore recording the files written
+    state = None
+    # Whether the routes are installed by a reconcile.RouteReconciler
+    # after apply, in which case devices whose routes alone changed do
+    # not need to be restarted
+    reconcile_routes = False
+    # Seconds DHCP devices have to get a lease, from their first ifup
+    dhcp_timeout = 120
+
     def __init__(self, noop=False, root_dir=''):
         self.noop = noop
         self.log_prefix = "NOOP: " if noop else ""
         self.root_dir = root_dir
+        # devices restarted (or which would be, in noop mode) by apply
+        self.restart_devices = []
+        # a plan.Plan recording the steps of apply instead of running them
+        self.plan = None
+        self.topology = topology.Topology()
+        self.dhcp_devices = set()
+        # the IP versions (4 and/or 6) each DHCP device is configured with
+        self.dhcp_versions = {}
+        self._dhcp_events = {}
+        self._dhcp_status = {}
+        self._dhcp_deadline = None
+        # seconds each device took to be brought up
+        self.device_timings = {}
+        # the objects.Route list of each device
+        self.device_routes = {}
+        # the objects.EthtoolOpts of each device
+        self.device_ethtool_opts = {}
+        # the objects.QueueSteering of each device
+        self.device_queue_steering = {}
+        # the objects.OvsDpdkPort of each DPDK port, bond members included
+        self.dpdk_ports = {}
+        # the objects.SriovPF and objects.SriovVF of each PF and VF
+        self.sriov_pfs = {}
+        self.sriov_vfs = {}
+        # the objects whose port VLANs are set on a VLAN filtering Linux
+        # bridge, the bridges themselves included
+        self.bridge_vlan_ports = {}
+
+    def _track_object(self, obj):
+        """Record the dependencies, DHCP use and device settings of an object.
+        """
+        self.topology.add_object(obj)
+        if obj.routes:
+            self.device_routes[obj.name] = obj.routes
+        if getattr(obj, 'ethtool_opts', None):
+            self.device_ethtool_opts[obj.name] = obj.ethtool_opts
+        if getattr(obj, 'queue_steering', None):
+            self.device_queue_steering[obj.name] = obj.queue_steering
+        if isinstance(obj, objects.SriovPF):
+            self.sriov_pfs[obj.name] = obj
+        if obj.bridge_vlans or obj.bridge_pvid is not None:
+            self.bridge_vlan_ports[obj.name] = obj
+        if isinstance(obj, objects.OvsDpdkPort):
+            self.dpdk_ports[obj.name] = obj
+        elif isinstance(obj, objects.OvsDpdkBond):
+            for dpdk_port in obj.members:
+                self.dpdk_ports[dpdk_port.name] = dpdk_port
+        if obj.use_dhcp or obj.use_dhcpv6:
+            self.dhcp_devices.add(obj.name)
+            self.dhcp_versions[obj.name] = set(
+                version for version, dhcp in ((4, obj.use_dhcp),
+                                              (6, obj.use_dhcpv6)) if dhcp)
+        else:
+            # the object may replace one added before
+            self.dhcp_devices.discard(obj.name)
+            self.dhcp_versions.pop(obj.name, None)
+
+    def render_cached(self, render, *args):
+        """Call a render method, or return its cached result.
+
+        Render methods must only depend on their arguments, on the MAC
+        address of the primary interface of the objects passed to them
+        and on the PCI address of their DPDK ports; the cache key is made
+        from those and the provider class.
+
+        :param render: The bound render method to call.
+        :param args: The arguments (objects and/or plain values) to pass.
+        :returns: the value returned by render.
+        """
+        if self.render_cache is None:
+            return render(*args)
+        macs = {}
+        pci_addresses = {}
+        objs = list(args)
+        while objs:
+            obj = objs.pop()
+            primary = getattr(obj, 'primary_interface_name', None)
+            if primary:
+                macs[primary] = utils.interface_mac(primary)
+            if isinstance(obj, objects.OvsDpdkPort):
+                # the NIC may have been re-bound or replaced
+                try:
+                    pci_addresses[obj.name] = obj.get_pci_address()
+                except objects.InvalidConfigException:
+                    pci_addresses[obj.name] = None
+            objs.extend(getattr(obj, 'members', None) or [])
+        key = self.render_cache.key(self.__class__.__name__,
+                                    render.__name__,
+                                    version.version_info.version_string(),
+                                    objects.object_to_json(list(args)),
+                                    macs, pci_addresses)
+        value = self.render_cache.get(key)
+        if value is None:
+            value = render(*args)
+            self.render_cache.set(key, value)
+        elif isinstance(value, list):
+            value = tuple(value)
+        return value
 
     def add_object(self, obj):
         """Convenience method to add any type of object to the network config.
@@ -51,6 +171,10 @@ class NetConfig(object):
             self.add_vlan(obj)
         elif isinstance(obj, objects.IvsInterface):
             self.add_ivs_interface(obj)
+        elif isinstance(obj, objects.OvsUserBridge):
+            self.add_ovs_user_bridge(obj)
+            for member in obj.members:
+                self.add_object(member)
         elif isinstance(obj, objects.OvsBridge):
             self.add_bridge(obj)
             for member in obj.members:
@@ -73,6 +197,17 @@ class NetConfig(object):
                 self.add_object(member)
         elif isinstance(obj, objects.OvsTunnel):
             self.add_ovs_tunnel(obj)
+        elif isinstance(obj, objects.OvsDpdkPort):
+            # the nic of a DPDK port is bound to DPDK, not configured
+            self.add_ovs_dpdk_port(obj)
+        elif isinstance(obj, objects.OvsDpdkBond):
+            # and the ports of a DPDK bond are created with it
+            self.add_ovs_dpdk_bond(obj)
+        elif isinstance(obj, objects.SriovVF):
+            self.add_sriov_vf(obj)
+        elif isinstance(obj, objects.VlanRange):
+            for vlan in obj.vlans():
+                self.add_object(vlan)
 
     def add_interface(self, interface):
         """Add an Interface object to the net config object.
@@ -130,6 +265,38 @@ class NetConfig(object):
         """
         raise NotImplemented("add_ovs_tunnel is not implemented.")
 
+    def add_ovs_user_bridge(self, bridge):
+        """Add an OvsUserBridge object to the net config object.
+
+        :param bridge: The OvsUserBridge object to add.
+        """
+        raise NotImplemented("add_ovs_user_bridge is not implemented.")
+
+    def add_ovs_dpdk_port(self, dpdk_port):
+        """Add an OvsDpdkPort object to the net config object.
+
+        :param dpdk_port: The OvsDpdkPort object to add.
+        """
+        raise NotImplemented("add_ovs_dpdk_port is not implemented.")
+
+    def add_ovs_dpdk_bond(self, bond):
+        """Add an OvsDpdkBond object to the net config object.
+
+        :param bond: The OvsDpdkBond object to add.
+        """
+        raise NotImplemented("add_ovs_dpdk_bond is not implemented.")
+
+    def add_sriov_vf(self, vf):
+        """Add an SriovVF object to the net config object.
+
+        VFs are set up through their PF by configure_sriov, the same way
+        for every provider.
+
+        :param vf: The SriovVF object to add.
+        """
+        logger.info('adding sriov vf: %s' % vf.name)
+        self.sriov_vfs[vf.name] = vf
+
     def apply(self, cleanup=False):
         """Apply the network configuration.
 
@@ -149,28 +316,353 @@ class NetConfig(object):
         in noop mode, this just prints a message.
         """
         logger.info('%s%s' % (self.log_prefix, msg))
-        if not self.noop:
+        if self.plan is not None:
+            self.plan.add_execute(msg, cmd, args, kwargs)
+        elif not self.noop:
             processutils.execute(cmd, *args, **kwargs)
 
-    def write_config(self, filename, data, msg=None):
+    def write_config(self, filename, data, msg=None, mode=None):
         msg = msg or "Writing config %s" % filename
         logger.info('%s%s' % (self.log_prefix, msg))
-        if not self.noop:
-            utils.write_config(filename, data)
+        if self.plan is not None:
+            self.plan.add_write(filename, data, msg, mode)
+        elif not self.noop:
+            utils.write_config(filename, data, mode)
+            if self.state is not None:
+                self.state.record_file(filename, data)
+
+    def diff_config(self, filename, data):
+        """Tell whether data differs from the content of a file.
+
+        The state store is asked first, so that files unchanged since
+        they were written do not have to be read.
+        """
+        if self.state is not None:
+            changed = self.state.file_changed(filename, data)
+            if changed is not None:
+                return changed
+        return utils.diff(filename, data)
 
     def remove_config(self, filename, msg=None):
         msg = msg or "Removing config %s" % filename
         logger.info('%s%s' % (self.log_prefix, msg))
-        if not self.noop:
+        if self.plan is not None:
+            self.plan.add_remove(filename, msg)
+        elif not self.noop:
             os.remove(filename)
+            if self.state is not None:
+                self.state.forget_file(filename)
+
+    def write_sysfs(self, path, value, msg=None):
+        """Write a value to a sysfs or procfs attribute, in place."""
+        msg = msg or "Writing %s to %s" % (value, path)
+        logger.info('%s%s' % (self.log_prefix, msg))
+        if self.plan is not None:
+            self.plan.add_write_sysfs(path, value, msg)
+        elif not self.noop:
+            with open(path, 'w') as f:
+                f.write(value)
 
     def ifdown(self, interface, iftype='interface'):
         msg = 'running ifdown on %s: %s' % (iftype, interface)
         self.execute(msg, '/sbin/ifdown', interface, check_exit_code=False)
 
+    def _dhcp_time_left(self):
+        return max(0, self._dhcp_deadline - time.time())
+
+    def _ifup_dhcp(self, msg, interface):
+        def run():
+            started = time.time()
+            try:
+                self.execute(msg, '/sbin/ifup', interface)
+                self.device_timings[interface] = time.time() - started
+                self._dhcp_status[interface] = 'bound'
+            except Exception as e:
+                logger.error('ifup of %s failed: %s' % (interface, e))
+                self._dhcp_status[interface] = 'failed'
+            finally:
+                done.set()
+
+        if self._dhcp_deadline is None:
+            self._dhcp_deadline = time.time() + self.dhcp_timeout
+        done = threading.Event()
+        self._dhcp_events[interface] = done
+        self._dhcp_status[interface] = 'pending'
+        thread = threading.Thread(target=run, name='ifup-%s' % interface)
+        thread.daemon = True
+        thread.start()
+
+    def brings_up_members(self, name):
+        """Tell whether bringing a bond or bridge up brings its members up.
+
+        :param name: The name of the bond or bridge.
+        """
+        return False
+
     def ifup(self, interface, iftype='interface'):
+        """Bring a device up.
+
+        DHCP devices are brought up in the background, unless in noop or
+        plan mode, see wait_for_dhcp. VLANs stacked on a DHCP device which
+        is still being brought up wait for it, until dhcp_timeout, and so
+        do the members of a DHCP bond or bridge whose ifup brings them up
+        itself (see brings_up_members) rather than race it. The other
+        members are brought up right away, the lease depending on them.
+        """
         msg = 'running ifup on %s: %s' % (iftype, interface)
-        self.execute(msg, '/sbin/ifup', interface)
+        waits = self.topology.stacked_on(interface)
+        waits.update(container for container
+                     in self.topology.containers(interface)
+                     if self.brings_up_members(container))
+        for lower in waits:
+            if lower in self._dhcp_events:
+                self._dhcp_events[lower].wait(self._dhcp_time_left())
+        if (interface in self.dhcp_devices and not self.noop and
+                self.plan is None):
+            self._ifup_dhcp(msg, interface)
+        else:
+            started = time.time()
+            self.execute(msg, '/sbin/ifup', interface)
+            self.device_timings[interface] = time.time() - started
+
+    def wait_for_dhcp(self, timeout=None):
+        """Wait for the DHCP devices being brought up in the background.
+
+        :param timeout: The maximum number of seconds to wait, by default
+            what is left of dhcp_timeout since the first DHCP ifup.
+        :returns: a dict of device name: status, where status is one of
+            'bound', 'failed' or 'pending' (still waiting for a lease).
+        """
+        if timeout is not None:
+            self._dhcp_deadline = time.time() + timeout
+        for event in self._dhcp_events.values():
+            event.wait(self._dhcp_time_left())
+        return dict(self._dhcp_status)
+
+    def set_mtus(self, mtus):
+        """Change the MTU of live links without bringing them down.
+
+        MTUs are lowered from the upper devices down, then raised from
+        the lower devices up, so that a device never has a larger MTU
+        than the devices it sits on (e.g. a VLAN than its device).
+
+        :param mtus: A dict of device name: MTU.
+        """
+        order = self.topology.lower_first(mtus)
+        lowered = set(name for name in order
+                      if mtus[name] < (utils.interface_mtu(name) or 0))
+        for name in reversed(order):
+            if name in lowered:
+                self.execute('lowering the MTU of %s' % name, '/sbin/ip',
+                             'link', 'set', 'dev', name, 'mtu',
+                             str(mtus[name]))
+        for name in order:
+            if name not in lowered:
+                self.execute('setting the MTU of %s' % name, '/sbin/ip',
+                             'link', 'set', 'dev', name, 'mtu',
+                             str(mtus[name]))
+
+    def set_ethtool_opts(self, names):
+        """Apply the ethtool settings of live links which differ.
+
+        The current settings of each device are read, and only those which
+        differ from its objects.EthtoolOpts are set.
+
+        :param names: The names of the devices, devices without ethtool
+            options are skipped.
+        """
+        for name in names:
+            opts = self.device_ethtool_opts.get(name)
+            if not opts:
+                continue
+            current = ethtool.current_settings(name, opts)
+            for args in ethtool.commands(name, opts, current):
+                self.execute('setting ethtool %s of %s' % (args[0], name),
+                             ethtool.ETHTOOL, *args)
+
+    def set_queue_steering(self, names):
+        """Steer the queues of live links, leaving unchanged values alone.
+
+        :param names: The names of the devices, devices without queue
+            steering are skipped.
+        """
+        for name in names:
+            queue_steering = self.device_queue_steering.get(name)
+            if not queue_steering:
+                continue
+            settings = steering.desired_settings(name, queue_steering)
+            for path, value in steering.changed_settings(settings):
+                self.write_sysfs(path, value, 'steering the queues of %s: '
+                                 '%s to %s' % (name, value, path))
+
+    def persist_queue_steering(self):
+        """Write (or remove) the udev rules steering queues on hotplug.
+
+        Links re-created outside of os-net-config get their queues
+        steered again by `os-net-config --steer-queues`.
+
+        :returns: a dict of filename: data of the rules if they changed.
+        """
+        path = self.root_dir + steering.UDEV_RULES_PATH
+        data = steering.udev_rules(self.device_queue_steering)
+        if data:
+            if self.diff_config(path, data):
+                self.write_config(path, data)
+                return {path: data}
+        elif os.path.exists(path):
+            self.remove_config(path)
+        return {}
+
+    def link_up_commands(self):
+        """Return the commands to run each time a device is brought up.
+
+        The IRQs of the queues of a device only exist once it is up, so
+        the queues of devices with a queue_steering are steered again.
+
+        :returns: a dict of device name: list of commands.
+        """
+        commands = {}
+        for name, queue_steering in self.device_queue_steering.items():
+            commands.setdefault(name, []).append(
+                steering.steer_command(name, queue_steering))
+        return commands
+
+    def persist_link_up_hook(self, path, device_var):
+        """Write (or remove) the script run each time a device is up.
+
+        The script runs the link_up_commands of the device it is called
+        for. A script at path not written by os-net-config is left alone.
+
+        :param path: The path of the script, e.g. /sbin/ifup-local.
+        :param device_var: The shell variable naming the device in the
+            script, e.g. $1.
+        :returns: a dict of filename: data of the script if it changed.
+        """
+        path = self.root_dir + path
+        exists = os.path.exists(path)
+        if exists and _HOOK_HEADER not in utils.get_file_data(path):
+            logger.warning('%s was not written by os-net-config, not '
+                           'replacing it' % path)
+            return {}
+        commands = self.link_up_commands()
+        if not commands:
+            if exists:
+                self.remove_config(path)
+            return {}
+        data = '#!/bin/sh\n%s\ncase "%s" in\n' % (_HOOK_HEADER, device_var)
+        for name in sorted(commands):
+            data += '%s)\n' % name
+            for command in commands[name]:
+                data += '    %s\n' % command
+            data += '    ;;\n'
+        data += 'esac\n'
+        if self.diff_config(path, data):
+            self.write_config(path, data, mode=0o755)
+            return {path: data}
+        return {}
+
+    @staticmethod
+    def _sriov_vf_command(vf):
+        command = 'link set dev %s vf %i' % (vf.device, vf.vfid)
+        if vf.macaddr:
+            command += ' mac %s' % vf.macaddr
+        if vf.vlan_id is not None:
+            command += ' vlan %i' % vf.vlan_id
+        for flag in ('spoofchk', 'trust'):
+            if getattr(vf, flag) is not None:
+                command += ' %s %s' % (flag, 'on' if getattr(vf, flag)
+                                       else 'off')
+        for rate in ('min_tx_rate', 'max_tx_rate'):
+            if getattr(vf, rate) is not None:
+                command += ' %s %i' % (rate, getattr(vf, rate))
+        return command
+
+    def configure_sriov(self):
+        """Create the VFs of the SR-IOV PFs and apply the VF settings.
+
+        sriov_numvfs is only written when it differs from the number of
+        VFs of a PF, and the settings of all the VFs are applied with a
+        single ip batch.
+        """
+        for name in sorted(self.sriov_pfs):
+            numvfs = self.sriov_pfs[name].numvfs
+            current = utils.get_sriov_numvfs(name)
+            if current is None:
+                logger.error('%s does not support SR-IOV' % name)
+                continue
+            if current == numvfs:
+                continue
+            path = utils._SYS_CLASS_NET + '/%s/device/sriov_numvfs' % name
+            if current:
+                # the kernel only changes the number of VFs from 0
+                self.write_sysfs(path, '0', 'removing the VFs of %s' % name)
+            self.write_sysfs(path, str(numvfs),
+                             'creating %i VFs on %s' % (numvfs, name))
+        commands = [self._sriov_vf_command(self.sriov_vfs[name])
+                    for name in sorted(self.sriov_vfs)]
+        if commands:
+            msg = 'configuring %i SR-IOV VFs' % len(commands)
+            self.execute(msg, '/sbin/ip', '-force', '-batch', '-',
+                         process_input='\n'.join(commands) + '\n')
+
+    def configure_bridge_vlans(self):
+        """Set the VLANs of the ports of the VLAN filtering Linux bridges.
+
+        The VLANs of all the ports are read at once and only the
+        differences are applied, with a single bridge batch.
+        """
+        if not self.bridge_vlan_ports:
+            return
+        current = bridge.current_vlans()
+        commands = []
+        for name in sorted(self.bridge_vlan_ports):
+            port = self.bridge_vlan_ports[name]
+            commands.extend(bridge.vlan_commands(
+                name, port.bridge_vlans, port.bridge_pvid, current.get(name),
+                self_port=isinstance(port, objects.LinuxBridge)))
+        if commands:
+            msg = 'setting bridge VLANs: %i changes' % len(commands)
+            self.execute(msg, bridge.BRIDGE, '-force', '-batch', '-',
+                         process_input='\n'.join(commands) + '\n')
+
+    def bind_dpdk_ports(self):
+        """Bind the nics of the DPDK ports to their DPDK driver.
+
+        Bound nics lose their netdev, so their name, PCI address and MAC
+        are recorded in the DPDK mapping first (see
+        utils.get_dpdk_mapping). The nics of the local system are not
+        bound for the config of another root directory.
+        """
+        if self.root_dir:
+            if self.dpdk_ports:
+                logger.info('Not binding the DPDK ports of %s' %
+                            self.root_dir)
+            return
+        mapping = utils.get_dpdk_mapping()
+        bindings = []
+        for name in sorted(self.dpdk_ports):
+            dpdk_port = self.dpdk_ports[name]
+            pci_address = dpdk_port.get_pci_address()
+            if utils.get_pci_driver(pci_address) == dpdk_port.driver:
+                continue
+            nic = dpdk_port.members[0].name
+            try:
+                mac = utils.interface_mac(nic)
+            except IOError:
+                mac = mapping.get(nic, {}).get('mac_address')
+            mapping[nic] = {'pci_address': pci_address,
+                            'mac_address': mac,
+                            'driver': dpdk_port.driver}
+            bindings.append((nic, pci_address, dpdk_port.driver))
+        if not bindings:
+            return
+        self.write_config(utils.DPDK_MAPPING_FILE,
+                          yaml.safe_dump(mapping, default_flow_style=False))
+        for nic, pci_address, driver in bindings:
+            self.execute('binding %s (%s) to %s' %
+                         (nic, pci_address, driver),
+                         '/usr/sbin/driverctl', 'set-override',
+                         pci_address, driver)
 
     def ifrename(self, oldname, newname):
         msg = 'renaming %s to %s: ' % (oldname, newname)
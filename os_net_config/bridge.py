@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014-2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import json
+import logging
+
+from oslo_concurrency import processutils
+
+
+logger = logging.getLogger(__name__)
+
+BRIDGE = '/sbin/bridge'
+
+MIN_VLAN = 1
+MAX_VLAN = 4094
+
+# The VLANs of a port added to a VLAN filtering bridge, with the kernel's
+# default_pvid, see parse_vlans
+DEFAULT_PORT_VLANS = (frozenset([1]), 1, frozenset([1]))
+
+
+def parse_vlan_list(vlans):
+    """Return the set of VLAN ids of a list of VLAN ids and ranges.
+
+    :param vlans: A list of VLAN ids and/or ranges such as "100-199".
+    :raises: ValueError if an item is not a VLAN id or range.
+    """
+    vids = set()
+    for item in vlans:
+        first, sep, last = str(item).strip().partition('-')
+        first = int(first)
+        last = int(last) if sep else first
+        if first > last:
+            raise ValueError('Invalid VLAN range: %s' % item)
+        vids.update(range(first, last + 1))
+    return vids
+
+
+def vlan_ranges(vids):
+    """Return the sorted VLAN ranges (e.g. ["1", "100-199"]) of ids."""
+    ranges = []
+    for vid in sorted(vids):
+        if ranges and ranges[-1][1] == vid - 1:
+            ranges[-1][1] = vid
+        else:
+            ranges.append([vid, vid])
+    return ['%i-%i' % (first, last) if first != last else '%i' % first
+            for first, last in ranges]
+
+
+def bridging_opts(bridge):
+    """Return the sysfs bridge settings (key=value) of a LinuxBridge."""
+    opts = []
+    if bridge.vlan_filtering:
+        opts.append('vlan_filtering=1')
+    if bridge.multicast_snooping is not None:
+        opts.append('multicast_snooping=%i' % bridge.multicast_snooping)
+    if bridge.ageing_time is not None:
+        # in centiseconds
+        opts.append('ageing_time=%i' % (bridge.ageing_time * 100))
+    return opts
+
+
+def parse_vlans(data):
+    """Parse the output of `bridge -json vlan show`.
+
+    Both the list of ports of recent iproute2 versions and the dict keyed
+    by port of older ones are understood.
+
+    :param data: The JSON output of bridge.
+    :returns: a dict of port: (set of VLAN ids, PVID or None, set of the
+        untagged VLAN ids).
+    """
+    ports = json.loads(data or '[]')
+    if isinstance(ports, dict):
+        ports = [{'ifname': name, 'vlans': vlans}
+                 for name, vlans in ports.items()]
+    current = {}
+    for port in ports:
+        vids = set()
+        pvid = None
+        untagged = set()
+        for vlan in port.get('vlans', []):
+            flags = vlan.get('flags', [])
+            vlan_vids = set(range(vlan['vlan'],
+                                  vlan.get('vlanEnd', vlan['vlan']) + 1))
+            vids |= vlan_vids
+            if 'PVID' in flags:
+                pvid = vlan['vlan']
+            if 'Egress Untagged' in flags:
+                untagged |= vlan_vids
+        current[port['ifname']] = (vids, pvid, untagged)
+    return current
+
+
+def current_vlans():
+    """Return the VLANs of all the bridge ports (see parse_vlans).
+
+    :returns: the VLANs, or an empty dict if they could not be read.
+    """
+    try:
+        out, err = processutils.execute(BRIDGE, '-json', 'vlan', 'show')
+    except (processutils.ProcessExecutionError, OSError) as e:
+        logger.warning('Could not read the bridge VLANs: %s' % e)
+        return {}
+    return parse_vlans(out)
+
+
+def vlan_commands(name, vlans, pvid, current=None, self_port=False):
+    """Return the bridge batch commands setting the VLANs of a port.
+
+    :param name: The port, or the bridge itself if self_port.
+    :param vlans: The VLAN ranges the port carries tagged.
+    :param pvid: The VLAN untagged packets belong to, or None.
+    :param current: The current VLANs of the port (see parse_vlans), in
+        which case only the differences are applied.
+    :param self_port: Whether the VLANs are those of the bridge itself.
+    :returns: a list of commands for `bridge -batch`.
+    """
+    suffix = ' self' if self_port else ''
+    current_vids, current_pvid, current_untagged = current or (set(), None,
+                                                               set())
+    tagged = parse_vlan_list(vlans)
+    if pvid is not None:
+        tagged.discard(pvid)
+    wanted = tagged | set([pvid] if pvid is not None else [])
+    commands = []
+    for vid_range in vlan_ranges(current_vids - wanted):
+        commands.append('vlan del dev %s vid %s%s' %
+                        (name, vid_range, suffix))
+    # adding a VLAN again resets its flags
+    add = (tagged - current_vids) | (tagged & (current_untagged |
+                                               set([current_pvid])))
+    for vid_range in vlan_ranges(add):
+        commands.append('vlan add dev %s vid %s%s' %
+                        (name, vid_range, suffix))
+    if pvid is not None and (pvid != current_pvid or
+                             pvid not in current_untagged):
+        commands.append('vlan add dev %s vid %i pvid untagged%s' %
+                        (name, pvid, suffix))
+    return commands
@@ -17,15 +17,29 @@
 
 import argparse
 import logging
+import multiprocessing
 import os
 import sys
+import time
 import yaml
 
+from oslo_concurrency import processutils
+
+import os_net_config
+from os_net_config import diff
 from os_net_config import impl_eni
 from os_net_config import impl_ifcfg
 from os_net_config import impl_iproute
+from os_net_config import impl_networkd
 from os_net_config import objects
+from os_net_config import plan
+from os_net_config import reconcile
+from os_net_config import render_cache
+from os_net_config import state
+from os_net_config import utils
+from os_net_config import validator
 from os_net_config import version
+from os_net_config import watch
 
 
 logger = logging.getLogger(__name__)
@@ -43,7 +57,7 @@ def parse_opts(argv):
                         default='/etc/os-net-config/mapping.yaml')
     parser.add_argument('-p', '--provider', metavar='PROVIDER',
                         help="""The provider to use."""
-                        """One of: ifcfg, eni, iproute.""",
+                        """One of: ifcfg, eni, networkd, iproute.""",
                         default=None)
     parser.add_argument('-r', '--root-dir', metavar='ROOT_DIR',
                         help="""The root directory of the filesystem.""",
@@ -99,6 +113,141 @@ def parse_opts(argv):
              "(WARNING, permanently renames nics).",
         required=False)
 
+    parser.add_argument(
+        '--batch',
+        metavar='MANIFEST',
+        dest="batch",
+        help="Render the network config files of many hosts without "
+             "applying them. MANIFEST is a YAML file with a list of "
+             "'hosts', each with a 'config' file, an output 'root_dir' and "
+             "optionally a 'mapping' file, a 'nic_inventory' file listing "
+             "the host's active 'nics' by name and MAC, and a 'provider'.",
+        required=False)
+
+    parser.add_argument(
+        '--workers',
+        dest="workers",
+        type=int,
+        help="Number of worker processes used by --batch. Defaults to "
+             "the number of CPUs.",
+        default=None,
+        required=False)
+
+    parser.add_argument(
+        '--render-cache-dir',
+        metavar='CACHE_DIR',
+        dest="render_cache_dir",
+        help="Cache the rendered config of each object in CACHE_DIR, so "
+             "that unchanged objects are not rendered again.",
+        default=None,
+        required=False)
+
+    parser.add_argument(
+        '--dhcp-timeout',
+        metavar='SECONDS',
+        dest="dhcp_timeout",
+        type=int,
+        help="DHCP devices are brought up in parallel with the others, "
+             "wait at most SECONDS for them to get a lease.",
+        default=os_net_config.NetConfig.dhcp_timeout,
+        required=False)
+
+    parser.add_argument(
+        '--plan-out',
+        metavar='PLAN_FILE',
+        dest="plan_out",
+        help="Compute the file writes and commands needed to apply the "
+             "config and save them to PLAN_FILE without running them.",
+        default=None,
+        required=False)
+
+    parser.add_argument(
+        '--plan-in',
+        metavar='PLAN_FILE',
+        dest="plan_in",
+        help="Run a plan saved with --plan-out, provided the files it "
+             "changes still have the content they had when it was made.",
+        default=None,
+        required=False)
+
+    parser.add_argument(
+        '--diff',
+        metavar='OLD_CONFIG_FILE',
+        dest="diff",
+        help="Compare the objects of the config file with those of "
+             "OLD_CONFIG_FILE and report the added, removed and modified "
+             "objects and the devices to restart, without rendering or "
+             "applying anything. With --detailed-exit-codes, an exit code "
+             "of '2' means that the configs differ.",
+        default=None,
+        required=False)
+
+    parser.add_argument(
+        '--state-db',
+        metavar='STATE_DB',
+        dest="state_db",
+        nargs='?',
+        const='',
+        help="Record the files written, the objects applied and the time "
+             "each apply and device ifup took in the SQLite database "
+             "STATE_DB (by default var/lib/os-net-config/state.db under "
+             "the root directory). Files unchanged since they were "
+             "written are then not read to find what changed.",
+        default=None,
+        required=False)
+
+    parser.add_argument(
+        '--history',
+        dest="history",
+        action='store_true',
+        help="Print the last applies and the devices slowest to come up, "
+             "as recorded in the --state-db database.",
+        required=False)
+
+    parser.add_argument(
+        '--reconcile-routes',
+        dest="reconcile_routes",
+        action='store_true',
+        help="After applying, make the kernel routes of the configured "
+             "devices match the config with a single ip batch: missing "
+             "routes are added, changed ones replaced and static routes "
+             "not in the config deleted, except on devices using DHCP "
+             "for their address family. Devices whose routes alone "
+             "changed are not restarted.",
+        required=False)
+
+    parser.add_argument(
+        '--reconcile-devices',
+        metavar='DEVICES',
+        dest="reconcile_devices",
+        help="Comma separated list of the devices whose routes "
+             "--reconcile-routes manages, all the configured devices by "
+             "default.",
+        default=None,
+        required=False)
+
+    parser.add_argument(
+        '--steer-queues',
+        metavar=('DEVICE', 'SETTING=CPUS'),
+        dest="steer_queues",
+        nargs='+',
+        help="Only steer the queues of a live device, e.g. "
+             "--steer-queues em1 rps_cpus=auto xps_cpus=0-3. Settings are "
+             "those of queue_steering, all auto by default. This is what "
+             "the udev rules written for devices with a queue_steering "
+             "run.",
+        default=None,
+        required=False)
+
+    parser.add_argument(
+        '--watch',
+        dest="watch",
+        action='store_true',
+        help="Apply the config, then keep running and apply it again "
+             "each time the config or mapping file, or the host's links, "
+             "change.",
+        required=False)
+
     opts = parser.parse_args(argv[1:])
 
     return opts
@@ -118,78 +267,605 @@ def configure_logger(verbose=False, debug=False):
                         level=log_level)
 
 
-def main(argv=sys.argv):
-    opts = parse_opts(argv)
-    configure_logger(opts.verbose, opts.debug)
-    logger.info('Using config file at: %s' % opts.config_file)
-    if opts.mapping_file:
-        logger.info('Using mapping file at: %s' % opts.mapping_file)
-    iface_array = []
+def iter_network_config(stream):
+    """Yield the entries of the network_config list one at a time.
+
+    The YAML (or JSON) document is walked as an event stream and each
+    entry is constructed on its own, so at most one entry is held in
+    memory rather than the whole document.
+
+    :param stream: A file like object containing the config.
+    :raises: objects.InvalidConfigException if network_config is missing
+        or is not a list.
+    """
+    loader = yaml.SafeLoader(stream)
+    found = False
+    try:
+        loader.get_event()  # StreamStartEvent
+        if loader.check_event(yaml.DocumentStartEvent):
+            loader.get_event()
+        if loader.check_event(yaml.MappingStartEvent):
+            loader.get_event()
+            while not loader.check_event(yaml.MappingEndEvent):
+                key = loader.construct_document(loader.compose_node(None,
+                                                                    None))
+                if key != 'network_config' or found:
+                    # skip over any other top level value
+                    loader.compose_node(None, None)
+                    continue
+                if not loader.check_event(yaml.SequenceStartEvent):
+                    break
+                loader.get_event()
+                found = True
+                while not loader.check_event(yaml.SequenceEndEvent):
+                    node = loader.compose_node(None, None)
+                    yield loader.construct_document(node)
+                loader.get_event()
+    finally:
+        loader.dispose()
+
+    if not found:
+        msg = 'No interfaces defined in config.'
+        raise objects.InvalidConfigException(msg)
+
 
+def get_provider(provider_name, noop=False, root_dir=''):
+    """Create the provider for a name, or the host's default provider.
+
+    :param provider_name: One of ifcfg, eni, networkd or iproute. If None the
+        provider is picked based on the persistent network config format
+        found under root_dir.
+    :returns: a NetConfig instance, or None if there is no such provider.
+    """
     provider = None
-    if opts.provider:
-        if opts.provider == 'ifcfg':
-            provider = impl_ifcfg.IfcfgNetConfig(noop=opts.noop,
-                                                 root_dir=opts.root_dir)
-        elif opts.provider == 'eni':
-            provider = impl_eni.ENINetConfig(noop=opts.noop,
-                                             root_dir=opts.root_dir)
-        elif opts.provider == 'iproute':
-            provider = impl_iproute.IPRouteNetConfig(noop=opts.noop,
-                                                     root_dir=opts.root_dir)
+    if provider_name:
+        if provider_name == 'ifcfg':
+            provider = impl_ifcfg.IfcfgNetConfig(noop=noop,
+                                                 root_dir=root_dir)
+        elif provider_name == 'eni':
+            provider = impl_eni.ENINetConfig(noop=noop, root_dir=root_dir)
+        elif provider_name == 'networkd':
+            provider = impl_networkd.NetworkdNetConfig(noop=noop,
+                                                       root_dir=root_dir)
+        elif provider_name == 'iproute':
+            provider = impl_iproute.IPRouteNetConfig(noop=noop,
+                                                     root_dir=root_dir)
         else:
             logger.error('Invalid provider specified.')
-            return 1
     else:
-        if os.path.exists('%s/etc/sysconfig/network-scripts/' % opts.root_dir):
-            provider = impl_ifcfg.IfcfgNetConfig(noop=opts.noop,
-                                                 root_dir=opts.root_dir)
-        elif os.path.exists('%s/etc/network/' % opts.root_dir):
-            provider = impl_eni.ENINetConfig(noop=opts.noop,
-                                             root_dir=opts.root_dir)
+        if os.path.exists('%s/etc/sysconfig/network-scripts/' % root_dir):
+            provider = impl_ifcfg.IfcfgNetConfig(noop=noop,
+                                                 root_dir=root_dir)
+        elif os.path.exists('%s/etc/network/' % root_dir):
+            provider = impl_eni.ENINetConfig(noop=noop, root_dir=root_dir)
+        elif os.path.exists('%s/etc/systemd/network/' % root_dir):
+            provider = impl_networkd.NetworkdNetConfig(noop=noop,
+                                                       root_dir=root_dir)
         else:
             logger.error('Unable to set provider for this operating system.')
-            return 1
+    return provider
 
-    # Read config file containing network configs to apply
-    if os.path.exists(opts.config_file):
-        with open(opts.config_file) as cf:
-            iface_array = yaml.load(cf.read()).get("network_config")
-            logger.debug('network_config JSON: %s' % str(iface_array))
+
+def load_mapping(mapping_file):
+    """Read the interface_mapping of a mapping file, if the file exists."""
+    iface_mapping = None
+    if mapping_file and os.path.exists(mapping_file):
+        with open(mapping_file) as cf:
+            iface_map = yaml.load(cf.read())
+            iface_mapping = iface_map.get("interface_mapping")
+            logger.debug('interface_mapping JSON: %s' % str(iface_mapping))
+    return iface_mapping
+
+
+def add_config_objects(provider, config_file, iface_mapping=None,
+                       persist_mapping=False, nic_resolver=None,
+                       keep_objects=True):
+    """Build the objects of a config file and add them to a provider.
+
+    Objects are built and handed to the provider one network_config
+    entry at a time, and only summaries of them are kept for the checks
+    run once the whole config has been read: address and route conflicts
+    (see validator.ConfigValidator), the MTUs inferred and checked (see
+    validator.MtuInference) and the NUMA placement of DPDK ports (see
+    validator.DpdkValidator). Only the objects with a device without an
+    MTU are kept until then, those which get an inferred MTU are handed
+    to the provider again so that it renders them with it.
+
+    :param provider: The NetConfig to add the objects to, or None to only
+        build them.
+    :param nic_resolver: The objects.NicResolver naming the nicN aliases,
+        a new one is created if None.
+    :param keep_objects: Whether to keep all the objects to return them,
+        which makes memory use grow with the config.
+    :returns: the list of the objects added, or None if not keep_objects.
+    :raises: objects.InvalidConfigException
+    """
+    config_validator = validator.ConfigValidator()
+    mtu_inference = validator.MtuInference()
+    dpdk_validator = validator.DpdkValidator()
+    nic_resolver = nic_resolver or objects.NicResolver()
+    lacking_mtu = []
+    added = [] if keep_objects else None
+    with open(config_file) as cf:
+        for iface_json in iter_network_config(cf):
+            logger.debug('network_config JSON: %s' % str(iface_json))
+            iface_json.update({'nic_mapping': iface_mapping})
+            iface_json.update({'persist_mapping': persist_mapping})
+            obj = objects.object_from_json(iface_json, nic_resolver)
+            for expanded in objects.expand_object(obj):
+                config_validator.add_object(expanded)
+                mtu_inference.add_object(expanded)
+                dpdk_validator.add_object(expanded)
+                if provider is not None:
+                    provider.add_object(expanded)
+                if validator.lacks_mtu(expanded):
+                    lacking_mtu.append(expanded)
+                if keep_objects:
+                    added.append(expanded)
+    config_validator.validate()
+    changed = validator.set_mtus(lacking_mtu, mtu_inference.infer())
+    if provider is not None:
+        for obj in changed:
+            provider.add_object(obj)
+    dpdk_validator.validate()
+    return added
+
+
+def _load_manifest(manifest_file):
+    with open(manifest_file) as mf:
+        manifest = yaml.safe_load(mf.read()) or {}
+    hosts = manifest.get('hosts')
+    if not isinstance(hosts, list):
+        msg = 'No hosts defined in manifest: %s' % manifest_file
+        raise objects.InvalidConfigException(msg)
+    base_dir = os.path.dirname(os.path.abspath(manifest_file))
+    for host in hosts:
+        for key in ('config', 'root_dir'):
+            if not host.get(key):
+                msg = 'Manifest hosts require \'%s\' to be configured.' % key
+                raise objects.InvalidConfigException(msg)
+        for key in ('config', 'mapping', 'nic_inventory', 'root_dir'):
+            if host.get(key):
+                host[key] = os.path.join(base_dir, host[key])
+    return hosts
+
+
+def render_host(host):
+    """Render the network config files of one manifest host.
+
+    Runs in a batch worker process. The files are rendered by a noop
+    provider rooted at the host's root_dir and then written there.
+
+    :param host: A manifest entry, see parse_opts --batch.
+    :returns: a tuple of (root_dir, list of files written, error or None).
+    """
+    root_dir = host['root_dir']
+    try:
+        inventory = None
+        if host.get('nic_inventory'):
+            with open(host['nic_inventory']) as nf:
+                inventory = (yaml.safe_load(nf.read()) or {}).get('nics', {})
+        utils.set_nic_inventory(inventory)
+
+        provider = get_provider(host.get('provider'), noop=True,
+                                root_dir=root_dir)
+        if not provider:
+            return (root_dir, [], 'no provider for %s' % root_dir)
+        if host.get('render_cache_dir'):
+            provider.render_cache = render_cache.RenderCache(
+                host['render_cache_dir'])
+        add_config_objects(provider, host['config'],
+                           load_mapping(host.get('mapping')),
+                           keep_objects=False)
+        files_changed = provider.apply(cleanup=False, activate=False)
+        for location, data in files_changed.items():
+            if not os.path.isdir(os.path.dirname(location)):
+                os.makedirs(os.path.dirname(location))
+            utils.write_config(location, data)
+        return (root_dir, sorted(files_changed), None)
+    except Exception as e:
+        logger.exception('Error rendering %s' % root_dir)
+        return (root_dir, [], str(e))
+    finally:
+        utils.set_nic_inventory(None)
+
+
+def batch(opts):
+    try:
+        hosts = _load_manifest(opts.batch)
+    except (IOError, objects.InvalidConfigException) as e:
+        logger.error('Invalid batch manifest: %s' % e)
+        return 1
+    for host in hosts:
+        host.setdefault('provider', opts.provider)
+        host.setdefault('render_cache_dir', opts.render_cache_dir)
+
+    workers = opts.workers or multiprocessing.cpu_count()
+    if workers > 1 and len(hosts) > 1:
+        pool = multiprocessing.Pool(min(workers, len(hosts)))
+        try:
+            results = pool.map(render_host, hosts, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
     else:
-        logger.error('No config file exists at: %s' % opts.config_file)
+        results = [render_host(host) for host in hosts]
+
+    failed = False
+    files_written = False
+    for root_dir, files, error in results:
+        if error:
+            failed = True
+            print("%s: ERROR %s" % (root_dir, error))
+        else:
+            files_written = files_written or bool(files)
+            print("%s: %i files written" % (root_dir, len(files)))
+            for location in files:
+                print("  %s" % location)
+
+    if failed:
+        return 1
+    if opts.detailed_exit_codes and files_written:
+        return 2
+    return 0
+
+
+def replay_plan(opts):
+    try:
+        apply_plan = plan.Plan.load(opts.plan_in)
+        apply_plan.replay(os_net_config.NetConfig(noop=opts.noop,
+                                                  root_dir=opts.root_dir))
+    except plan.PlanException as e:
+        logger.error('Unable to run plan %s: %s' % (opts.plan_in, e))
+        return 1
+    return 0
+
+
+def diff_configs(opts):
+    nic_resolver = objects.NicResolver()
+    iface_mapping = load_mapping(opts.mapping_file)
+    config_objects = []
+    for config_file in (opts.diff, opts.config_file):
+        try:
+            config_objects.append(add_config_objects(
+                None, config_file, iface_mapping, nic_resolver=nic_resolver))
+        except (IOError, yaml.YAMLError,
+                objects.InvalidConfigException) as e:
+            logger.error('Invalid network config %s: %s' % (config_file, e))
+            return 1
+    config_diff = diff.ConfigDiff(*config_objects)
+    if config_diff:
+        print(config_diff.report())
+        if opts.detailed_exit_codes:
+            return 2
+    return 0
+
+
+def open_state(opts):
+    """Return the state.StateStore selected by --state-db, or None."""
+    if opts.state_db is None:
+        return None
+    return state.StateStore(opts.state_db or
+                            state.default_path(opts.root_dir))
+
+
+def record_apply(state_store, provider, started, success, config_file,
+                 added, files_changed=()):
+    """Record an apply in the state store, unless nothing was applied."""
+    if state_store is None or provider.noop or provider.plan is not None:
+        return
+    state_store.record_apply(started, time.time() - started, success,
+                             config_file, objects.object_to_json(added),
+                             len(files_changed), provider.device_timings)
+
+
+def show_history(opts):
+    state_store = open_state(opts) or state.StateStore(
+        state.default_path(opts.root_dir))
+    if not state_store.enabled:
+        return 1
+    print("Last applies:")
+    for entry in state_store.history():
+        print("  %s %s %.2fs %s, %i files changed" %
+              (time.strftime('%Y-%m-%d %H:%M:%S',
+                             time.localtime(entry['started'])),
+               'ok' if entry['success'] else 'FAILED', entry['duration'],
+               entry['config_file'], entry['files_changed']))
+    print("Slowest devices:")
+    for device, slowest, average, count in state_store.slowest_devices():
+        print("  %s: %.2fs max, %.2fs average over %i ifups" %
+              (device, slowest, average, count))
+    state_store.close()
+    return 0
+
+
+def reconcile_routes(opts, provider):
+    """Reconcile the kernel routes with those of the applied config.
+
+    :returns: the list of the ip batch commands, None on error.
+    """
+    devices = None
+    if opts.reconcile_devices:
+        devices = [device.strip() for device
+                   in opts.reconcile_devices.split(',')]
+    reconciler = reconcile.RouteReconciler(provider, devices)
+    try:
+        return reconciler.reconcile()
+    except (OSError, ValueError, processutils.ProcessExecutionError) as e:
+        logger.error('Unable to reconcile routes: %s' % e)
+        return None
+
+
+def steer_queues(opts):
+    name = opts.steer_queues[0]
+    settings = {}
+    for arg in opts.steer_queues[1:]:
+        setting, sep, value = arg.partition('=')
+        if not sep:
+            logger.error('Invalid queue steering setting: %s' % arg)
+            return 1
+        settings[setting] = value
+    try:
+        queue_steering = objects.QueueSteering.from_json(settings or 'auto')
+    except objects.InvalidConfigException as e:
+        logger.error(str(e))
+        return 1
+    provider = os_net_config.NetConfig(noop=opts.noop,
+                                       root_dir=opts.root_dir)
+    provider.device_queue_steering[name] = queue_steering
+    try:
+        provider.set_queue_steering([name])
+    except IOError as e:
+        logger.error('Unable to steer the queues of %s: %s' % (name, e))
+        return 1
+    return 0
+
+
+def log_dhcp_status(provider, dhcp_timeout, wait=True):
+    """Wait for the DHCP devices of an apply and log those not bound.
+
+    :param wait: Whether to wait for the devices still getting a lease,
+        until dhcp_timeout, rather than leave them to it in the
+        background, where their failures are logged.
+    :returns: True if a DHCP device failed to come up.
+    """
+    dhcp_failed = False
+    statuses = provider.wait_for_dhcp(None if wait else 0)
+    for device, status in sorted(statuses.items()):
+        if status == 'failed':
+            logger.error('DHCP device %s failed to come up' % device)
+            dhcp_failed = True
+        elif status == 'pending' and wait:
+            logger.warning('DHCP device %s is still waiting for a lease '
+                           'after %i seconds' % (device, dhcp_timeout))
+        elif status == 'pending':
+            logger.info('DHCP device %s is getting a lease in the '
+                        'background' % device)
+    return dhcp_failed
+
+
+def watch_apply(opts, cache, nic_resolver, applied_model, state_store=None):
+    """Apply the config if its model differs from the last applied one.
+
+    The objects are rebuilt from the config and mapping files, but only
+    those whose model changed are rendered again (the others come from
+    the render cache) and apply only rewrites the files which changed and
+    restarts their devices.
+
+    :param cache: The render_cache.MemoryRenderCache kept across applies.
+    :param nic_resolver: The objects.NicResolver naming the nicN aliases.
+    :param applied_model: The model of the last applied config, or None.
+    :param state_store: The state.StateStore recording the applies, or
+        None.
+    :returns: the model of the applied config, applied_model if the config
+        could not be applied.
+    """
+    provider = get_provider(opts.provider, noop=opts.noop,
+                            root_dir=opts.root_dir)
+    if not provider:
+        return applied_model
+    provider.render_cache = cache
+    provider.state = state_store
+    provider.dhcp_timeout = opts.dhcp_timeout
+    provider.reconcile_routes = opts.reconcile_routes
+    started = time.time()
+    persist_mapping = False
+    if os.path.exists(opts.mapping_file):
+        persist_mapping = opts.persist_mapping
+    try:
+        added = add_config_objects(provider, opts.config_file,
+                                   load_mapping(opts.mapping_file),
+                                   persist_mapping, nic_resolver)
+    except (IOError, yaml.YAMLError, objects.InvalidConfigException) as e:
+        logger.error('Invalid network config %s: %s' % (opts.config_file, e))
+        return applied_model
+
+    model = objects.object_to_json(added)
+    if model == applied_model:
+        logger.info('No changes to apply')
+        return applied_model
+    try:
+        files_changed = provider.apply(cleanup=opts.cleanup,
+                                       activate=not opts.no_activate)
+    except (os_net_config.NotImplemented,
+            processutils.ProcessExecutionError, IOError, OSError) as e:
+        logger.error('Unable to apply %s: %s' % (opts.config_file, e))
+        record_apply(state_store, provider, started, False,
+                     opts.config_file, added)
+        return applied_model
+    logger.info('Applied %s: %i files changed, devices restarted: %s' %
+                (opts.config_file, len(files_changed),
+                 ', '.join(provider.restart_devices) or 'none'))
+    # the next changes are not held up by the DHCP leases
+    dhcp_failed = log_dhcp_status(provider, opts.dhcp_timeout, wait=False)
+    route_commands = []
+    if opts.reconcile_routes and not opts.no_activate:
+        route_commands = reconcile_routes(opts, provider)
+    record_apply(state_store, provider, started,
+                 not dhcp_failed and route_commands is not None,
+                 opts.config_file, added, files_changed)
+    return model
+
+
+def refresh_nics(nic_resolver):
+    """Number the newly active nics, see objects.NicResolver.refresh.
+
+    :returns: True if nicN aliases were added.
+    """
+    try:
+        added = nic_resolver.refresh()
+    except objects.InvalidConfigException as e:
+        logger.error('Unable to number the new nics: %s' % e)
+        return False
+    if added:
+        logger.info('New nic aliases: %s' % ', '.join(sorted(added)))
+    return bool(added)
+
+
+def watch_config(opts):
+    """Apply the config, then again on each config file or link change.
+
+    The process sleeps until the watch.Watcher reports changes, so it
+    uses no CPU time while idle. Nics which become active (hotplugged or
+    gaining carrier) are numbered after the known ones, so the nicN
+    aliases already applied never move and only the objects using the
+    new aliases are reconfigured.
+    """
+    try:
+        watcher = watch.Watcher([opts.config_file, opts.mapping_file])
+    except (IOError, OSError) as e:
+        logger.error('Unable to watch for changes: %s' % e)
+        return 1
+    cache = render_cache.MemoryRenderCache()
+    state_store = open_state(opts)
+    nic_resolver = objects.NicResolver()
+    applied_model = None
+    apply_config = True
+    try:
+        events = watcher.events()
+        while True:
+            if apply_config:
+                applied_model = watch_apply(opts, cache, nic_resolver,
+                                            applied_model, state_store)
+                # ignore the link events caused by the apply itself, but
+                # still number the nics which came up meanwhile
+                watcher.drain()
+                apply_config = refresh_nics(nic_resolver)
+                if apply_config:
+                    continue
+            changes = next(events)
+            apply_config = bool(changes - set([watch.LINK_CHANGE]))
+            if watch.LINK_CHANGE in changes:
+                apply_config = refresh_nics(nic_resolver) or apply_config
+    except (KeyboardInterrupt, StopIteration):
+        pass
+    finally:
+        watcher.close()
+        if state_store is not None:
+            state_store.close()
+    return 0
+
+
+def main(argv=sys.argv):
+    opts = parse_opts(argv)
+    configure_logger(opts.verbose, opts.debug)
+
+    if opts.batch:
+        return batch(opts)
+
+    if opts.plan_in:
+        return replay_plan(opts)
+
+    if opts.diff:
+        return diff_configs(opts)
+
+    if opts.history:
+        return show_history(opts)
+
+    if opts.steer_queues:
+        return steer_queues(opts)
+
+    if opts.watch:
+        return watch_config(opts)
+
+    logger.info('Using config file at: %s' % opts.config_file)
+    if opts.mapping_file:
+        logger.info('Using mapping file at: %s' % opts.mapping_file)
+
+    provider = get_provider(opts.provider, noop=opts.noop,
+                            root_dir=opts.root_dir)
+    if not provider:
         return 1
+    if opts.render_cache_dir:
+        provider.render_cache = render_cache.RenderCache(
+            opts.render_cache_dir)
+    if opts.plan_out:
+        provider.plan = plan.Plan()
+    provider.dhcp_timeout = opts.dhcp_timeout
+    provider.reconcile_routes = opts.reconcile_routes
 
-    if not isinstance(iface_array, list):
-        logger.error('No interfaces defined in config: %s' % opts.config_file)
+    # Read config file containing network configs to apply
+    if not os.path.exists(opts.config_file):
+        logger.error('No config file exists at: %s' % opts.config_file)
         return 1
 
     # Read the interface mapping file, if it exists
     # This allows you to override the default network naming abstraction
     # mappings by specifying a specific nicN->name or nicN->MAC mapping
+    iface_mapping = load_mapping(opts.mapping_file)
+    persist_mapping = False
     if os.path.exists(opts.mapping_file):
-        with open(opts.mapping_file) as cf:
-            iface_map = yaml.load(cf.read())
-            iface_mapping = iface_map.get("interface_mapping")
-            logger.debug('interface_mapping JSON: %s' % str(iface_mapping))
-            persist_mapping = opts.persist_mapping
-            logger.debug('persist_mapping: %s' % persist_mapping)
-    else:
-        iface_mapping = None
-        persist_mapping = False
-
-    for iface_json in iface_array:
-        iface_json.update({'nic_mapping': iface_mapping})
-        iface_json.update({'persist_mapping': persist_mapping})
-        obj = objects.object_from_json(iface_json)
-        provider.add_object(obj)
-    files_changed = provider.apply(cleanup=opts.cleanup,
-                                   activate=not opts.no_activate)
+        persist_mapping = opts.persist_mapping
+        logger.debug('persist_mapping: %s' % persist_mapping)
+
+    started = time.time()
+    # the state store records the applied objects
+    state_store = open_state(opts)
+    try:
+        added = add_config_objects(provider, opts.config_file, iface_mapping,
+                                   persist_mapping,
+                                   keep_objects=state_store is not None)
+    except objects.InvalidConfigException as e:
+        logger.error('Invalid network config %s: %s' % (opts.config_file, e))
+        if state_store is not None:
+            state_store.close()
+        return 1
+
+    provider.state = state_store
+    try:
+        files_changed = provider.apply(cleanup=opts.cleanup,
+                                       activate=not opts.no_activate)
+        dhcp_failed = log_dhcp_status(provider, opts.dhcp_timeout)
+        route_commands = []
+        if opts.reconcile_routes and not opts.no_activate:
+            route_commands = reconcile_routes(opts, provider)
+        record_apply(state_store, provider, started,
+                     not dhcp_failed and route_commands is not None,
+                     opts.config_file, added, files_changed)
+    except Exception:
+        record_apply(state_store, provider, started, False,
+                     opts.config_file, added)
+        raise
+    finally:
+        if state_store is not None:
+            state_store.close()
+    if opts.plan_out:
+        provider.plan.save(opts.plan_out)
+        print("Plan with %i steps written to %s" %
+              (len(provider.plan.steps), opts.plan_out))
     if opts.noop:
         for location, data in files_changed.iteritems():
             print("File: %s\n" % location)
             print(data)
             print("----")
+        if provider.restart_devices:
+            print("Devices to restart: %s\n" %
+                  ", ".join(provider.restart_devices))
+        if route_commands:
+            print("Route changes:\n%s\n" % "\n".join(route_commands))
+
+    if dhcp_failed or route_commands is None:
+        return 1
 
     if opts.detailed_exit_codes and len(files_changed) > 0:
         return 2
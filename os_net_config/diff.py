@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014-2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import collections
+import json
+
+from os_net_config import objects
+from os_net_config import topology
+
+
+def _flatten(objs):
+    for obj in objs:
+        yield obj
+        for member in _flatten(getattr(obj, 'members', [])):
+            yield member
+
+
+def object_fields(obj):
+    """Return the fields of an object as a dict of JSON values.
+
+    Members are compared on their own, so the members of bridges and
+    bonds are reduced to their names.
+    """
+    fields = objects.object_to_json(obj)
+    if 'members' in fields:
+        fields['members'] = [member.name for member in obj.members]
+    return fields
+
+
+def _by_name(objs):
+    by_name = collections.OrderedDict()
+    for obj in _flatten(objs):
+        by_name[obj.name] = obj
+    return by_name
+
+
+class ConfigDiff(object):
+    """The object level differences between two network configs.
+
+    :param old_objects: The objects of the old config.
+    :param new_objects: The objects of the new config.
+    """
+
+    def __init__(self, old_objects, new_objects):
+        old = _by_name(old_objects)
+        new = _by_name(new_objects)
+        self.kinds = {}
+        self.added = [name for name in new if name not in old]
+        self.removed = [name for name in old if name not in new]
+        # name: {field: (old value, new value)}
+        self.modified = collections.OrderedDict()
+        for name, obj in new.items():
+            self.kinds[name] = topology.device_kind(obj)
+            if name not in old:
+                continue
+            old_fields = object_fields(old[name])
+            new_fields = object_fields(obj)
+            if old_fields == new_fields:
+                continue
+            changes = {}
+            for field in set(old_fields) | set(new_fields):
+                old_value = old_fields.get(field)
+                new_value = new_fields.get(field)
+                if old_value != new_value:
+                    changes[field] = (old_value, new_value)
+            self.modified[name] = changes
+        for name in self.removed:
+            self.kinds[name] = topology.device_kind(old[name])
+
+        graph = topology.Topology()
+        for obj in new_objects:
+            graph.add_object(obj)
+        self.restart_devices = graph.restart_set(self.added +
+                                                 list(self.modified))
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.modified)
+
+    __nonzero__ = __bool__
+
+    def report(self):
+        """Return a human readable report of the differences."""
+        lines = []
+        for name in self.added:
+            lines.append('+ %s (%s)' % (name, self.kinds[name]))
+        for name in self.removed:
+            lines.append('- %s (%s)' % (name, self.kinds[name]))
+        for name, changes in self.modified.items():
+            lines.append('~ %s (%s)' % (name, self.kinds[name]))
+            for field in sorted(changes):
+                old_value, new_value = changes[field]
+                lines.append('    %s: %s -> %s' %
+                             (field, json.dumps(old_value, sort_keys=True),
+                              json.dumps(new_value, sort_keys=True)))
+        if self.restart_devices:
+            lines.append('Devices to restart: %s' %
+                         ', '.join(self.restart_devices))
+        return '\n'.join(lines)
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014-2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import logging
+import re
+
+from oslo_concurrency import processutils
+
+
+logger = logging.getLogger(__name__)
+
+ETHTOOL = '/sbin/ethtool'
+
+# objects.EthtoolOpts group: (ethtool option setting it, option showing it)
+_GROUP_OPTIONS = [('rings', ('-G', '-g')),
+                  ('channels', ('-L', '-l')),
+                  ('coalesce', ('-C', '-c')),
+                  ('features', ('-K', '-k'))]
+
+# The short feature names ethtool -K takes for the names -k shows
+FEATURE_NAMES = {
+    'rx': 'rx-checksumming',
+    'tx': 'tx-checksumming',
+    'sg': 'scatter-gather',
+    'tso': 'tcp-segmentation-offload',
+    'ufo': 'udp-fragmentation-offload',
+    'gso': 'generic-segmentation-offload',
+    'gro': 'generic-receive-offload',
+    'lro': 'large-receive-offload',
+    'rxvlan': 'rx-vlan-offload',
+    'txvlan': 'tx-vlan-offload',
+    'ntuple': 'ntuple-filters',
+    'rxhash': 'receive-hashing',
+}
+
+
+def parse_settings(group, data):
+    """Parse the output of ethtool -g, -l, -c or -k.
+
+    :param group: The objects.EthtoolOpts group shown by data.
+    :param data: The output of ethtool.
+    :returns: a dict of parameter: current value.
+    """
+    lines = data.splitlines()
+    if group in ('rings', 'channels'):
+        # the current settings follow the pre-set maximums
+        for i, line in enumerate(lines):
+            if line.startswith('Current hardware settings'):
+                lines = lines[i + 1:]
+                break
+    settings = {}
+    for line in lines:
+        if group == 'coalesce' and line.startswith('Adaptive'):
+            # Adaptive RX: on  TX: off
+            for direction, value in re.findall(r'(RX|TX):\s*(\S+)', line):
+                settings['adaptive-%s' % direction.lower()] = value
+            continue
+        key, sep, value = line.partition(':')
+        value = value.split()
+        if not sep or not value:
+            continue
+        settings[key.strip().lower().replace(' ', '-')] = value[0]
+    return settings
+
+
+def current_settings(name, opts):
+    """Return the current settings of a device for the groups of opts.
+
+    :param name: The device name.
+    :param opts: An objects.EthtoolOpts.
+    :returns: a dict of group: dict of parameter: value. Groups which
+        could not be read are left out.
+    """
+    current = {}
+    for group, (set_option, show_option) in _GROUP_OPTIONS:
+        if not getattr(opts, group):
+            continue
+        try:
+            out, err = processutils.execute(ETHTOOL, show_option, name)
+        except (processutils.ProcessExecutionError, OSError) as e:
+            logger.warning('Could not read the ethtool %s of %s: %s' %
+                           (group, name, e))
+            continue
+        current[group] = parse_settings(group, out)
+    return current
+
+
+def commands(name, opts, current=None):
+    """Return the ethtool commands applying opts to a device.
+
+    :param name: The device name.
+    :param opts: An objects.EthtoolOpts.
+    :param current: The current settings of the device (see
+        current_settings), in which case only the settings which differ
+        are applied. All the settings of a group missing from current are
+        applied.
+    :returns: a list of ethtool argument lists, one per group.
+    """
+    cmds = []
+    for group, (set_option, show_option) in _GROUP_OPTIONS:
+        settings = getattr(opts, group)
+        group_current = (current or {}).get(group)
+        args = []
+        for key in sorted(settings):
+            if group_current is not None:
+                if group == 'features':
+                    value = group_current.get(FEATURE_NAMES.get(key, key),
+                                              group_current.get(key))
+                else:
+                    value = group_current.get(key)
+                if value == settings[key]:
+                    continue
+            args.extend([key, settings[key]])
+        if args:
+            cmds.append([set_option, name] + args)
+    return cmds
+
+
+def ifcfg_opts(name, opts):
+    """Return the ETHTOOL_OPTS value of an ifcfg file."""
+    return '; '.join(' '.join(cmd) for cmd in commands(name, opts))
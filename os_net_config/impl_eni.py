@@ -16,9 +16,10 @@
 
 import logging
 
-import netaddr
 import os_net_config
+from os_net_config import ethtool
 from os_net_config import objects
+from os_net_config import steering
 from os_net_config import utils
 
 
@@ -126,12 +127,44 @@ class ENINetConfig(os_net_config.NetConfig):
             data += _iface
             data += address_data
             data += "    vlan-raw-device %s\n" % interface.device
+        elif isinstance(interface, objects.LinuxBridge):
+            data += "auto %s\n" % interface.name
+            data += _iface
+            data += address_data
+            ports = [member.name for member in interface.members]
+            data += "    bridge_ports %s\n" % (" ".join(ports) or "none")
+            data += "    bridge_fd 0\n"
+            if interface.stp is not None:
+                stp = 'on' if interface.stp else 'off'
+                data += "    bridge_stp %s\n" % stp
+            if interface.vlan_filtering:
+                data += "    bridge_vlan_aware yes\n"
+            if interface.multicast_snooping is not None:
+                data += "    bridge_mcsnoop %i\n" % \
+                        interface.multicast_snooping
+            if interface.ageing_time is not None:
+                data += "    bridge_ageing %i\n" % interface.ageing_time
+            if interface.primary_interface_name:
+                mac = utils.interface_mac(interface.primary_interface_name)
+                data += "    bridge_hw %s\n" % mac
         else:
             data += "auto %s\n" % interface.name
             data += _iface
             data += address_data
         if interface.mtu:
             data += "    mtu %i\n" % interface.mtu
+        if interface.bridge_vlans:
+            data += "    bridge_vids %s\n" % " ".join(interface.bridge_vlans)
+        if interface.bridge_pvid is not None:
+            data += "    bridge_pvid %i\n" % interface.bridge_pvid
+        if isinstance(interface, objects.Interface) and interface.ethtool_opts:
+            for cmd in ethtool.commands(interface.name,
+                                        interface.ethtool_opts):
+                data += "    pre-up %s %s\n" % (ethtool.ETHTOOL, ' '.join(cmd))
+        if getattr(interface, 'queue_steering', None):
+            # the IRQs of the queues only exist once the device is up
+            data += "    post-up %s\n" % steering.steer_command(
+                interface.name, interface.queue_steering)
 
         if interface.hwaddr:
             raise NotImplemented("hwaddr is not implemented.")
@@ -147,7 +180,8 @@ class ENINetConfig(os_net_config.NetConfig):
         :param interface: The Interface object to add.
         """
         logger.info('adding interface: %s' % interface.name)
-        data = self._add_common(interface)
+        self._track_object(interface)
+        data = self.render_cached(self._add_common, interface)
         logger.debug('interface data: %s' % data)
         self.interfaces[interface.name] = data
         if interface.routes:
@@ -159,19 +193,34 @@ class ENINetConfig(os_net_config.NetConfig):
         :param bridge: The OvsBridge object to add.
         """
         logger.info('adding bridge: %s' % bridge.name)
-        data = self._add_common(bridge)
+        self._track_object(bridge)
+        data = self.render_cached(self._add_common, bridge)
         logger.debug('bridge data: %s' % data)
         self.bridges[bridge.name] = data
         if bridge.routes:
             self._add_routes(bridge.name, bridge.routes)
 
+    def add_linux_bridge(self, bridge):
+        """Add a LinuxBridge object to the net config object.
+
+        :param bridge: The LinuxBridge object to add.
+        """
+        logger.info('adding linux bridge: %s' % bridge.name)
+        self._track_object(bridge)
+        data = self.render_cached(self._add_common, bridge)
+        logger.debug('linux bridge data: %s' % data)
+        self.bridges[bridge.name] = data
+        if bridge.routes:
+            self._add_routes(bridge.name, bridge.routes)
+
     def add_vlan(self, vlan):
         """Add a Vlan object to the net config object.
 
         :param vlan: The vlan object to add.
         """
         logger.info('adding vlan: %s' % vlan.name)
-        data = self._add_common(vlan)
+        self._track_object(vlan)
+        data = self.render_cached(self._add_common, vlan)
         logger.debug('vlan data: %s' % data)
         self.interfaces[vlan.name] = data
         if vlan.routes:
@@ -179,18 +228,49 @@ class ENINetConfig(os_net_config.NetConfig):
 
     def _add_routes(self, interface_name, routes=[]):
         logger.info('adding custom route for interface: %s' % interface_name)
+        self.routes[interface_name] = self.render_cached(self._render_routes,
+                                                         interface_name,
+                                                         routes)
+        logger.debug('route data: %s' % self.routes[interface_name])
+
+    def _render_routes(self, interface_name, routes):
         data = ""
         for route in routes:
+            if (route.next_hops or route.table or route.metric is not None or
+                    utils.route_metrics(route)):
+                # route can't do multipath, tables or TCP settings, ip can
+                dst = 'default' if route.default else route.ip_netmask
+                family = '-%i' % route.version()
+                data += "up ip %s route add %s %s\n" % (
+                    family, dst, utils.route_args(route, interface_name))
+                data += "down ip %s route del %s" % (family, dst)
+                if route.table:
+                    data += " table %s" % route.table
+                if route.metric is not None:
+                    data += " metric %i" % route.metric
+                data += "\n"
+                continue
             if route.default and not route.ip_netmask:
-                rt = netaddr.IPNetwork("0.0.0.0/0")
+                rt = utils.ip_network("0.0.0.0/0")
             else:
-                rt = netaddr.IPNetwork(route.ip_netmask)
+                rt = utils.ip_network(route.ip_netmask)
             data += "up route add -net %s netmask %s gw %s\n" % (
-                    str(rt.ip), str(rt.netmask), route.next_hop)
+                    rt.ip, rt.netmask, route.next_hop)
             data += "down route del -net %s netmask %s gw %s\n" % (
-                    str(rt.ip), str(rt.netmask), route.next_hop)
-        self.routes[interface_name] = data
-        logger.debug('route data: %s' % self.routes[interface_name])
+                    rt.ip, rt.netmask, route.next_hop)
+        return data
+
+    def _config_chunks(self):
+        """Generate the stanzas of the interfaces file, in order."""
+        # write out bridges first. This ensures that an ifup -a
+        # on reboot brings them up first
+        for bridge_name, bridge_data in self.bridges.iteritems():
+            yield bridge_data
+            yield self.routes.get(bridge_name) or ''
+
+        for interface_name, iface_data in self.interfaces.iteritems():
+            yield iface_data
+            yield self.routes.get(interface_name) or ''
 
     def apply(self, cleanup=False, activate=True):
         """Apply the network configuration.
@@ -205,22 +285,14 @@ class ENINetConfig(os_net_config.NetConfig):
             mode).
         Note the noop mode is set via the constructor noop boolean
         """
-        new_config = ""
+        new_config = ''.join(self._config_chunks())
+        if activate:
+            self.configure_sriov()
 
-        # write out bridges first. This ensures that an ifup -a
-        # on reboot brings them up first
-        for bridge_name, bridge_data in self.bridges.iteritems():
-            route_data = self.routes.get(bridge_name)
-            bridge_data += (route_data or '')
-            new_config += bridge_data
-
-        for interface_name, iface_data in self.interfaces.iteritems():
-            route_data = self.routes.get(interface_name)
-            iface_data += (route_data or '')
-            new_config += iface_data
-
-        if utils.diff(_network_config_path(self.root_dir), new_config):
+        if self.diff_config(_network_config_path(self.root_dir), new_config):
             if activate:
+                self.restart_devices = (list(self.bridges.keys()) +
+                                        list(self.interfaces.keys()))
                 for interface in self.interfaces.keys():
                     self.ifdown(interface)
 
@@ -237,5 +309,11 @@ class ENINetConfig(os_net_config.NetConfig):
                     self.ifup(interface)
         else:
             logger.info('No interface changes are required.')
+            if activate:
+                self.set_ethtool_opts(sorted(self.device_ethtool_opts))
 
-        return {_network_config_path(self.root_dir): new_config}
+        update_files = {_network_config_path(self.root_dir): new_config}
+        update_files.update(self.persist_queue_steering())
+        if activate:
+            self.set_queue_steering(sorted(self.device_queue_steering))
+        return update_files
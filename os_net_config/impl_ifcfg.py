@@ -19,7 +19,10 @@ import logging
 import re
 
 import os_net_config
+from os_net_config import bridge
+from os_net_config import ethtool
 from os_net_config import objects
+from os_net_config import steering
 from os_net_config import utils
 
 
@@ -47,6 +50,25 @@ def route6_config_path(name):
     return "/etc/sysconfig/network-scripts/route6-%s" % name
 
 
+def route_file_device(device, route):
+    """Return the device whose route files a route is written to.
+
+    The kernel rejects a multipath route until the devices of all its next
+    hops are up, so it is written to the route files of the device of its
+    last next hop: list last the next hop whose device comes up last.
+
+    :param device: The device the route belongs to.
+    :param route: An objects.Route.
+    """
+    if route.next_hops:
+        return route.next_hops[-1].device or device
+    return device
+
+
+def ifup_local_path():
+    return "/sbin/ifup-local"
+
+
 def cleanup_pattern():
     return "/etc/sysconfig/network-scripts/ifcfg-*"
 
@@ -61,25 +83,29 @@ class IfcfgNetConfig(os_net_config.NetConfig):
         self.vlan_data = {}
         self.route_data = {}
         self.route6_data = {}
+        # device: (route data, ipv6 route data) of its own routes
+        self.own_route_data = {}
+        # device: {device of the routes: (route data, ipv6 route data)} of
+        # the multipath routes written to its route files
+        self.multipath_route_data = {}
         self.bridge_data = {}
         self.linuxbridge_data = {}
         self.linuxbond_data = {}
-        self.member_names = {}
         self.renamed_interfaces = {}
         self.bond_primary_ifaces = {}
+        # devices whose MTU alone changed: new MTU
+        self.mtu_changes = {}
         logger.info('Ifcfg net config provider created.')
 
-    def child_members(self, name):
-        children = set()
-        try:
-            for member in self.member_names[name]:
-                children.add(member)
-                children.update(self.child_members(member))
-        except KeyError:
-            pass
-        return children
-
     def _add_common(self, base_opt):
+        self._track_object(base_opt)
+        if isinstance(base_opt, objects.OvsBond):
+            if base_opt.primary_interface_name:
+                primary_name = base_opt.primary_interface_name
+                self.bond_primary_ifaces[base_opt.name] = primary_name
+        return self.render_cached(self._render_common, base_opt)
+
+    def _render_common(self, base_opt):
 
         ovs_extra = []
 
@@ -116,6 +142,12 @@ class IfcfgNetConfig(os_net_config.NetConfig):
                     data += "TYPE=OVSIntPort\n"
                     data += "OVS_BRIDGE=%s\n" % base_opt.bridge_name
                     data += "OVS_OPTIONS=\"tag=%s\"\n" % base_opt.vlan_id
+                elif isinstance(base_opt, objects.OvsDpdkPort):
+                    data += "TYPE=OVSDPDKPort\n"
+                    data += "OVS_BRIDGE=%s\n" % base_opt.bridge_name
+                elif isinstance(base_opt, objects.OvsDpdkBond):
+                    data += "TYPE=OVSDPDKBond\n"
+                    data += "OVS_BRIDGE=%s\n" % base_opt.bridge_name
                 else:
                     data += "TYPE=OVSPort\n"
                     data += "OVS_BRIDGE=%s\n" % base_opt.bridge_name
@@ -123,14 +155,16 @@ class IfcfgNetConfig(os_net_config.NetConfig):
             data += "BRIDGE=%s\n" % base_opt.linux_bridge_name
         if isinstance(base_opt, objects.OvsBridge):
             data += "DEVICETYPE=ovs\n"
-            data += "TYPE=OVSBridge\n"
+            if isinstance(base_opt, objects.OvsUserBridge):
+                data += "TYPE=OVSUserBridge\n"
+                ovs_extra.extend(self._dpdk_other_config(base_opt))
+            else:
+                data += "TYPE=OVSBridge\n"
             if base_opt.use_dhcp:
                 data += "OVSBOOTPROTO=dhcp\n"
-            if base_opt.members:
+            if base_opt.members and base_opt.use_dhcp:
                 members = [member.name for member in base_opt.members]
-                self.member_names[base_opt.name] = members
-                if base_opt.use_dhcp:
-                    data += ("OVSDHCPINTERFACES=\"%s\"\n" % " ".join(members))
+                data += ("OVSDHCPINTERFACES=\"%s\"\n" % " ".join(members))
             if base_opt.primary_interface_name:
                 mac = utils.interface_mac(base_opt.primary_interface_name)
                 ovs_extra.append("set bridge %s other-config:hwaddr=%s" %
@@ -139,16 +173,12 @@ class IfcfgNetConfig(os_net_config.NetConfig):
                 data += "OVS_OPTIONS=\"%s\"\n" % base_opt.ovs_options
             ovs_extra.extend(base_opt.ovs_extra)
         elif isinstance(base_opt, objects.OvsBond):
-            if base_opt.primary_interface_name:
-                primary_name = base_opt.primary_interface_name
-                self.bond_primary_ifaces[base_opt.name] = primary_name
             data += "DEVICETYPE=ovs\n"
             data += "TYPE=OVSBond\n"
             if base_opt.use_dhcp:
                 data += "OVSBOOTPROTO=dhcp\n"
             if base_opt.members:
                 members = [member.name for member in base_opt.members]
-                self.member_names[base_opt.name] = members
                 data += ("BOND_IFACES=\"%s\"\n" % " ".join(members))
             if base_opt.ovs_options:
                 data += "OVS_OPTIONS=\"%s\"\n" % base_opt.ovs_options
@@ -156,11 +186,13 @@ class IfcfgNetConfig(os_net_config.NetConfig):
         elif isinstance(base_opt, objects.LinuxBridge):
             data += "TYPE=Bridge\n"
             data += "DELAY=0\n"
+            if base_opt.stp is not None:
+                data += "STP=%s\n" % ('yes' if base_opt.stp else 'no')
+            opts = bridge.bridging_opts(base_opt)
+            if opts:
+                data += "BRIDGING_OPTS=\"%s\"\n" % " ".join(opts)
             if base_opt.use_dhcp:
                 data += "BOOTPROTO=dhcp\n"
-            if base_opt.members:
-                members = [member.name for member in base_opt.members]
-                self.member_names[base_opt.name] = members
             if base_opt.primary_interface_name:
                 primary_name = base_opt.primary_interface_name
                 primary_mac = utils.interface_mac(primary_name)
@@ -172,11 +204,24 @@ class IfcfgNetConfig(os_net_config.NetConfig):
                 data += "MACADDR=\"%s\"\n" % primary_mac
             if base_opt.use_dhcp:
                 data += "BOOTPROTO=dhcp\n"
-            if base_opt.members:
-                members = [member.name for member in base_opt.members]
-                self.member_names[base_opt.name] = members
             if base_opt.bonding_options:
                 data += "BONDING_OPTS=\"%s\"\n" % base_opt.bonding_options
+        elif isinstance(base_opt, objects.OvsDpdkPort):
+            if base_opt.ovs_options:
+                data += "OVS_OPTIONS=\"%s\"\n" % base_opt.ovs_options
+            ovs_extra.extend(self._dpdk_port_extra(base_opt, base_opt.mtu,
+                                                   base_opt.rx_queue))
+            ovs_extra.extend(base_opt.ovs_extra)
+        elif isinstance(base_opt, objects.OvsDpdkBond):
+            members = [member.name for member in base_opt.members]
+            data += "BOND_IFACES=\"%s\"\n" % " ".join(members)
+            if base_opt.ovs_options:
+                data += "OVS_OPTIONS=\"%s\"\n" % base_opt.ovs_options
+            for member in base_opt.members:
+                ovs_extra.extend(self._dpdk_port_extra(
+                    member, member.mtu or base_opt.mtu,
+                    member.rx_queue or base_opt.rx_queue))
+            ovs_extra.extend(base_opt.ovs_extra)
         elif isinstance(base_opt, objects.OvsTunnel):
             ovs_extra.extend(base_opt.ovs_extra)
             data += "DEVICETYPE=ovs\n"
@@ -190,7 +235,9 @@ class IfcfgNetConfig(os_net_config.NetConfig):
                 data += "BOOTPROTO=dhcp\n"
             elif not base_opt.addresses:
                 data += "BOOTPROTO=none\n"
-        if base_opt.mtu:
+        if base_opt.mtu and not isinstance(base_opt, (objects.OvsDpdkPort,
+                                                      objects.OvsDpdkBond)):
+            # the MTU of DPDK ports is an OVS mtu_request
             data += "MTU=%i\n" % base_opt.mtu
         if base_opt.use_dhcpv6 or base_opt.v6_addresses():
             data += "IPV6INIT=yes\n"
@@ -219,6 +266,9 @@ class IfcfgNetConfig(os_net_config.NetConfig):
 
         if base_opt.hwaddr:
             data += "HWADDR=%s\n" % base_opt.hwaddr
+        if isinstance(base_opt, objects.Interface) and base_opt.ethtool_opts:
+            data += "ETHTOOL_OPTS=\"%s\"\n" % \
+                    ethtool.ifcfg_opts(base_opt.name, base_opt.ethtool_opts)
         if ovs_extra:
             data += "OVS_EXTRA=\"%s\"\n" % " -- ".join(ovs_extra)
         if not base_opt.defroute:
@@ -233,35 +283,107 @@ class IfcfgNetConfig(os_net_config.NetConfig):
                 logger.warning('ifcfg format supports a max of 2 dns servers.')
         return data
 
+    @staticmethod
+    def _dpdk_other_config(bridge):
+        other_config = ['dpdk-init=true']
+        if bridge.pmd_cpus:
+            mask = sum(1 << cpu
+                       for cpu in steering.parse_cpu_list(bridge.pmd_cpus))
+            other_config.append('pmd-cpu-mask=%x' % mask)
+        if bridge.socket_mem:
+            other_config.append('dpdk-socket-mem=%s' % bridge.socket_mem)
+        return ['set Open_vSwitch . other_config:%s' % value
+                for value in other_config]
+
+    @staticmethod
+    def _dpdk_port_extra(dpdk_port, mtu, rx_queue):
+        ovs_extra = ['set Interface %s options:dpdk-devargs=%s' %
+                     (dpdk_port.name, dpdk_port.get_pci_address())]
+        if mtu:
+            ovs_extra.append('set Interface %s mtu_request=%i' %
+                             (dpdk_port.name, mtu))
+        if rx_queue:
+            ovs_extra.append('set Interface %s options:n_rxq=%i' %
+                             (dpdk_port.name, rx_queue))
+        return ovs_extra
+
     def _add_routes(self, interface_name, routes=[]):
         logger.info('adding custom route for interface: %s' % interface_name)
+        own_routes = []
+        moved_routes = {}
+        for route in routes:
+            device = route_file_device(interface_name, route)
+            if device == interface_name:
+                own_routes.append(route)
+            else:
+                moved_routes.setdefault(device, []).append(route)
+        self.own_route_data[interface_name] = self.render_cached(
+            self._render_routes, interface_name, own_routes)
+        for device in list(self.multipath_route_data):
+            if self.multipath_route_data[device].pop(interface_name, None):
+                self._update_route_data(device)
+        for device, device_routes in moved_routes.items():
+            # hops without a device still go through interface_name
+            self.multipath_route_data.setdefault(device, {})[
+                interface_name] = self.render_cached(
+                    self._render_routes, interface_name, device_routes)
+            self._update_route_data(device)
+        self._update_route_data(interface_name)
+        logger.debug('route data: %s' % self.route_data[interface_name])
+        logger.debug('ipv6 route data: %s' % self.route6_data[interface_name])
+
+    def _update_route_data(self, name):
+        """Set the route data of a device, with the routes moved to it."""
+        data, data6 = self.own_route_data.get(name, ('', ''))
+        moved = self.multipath_route_data.get(name, {})
+        for device in sorted(moved):
+            data += moved[device][0]
+            data6 += moved[device][1]
+        self.route_data[name] = data
+        self.route6_data[name] = data6
+
+    def install_multipath_routes(self):
+        """Install the multipath routes moved to another device's files.
+
+        Devices are not brought up in the order of the next hops, so the
+        routes are installed once all of them are up, with a single ip
+        batch per IP version. Reconciled routes are installed by
+        reconcile_routes.
+        """
+        if self.reconcile_routes:
+            return
+        for version, index in (('-4', 0), ('-6', 1)):
+            commands = []
+            for name in sorted(self.multipath_route_data):
+                moved = self.multipath_route_data[name]
+                for device in sorted(moved):
+                    commands.extend('route replace %s' % line for line
+                                    in moved[device][index].splitlines())
+            if commands:
+                msg = 'installing %i multipath routes' % len(commands)
+                self.execute(msg, '/sbin/ip', version, '-force', '-batch',
+                             '-', process_input='\n'.join(commands) + '\n')
+
+    def _render_routes(self, interface_name, routes):
         data = ""
         first_line = ""
         data6 = ""
         first_line6 = ""
         for route in routes:
-            if ":" not in route.next_hop:
+            via = utils.route_args(route, interface_name)
+            if route.version() == 4:
                 # Route is an IPv4 route
                 if route.default:
-                    first_line = "default via %s dev %s\n" % (route.next_hop,
-                                                              interface_name)
+                    first_line = "default %s\n" % via
                 else:
-                    data += "%s via %s dev %s\n" % (route.ip_netmask,
-                                                    route.next_hop,
-                                                    interface_name)
+                    data += "%s %s\n" % (route.ip_netmask, via)
             else:
                 # Route is an IPv6 route
                 if route.default:
-                    first_line6 = "default via %s dev %s\n" % (route.next_hop,
-                                                               interface_name)
+                    first_line6 = "default %s\n" % via
                 else:
-                    data6 += "%s via %s dev %s\n" % (route.ip_netmask,
-                                                     route.next_hop,
-                                                     interface_name)
-        self.route_data[interface_name] = first_line + data
-        self.route6_data[interface_name] = first_line6 + data6
-        logger.debug('route data: %s' % self.route_data[interface_name])
-        logger.debug('ipv6 route data: %s' % self.route6_data[interface_name])
+                    data6 += "%s %s\n" % (route.ip_netmask, via)
+        return (first_line + data, first_line6 + data6)
 
     def add_interface(self, interface):
         """Add an Interface object to the net config object.
@@ -316,6 +438,18 @@ class IfcfgNetConfig(os_net_config.NetConfig):
         if bridge.routes:
             self._add_routes(bridge.name, bridge.routes)
 
+    def add_ovs_user_bridge(self, bridge):
+        """Add an OvsUserBridge object to the net config object.
+
+        :param bridge: The OvsUserBridge object to add.
+        """
+        logger.info('adding ovs user bridge: %s' % bridge.name)
+        data = self._add_common(bridge)
+        logger.debug('ovs user bridge data: %s' % data)
+        self.bridge_data[bridge.name] = data
+        if bridge.routes:
+            self._add_routes(bridge.name, bridge.routes)
+
     def add_linux_bridge(self, bridge):
         """Add a LinuxBridge object to the net config object.
 
@@ -340,6 +474,17 @@ class IfcfgNetConfig(os_net_config.NetConfig):
         """
         pass
 
+    def brings_up_members(self, name):
+        """Tell whether bringing a bond or bridge up brings its members up.
+
+        ifup-ovs brings up the OVSDHCPINTERFACES of a DHCP OVS bridge and
+        the BOND_IFACES of an OVS bond, ifup-eth the slaves of a Linux
+        bond, but not the ports of a Linux bridge.
+
+        :param name: The name of the bond or bridge.
+        """
+        return name not in self.linuxbridge_data
+
     def add_bond(self, bond):
         """Add an OvsBond object to the net config object.
 
@@ -374,6 +519,26 @@ class IfcfgNetConfig(os_net_config.NetConfig):
         logger.debug('ovs tunnel data: %s' % data)
         self.interface_data[tunnel.name] = data
 
+    def add_ovs_dpdk_port(self, dpdk_port):
+        """Add an OvsDpdkPort object to the net config object.
+
+        :param dpdk_port: The OvsDpdkPort object to add.
+        """
+        logger.info('adding ovs dpdk port: %s' % dpdk_port.name)
+        data = self._add_common(dpdk_port)
+        logger.debug('ovs dpdk port data: %s' % data)
+        self.interface_data[dpdk_port.name] = data
+
+    def add_ovs_dpdk_bond(self, bond):
+        """Add an OvsDpdkBond object to the net config object.
+
+        :param bond: The OvsDpdkBond object to add.
+        """
+        logger.info('adding ovs dpdk bond: %s' % bond.name)
+        data = self._add_common(bond)
+        logger.debug('ovs dpdk bond data: %s' % data)
+        self.interface_data[bond.name] = data
+
     def generate_ivs_config(self, ivs_uplinks, ivs_interfaces):
         """Generate configuration content for ivs."""
 
@@ -394,6 +559,70 @@ class IfcfgNetConfig(os_net_config.NetConfig):
                 % (uplink_str, intf_str))
         return data
 
+    def link_up_commands(self):
+        """Return the commands to run each time a device is brought up.
+
+        Initscripts have no port VLAN setting, so the ports of VLAN
+        filtering bridges (and the bridges themselves) also get their
+        VLANs set, from those of a newly added port.
+        """
+        commands = super(IfcfgNetConfig, self).link_up_commands()
+        for name, port in self.bridge_vlan_ports.items():
+            for command in bridge.vlan_commands(
+                    name, port.bridge_vlans, port.bridge_pvid,
+                    bridge.DEFAULT_PORT_VLANS,
+                    self_port=isinstance(port, objects.LinuxBridge)):
+                commands.setdefault(name, []).append(
+                    '%s %s' % (bridge.BRIDGE, command))
+        return commands
+
+    @staticmethod
+    def _live_change(name, path, data):
+        """Tell whether the changes of a device config can be made live.
+
+        That is the case when only its MTU and/or ethtool options changed
+        and its link exists. A removed MTU needs a restart, the default
+        MTU of the link being unknown.
+        """
+        if utils.interface_mtu(name) is None:
+            return False
+        old_data = utils.get_file_data(path)
+        if (re.search(r'^MTU=', old_data, re.MULTILINE) and
+                not re.search(r'^MTU=', data, re.MULTILINE)):
+            return False
+
+        def without_live(config):
+            return [line for line in config.splitlines()
+                    if not line.startswith(('MTU=', 'IPV6_MTU=',
+                                            'ETHTOOL_OPTS='))]
+        return without_live(old_data) == without_live(data)
+
+    def _diff_device(self, name, path, data, changed_devices):
+        """Tell whether the config or route files of a device changed.
+
+        The device is added to changed_devices if it has to be restarted,
+        which is not the case when only its routes changed and routes are
+        reconciled (see reconcile_routes), or when only its MTU and/or
+        ethtool options changed and they can be set on the live link (see
+        mtu_changes and set_ethtool_opts).
+        """
+        config_changed = self.diff_config(path, data)
+        live_changed = False
+        if config_changed and self._live_change(name, path, data):
+            mtu = re.search(r'^MTU=(\d+)$', data, re.MULTILINE)
+            if mtu and int(mtu.group(1)) != utils.interface_mtu(name):
+                self.mtu_changes[name] = int(mtu.group(1))
+            config_changed = False
+            live_changed = True
+        route_path = self.root_dir + route_config_path(name)
+        route6_path = self.root_dir + route6_config_path(name)
+        routes_changed = (
+            self.diff_config(route_path, self.route_data.get(name, '')) or
+            self.diff_config(route6_path, self.route6_data.get(name, '')))
+        if config_changed or (routes_changed and not self.reconcile_routes):
+            changed_devices.append(name)
+        return config_changed or routes_changed or live_changed
+
     def apply(self, cleanup=False, activate=True):
         """Apply the network configuration.
 
@@ -410,6 +639,7 @@ class IfcfgNetConfig(os_net_config.NetConfig):
         Note the noop mode is set via the constructor noop boolean
         """
         logger.info('applying network configs...')
+        changed_devices = []
         restart_interfaces = []
         restart_vlans = []
         restart_bridges = []
@@ -431,11 +661,8 @@ class IfcfgNetConfig(os_net_config.NetConfig):
             if "IVS_BRIDGE" in iface_data:
                 ivs_uplinks.append(interface_name)
             all_file_names.append(route6_path)
-            if (utils.diff(interface_path, iface_data) or
-                    utils.diff(route_path, route_data) or
-                    utils.diff(route6_path, route6_data)):
-                restart_interfaces.append(interface_name)
-                restart_interfaces.extend(self.child_members(interface_name))
+            if self._diff_device(interface_name, interface_path, iface_data,
+                                 changed_devices):
                 update_files[interface_path] = iface_data
                 update_files[route_path] = route_data
                 update_files[route6_path] = route6_data
@@ -453,10 +680,8 @@ class IfcfgNetConfig(os_net_config.NetConfig):
             all_file_names.append(route_path)
             all_file_names.append(route6_path)
             ivs_interfaces.append(interface_name)
-            if (utils.diff(interface_path, iface_data) or
-                    utils.diff(route_path, route_data)):
-                restart_interfaces.append(interface_name)
-                restart_interfaces.extend(self.child_members(interface_name))
+            if self._diff_device(interface_name, interface_path, iface_data,
+                                 changed_devices):
                 update_files[interface_path] = iface_data
                 update_files[route_path] = route_data
                 update_files[route6_path] = route6_data
@@ -473,10 +698,8 @@ class IfcfgNetConfig(os_net_config.NetConfig):
             all_file_names.append(vlan_path)
             all_file_names.append(vlan_route_path)
             all_file_names.append(vlan_route6_path)
-            if (utils.diff(vlan_path, vlan_data) or
-                    utils.diff(vlan_route_path, route_data)):
-                restart_vlans.append(vlan_name)
-                restart_vlans.extend(self.child_members(vlan_name))
+            if self._diff_device(vlan_name, vlan_path, vlan_data,
+                                 changed_devices):
                 update_files[vlan_path] = vlan_data
                 update_files[vlan_route_path] = route_data
                 update_files[vlan_route6_path] = route6_data
@@ -493,11 +716,8 @@ class IfcfgNetConfig(os_net_config.NetConfig):
             all_file_names.append(bridge_path)
             all_file_names.append(br_route_path)
             all_file_names.append(br_route6_path)
-            if (utils.diff(bridge_path, bridge_data) or
-                    utils.diff(br_route_path, route_data) or
-                    utils.diff(br_route6_path, route6_data)):
-                restart_bridges.append(bridge_name)
-                restart_interfaces.extend(self.child_members(bridge_name))
+            if self._diff_device(bridge_name, bridge_path, bridge_data,
+                                 changed_devices):
                 update_files[bridge_path] = bridge_data
                 update_files[br_route_path] = route_data
                 update_files[br_route6_path] = route6_data
@@ -513,11 +733,8 @@ class IfcfgNetConfig(os_net_config.NetConfig):
             all_file_names.append(bridge_path)
             all_file_names.append(br_route_path)
             all_file_names.append(br_route6_path)
-            if (utils.diff(bridge_path, bridge_data) or
-                    utils.diff(br_route_path, route_data) or
-                    utils.diff(br_route6_path, route6_data)):
-                restart_bridges.append(bridge_name)
-                restart_interfaces.extend(self.child_members(bridge_name))
+            if self._diff_device(bridge_name, bridge_path, bridge_data,
+                                 changed_devices):
                 update_files[bridge_path] = bridge_data
                 update_files[br_route_path] = route_data
                 update_files[br_route6_path] = route6_data
@@ -533,11 +750,8 @@ class IfcfgNetConfig(os_net_config.NetConfig):
             all_file_names.append(bond_path)
             all_file_names.append(bond_route_path)
             all_file_names.append(bond_route6_path)
-            if (utils.diff(bond_path, bond_data) or
-                    utils.diff(bond_route_path, route_data) or
-                    utils.diff(bond_route6_path, route6_data)):
-                restart_linux_bonds.append(bond_name)
-                restart_interfaces.extend(self.child_members(bond_name))
+            if self._diff_device(bond_name, bond_path, bond_data,
+                                 changed_devices):
                 update_files[bond_path] = bond_data
                 update_files[bond_route_path] = route_data
                 update_files[bond_route6_path] = route6_data
@@ -545,6 +759,18 @@ class IfcfgNetConfig(os_net_config.NetConfig):
                 logger.info('No changes required for linux bond: %s' %
                             bond_name)
 
+        self.restart_devices = self.topology.restart_set(changed_devices)
+        for device in self.restart_devices:
+            kind = self.topology.kind(device)
+            if kind == 'vlan':
+                restart_vlans.append(device)
+            elif kind == 'linux_bond':
+                restart_linux_bonds.append(device)
+            elif kind == 'bridge':
+                restart_bridges.append(device)
+            else:
+                restart_interfaces.append(device)
+
         if cleanup:
             for ifcfg_file in glob.iglob(cleanup_pattern()):
                 if ifcfg_file not in all_file_names:
@@ -565,8 +791,8 @@ class IfcfgNetConfig(os_net_config.NetConfig):
             for linux_bond in restart_linux_bonds:
                 self.ifdown(linux_bond)
 
-            for bridge in restart_bridges:
-                self.ifdown(bridge, iftype='bridge')
+            for bridge_name in restart_bridges:
+                self.ifdown(bridge_name, iftype='bridge')
 
             for oldname, newname in self.renamed_interfaces.iteritems():
                 self.ifrename(oldname, newname)
@@ -579,12 +805,27 @@ class IfcfgNetConfig(os_net_config.NetConfig):
             data = self.generate_ivs_config(ivs_uplinks, ivs_interfaces)
             self.write_config(location, data)
 
+        update_files.update(self.persist_queue_steering())
+        # ifup-post runs ifup-local with the device brought up
+        update_files.update(self.persist_link_up_hook(ifup_local_path(),
+                                                      '$1'))
+
         if activate:
+            self.configure_sriov()
+            self.bind_dpdk_ports()
+            self.set_mtus(dict((name, mtu) for name, mtu
+                               in self.mtu_changes.items()
+                               if name not in self.restart_devices))
+            # restarted devices get their ethtool options from ifup
+            self.set_ethtool_opts(sorted(
+                name for name in self.device_ethtool_opts
+                if name not in self.restart_devices))
+
             for linux_bond in restart_linux_bonds:
                 self.ifup(linux_bond)
 
-            for bridge in restart_bridges:
-                self.ifup(bridge, iftype='bridge')
+            for bridge_name in restart_bridges:
+                self.ifup(bridge_name, iftype='bridge')
 
             for interface in restart_interfaces:
                 self.ifup(interface)
@@ -609,4 +850,13 @@ class IfcfgNetConfig(os_net_config.NetConfig):
             for vlan in restart_vlans:
                 self.ifup(vlan)
 
+            # all the next hop devices of the multipath routes are up now
+            self.install_multipath_routes()
+
+            # ports join bridges with the default VLAN only
+            self.configure_bridge_vlans()
+
+            # queues are steered after ifup, which may re-create them
+            self.set_queue_steering(sorted(self.device_queue_steering))
+
         return update_files
@@ -0,0 +1,380 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014-2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import glob
+import logging
+import os
+
+import os_net_config
+from os_net_config import objects
+from os_net_config import utils
+
+
+logger = logging.getLogger(__name__)
+
+_PREFIX = "10-os-net-config-"
+
+# bonding_options keys and the [Bond] settings they map to, the values of
+# the *Sec settings are in milliseconds
+_BOND_OPTIONS = {
+    'mode': 'Mode',
+    'miimon': 'MIIMonitorSec',
+    'updelay': 'UpDelaySec',
+    'downdelay': 'DownDelaySec',
+    'lacp_rate': 'LACPTransmitRate',
+    'xmit_hash_policy': 'TransmitHashPolicy',
+    'ad_select': 'AdSelect',
+    'fail_over_mac': 'FailOverMACPolicy',
+    'arp_interval': 'ARPIntervalSec',
+    'arp_ip_target': 'ARPIPTargets',
+    'arp_validate': 'ARPValidate',
+    'arp_all_targets': 'ARPAllTargets',
+    'primary_reselect': 'PrimaryReselectPolicy',
+    'resend_igmp': 'ResendIGMP',
+    'packets_per_slave': 'PacketsPerSlave',
+    'num_grat_arp': 'GratuitousARP',
+    'all_slaves_active': 'AllSlavesActive',
+    'min_links': 'MinLinks',
+}
+
+
+def networkd_config_dir():
+    return "/etc/systemd/network"
+
+
+def dispatcher_hook_path():
+    # networkd-dispatcher runs it once a link has a carrier
+    return "/etc/networkd-dispatcher/carrier.d/50-os-net-config"
+
+
+def network_config_path(name):
+    return "%s/%s%s.network" % (networkd_config_dir(), _PREFIX, name)
+
+
+def netdev_config_path(name):
+    return "%s/%s%s.netdev" % (networkd_config_dir(), _PREFIX, name)
+
+
+def cleanup_pattern():
+    return "%s/%s*" % (networkd_config_dir(), _PREFIX)
+
+
+def link_exists(name):
+    return os.path.exists('/sys/class/net/%s' % name)
+
+
+class NetworkdNetConfig(os_net_config.NetConfig):
+    """Configure network interfaces using systemd-networkd.
+
+       Each device gets a .network file and virtual devices (VLANs, bonds
+       and bridges) a .netdev file too, in /etc/systemd/network.
+    """
+
+    def __init__(self, noop=False, root_dir=''):
+        super(NetworkdNetConfig, self).__init__(noop, root_dir)
+        self.network_data = {}
+        self.route_data = {}
+        self.netdev_data = {}
+        self.vlans = {}
+        self.bridge_vlan_data = {}
+        logger.info('Networkd net config provider created.')
+
+    @staticmethod
+    def _bond_settings(bonding_options):
+        data = ""
+        for option in (bonding_options or "").split():
+            key, sep, value = option.partition('=')
+            if key == 'primary':
+                # set on the primary member's .network instead
+                continue
+            if not sep or key not in _BOND_OPTIONS:
+                msg = 'Unsupported bonding option for networkd: %s' % option
+                raise objects.InvalidConfigException(msg)
+            setting = _BOND_OPTIONS[key]
+            if setting.endswith('Sec'):
+                value = '%sms' % value
+            elif key == 'arp_ip_target':
+                value = value.replace(',', ' ')
+            data += "%s=%s\n" % (setting, value)
+        return data
+
+    def _render_netdev(self, base_opt):
+        data = "# This file is autogenerated by os-net-config\n"
+        data += "[NetDev]\n"
+        data += "Name=%s\n" % base_opt.name
+        if isinstance(base_opt, objects.Vlan):
+            data += "Kind=vlan\n"
+        elif isinstance(base_opt, objects.LinuxBond):
+            data += "Kind=bond\n"
+        else:
+            data += "Kind=bridge\n"
+        if base_opt.mtu:
+            data += "MTUBytes=%i\n" % base_opt.mtu
+        if getattr(base_opt, 'primary_interface_name', None):
+            mac = utils.interface_mac(base_opt.primary_interface_name)
+            data += "MACAddress=%s\n" % mac
+        if isinstance(base_opt, objects.Vlan):
+            data += "\n[VLAN]\n"
+            data += "Id=%i\n" % base_opt.vlan_id
+        elif isinstance(base_opt, objects.LinuxBond):
+            bond_data = self._bond_settings(base_opt.bonding_options)
+            if bond_data:
+                data += "\n[Bond]\n" + bond_data
+        elif isinstance(base_opt, objects.LinuxBridge):
+            bridge_data = self._bridge_settings(base_opt)
+            if bridge_data:
+                data += "\n[Bridge]\n" + bridge_data
+        return data
+
+    @staticmethod
+    def _bridge_settings(bridge):
+        data = ""
+        if bridge.vlan_filtering:
+            data += "VLANFiltering=yes\n"
+        if bridge.stp is not None:
+            data += "STP=%s\n" % ('yes' if bridge.stp else 'no')
+        if bridge.multicast_snooping is not None:
+            data += "MulticastSnooping=%s\n" % (
+                'yes' if bridge.multicast_snooping else 'no')
+        if bridge.ageing_time is not None:
+            data += "AgeingTimeSec=%i\n" % bridge.ageing_time
+        return data
+
+    @staticmethod
+    def _render_bridge_vlans(base_opt):
+        data = ""
+        for vlan_range in base_opt.bridge_vlans:
+            data += "\n[BridgeVLAN]\n"
+            data += "VLAN=%s\n" % vlan_range
+        if base_opt.bridge_pvid is not None:
+            data += "\n[BridgeVLAN]\n"
+            data += "PVID=%i\n" % base_opt.bridge_pvid
+            data += "EgressUntagged=%i\n" % base_opt.bridge_pvid
+        return data
+
+    def _render_network(self, base_opt, bond_primary=False):
+        data = "# This file is autogenerated by os-net-config\n"
+        data += "[Match]\n"
+        data += "Name=%s\n" % base_opt.name
+        if base_opt.mtu:
+            data += "\n[Link]\n"
+            data += "MTUBytes=%i\n" % base_opt.mtu
+        data += "\n[Network]\n"
+        if base_opt.use_dhcp and base_opt.use_dhcpv6:
+            data += "DHCP=yes\n"
+        elif base_opt.use_dhcp:
+            data += "DHCP=ipv4\n"
+        elif base_opt.use_dhcpv6:
+            data += "DHCP=ipv6\n"
+        for address in base_opt.v4_addresses() + base_opt.v6_addresses():
+            data += "Address=%s/%s\n" % (address.ip, address.prefixlen)
+        for dns_server in base_opt.dns_servers:
+            data += "DNS=%s\n" % dns_server
+        if base_opt.linux_bond_name:
+            data += "Bond=%s\n" % base_opt.linux_bond_name
+            if bond_primary:
+                data += "PrimarySlave=true\n"
+        if base_opt.linux_bridge_name:
+            data += "Bridge=%s\n" % base_opt.linux_bridge_name
+        if base_opt.use_dhcp and not base_opt.defroute:
+            data += "\n[DHCP]\n"
+            data += "UseRoutes=false\n"
+        return data
+
+    def _render_routes(self, routes):
+        data = ""
+        for route in routes:
+            data += "\n[Route]\n"
+            if route.ip_netmask:
+                data += "Destination=%s\n" % route.ip_netmask
+            if not route.next_hops:
+                data += "Gateway=%s\n" % route.next_hop
+            for hop in route.next_hops:
+                data += "MultiPathRoute=%s" % hop.next_hop
+                if hop.device:
+                    data += "@%s" % hop.device
+                if hop.weight:
+                    data += " %i" % hop.weight
+                data += "\n"
+            if route.table:
+                data += "Table=%s\n" % route.table
+            if route.metric is not None:
+                data += "Metric=%i\n" % route.metric
+            if route.mtu:
+                # networkd can't lock the MTU of a route
+                data += "MTUBytes=%i\n" % route.mtu
+            if route.advmss:
+                data += "TCPAdvertisedMaximumSegmentSize=%i\n" % route.advmss
+            if route.initcwnd:
+                data += "InitialCongestionWindow=%i\n" % route.initcwnd
+            if route.initrwnd:
+                data += ("InitialAdvertisedReceiveWindow=%i\n" %
+                         route.initrwnd)
+            if route.quickack is not None:
+                data += "QuickAck=%s\n" % ('yes' if route.quickack else 'no')
+            if route.congctl:
+                data += "TCPCongestionControlAlgorithm=%s\n" % route.congctl
+        return data
+
+    def _add_common(self, base_opt, bond_primary=False):
+        if base_opt.hwaddr:
+            raise os_net_config.NotImplemented("hwaddr is not implemented.")
+        if base_opt.ovs_port or base_opt.ivs_bridge_name:
+            msg = "%s: OVS and IVS are not implemented." % base_opt.name
+            raise os_net_config.NotImplemented(msg)
+        self._track_object(base_opt)
+        data = self.render_cached(self._render_network, base_opt,
+                                  bond_primary)
+        logger.debug('network data: %s' % data)
+        self.network_data[base_opt.name] = data
+        if base_opt.bridge_vlans or base_opt.bridge_pvid is not None:
+            self.bridge_vlan_data[base_opt.name] = self.render_cached(
+                self._render_bridge_vlans, base_opt)
+        if base_opt.routes:
+            logger.info('adding custom route for interface: %s' %
+                        base_opt.name)
+            self.route_data[base_opt.name] = self.render_cached(
+                self._render_routes, base_opt.routes)
+            logger.debug('route data: %s' % self.route_data[base_opt.name])
+
+    def _add_netdev(self, base_opt):
+        data = self.render_cached(self._render_netdev, base_opt)
+        logger.debug('netdev data: %s' % data)
+        self.netdev_data[base_opt.name] = data
+
+    def add_interface(self, interface):
+        """Add an Interface object to the net config object.
+
+        :param interface: The Interface object to add.
+        """
+        logger.info('adding interface: %s' % interface.name)
+        self._add_common(interface, interface.primary and
+                         bool(interface.linux_bond_name))
+
+    def add_vlan(self, vlan):
+        """Add a Vlan object to the net config object.
+
+        :param vlan: The vlan object to add.
+        """
+        logger.info('adding vlan: %s' % vlan.name)
+        device = vlan.device or vlan.linux_bond_name
+        if not device:
+            msg = "%s: VLANs need a device." % vlan.name
+            raise os_net_config.NotImplemented(msg)
+        self._add_netdev(vlan)
+        self._add_common(vlan)
+        self.vlans.setdefault(device, [])
+        if vlan.name not in self.vlans[device]:
+            self.vlans[device].append(vlan.name)
+
+    def add_linux_bridge(self, bridge):
+        """Add a LinuxBridge object to the net config object.
+
+        :param bridge: The LinuxBridge object to add.
+        """
+        logger.info('adding linux bridge: %s' % bridge.name)
+        self._add_netdev(bridge)
+        self._add_common(bridge)
+
+    def add_linux_bond(self, bond):
+        """Add a LinuxBond object to the net config object.
+
+        :param bond: The LinuxBond object to add.
+        """
+        logger.info('adding linux bond: %s' % bond.name)
+        self._add_netdev(bond)
+        self._add_common(bond)
+
+    def _network_files(self):
+        files = {}
+        names = set(self.network_data) | set(self.vlans)
+        for name in names:
+            data = self.network_data.get(name)
+            if data is None:
+                # a device only configured to carry VLANs
+                data = "# This file is autogenerated by os-net-config\n"
+                data += "[Match]\nName=%s\n\n[Network]\n" % name
+            for vlan in sorted(self.vlans.get(name, [])):
+                data += "VLAN=%s\n" % vlan
+            data += self.bridge_vlan_data.get(name, '')
+            data += self.route_data.get(name, '')
+            files[self.root_dir + network_config_path(name)] = (name, data)
+        for name, data in self.netdev_data.items():
+            files[self.root_dir + netdev_config_path(name)] = (name, data)
+        return files
+
+    def apply(self, cleanup=False, activate=True):
+        """Apply the network configuration.
+
+        :param cleanup: A boolean which indicates whether any undefined
+            (existing but not present in the object model) interface
+            should be disabled and deleted.
+        :param activate: A boolean which indicates if the config should
+            be activated by reloading networkd and reconfiguring the
+            changed devices.
+        :returns: a dict of the format: filename/data which contains info
+            for each file that was changed (or would be changed if in --noop
+            mode).
+        Note the noop mode is set via the constructor noop boolean
+        """
+        logger.info('applying network configs...')
+        update_files = {}
+        changed_devices = set()
+        files = self._network_files()
+        for location, (name, data) in files.items():
+            if self.diff_config(location, data):
+                update_files[location] = data
+                changed_devices.add(name)
+            else:
+                logger.info('No changes required for %s' % location)
+
+        removed_files = []
+        if cleanup:
+            for location in glob.iglob(self.root_dir + cleanup_pattern()):
+                if location not in files:
+                    removed_files.append(location)
+
+        if activate:
+            self.configure_sriov()
+
+        for location in sorted(update_files):
+            self.write_config(location, update_files[location])
+        for location in removed_files:
+            self.remove_config(location)
+
+        if activate and (update_files or removed_files):
+            # the reload creates the new virtual devices and configures
+            # new links, existing links only need to be reconfigured
+            self.execute('reloading networkd', '/bin/networkctl', 'reload')
+            self.restart_devices = [name for name in sorted(changed_devices)
+                                    if link_exists(name)]
+            if self.restart_devices:
+                msg = ('reconfiguring devices: %s' %
+                       ', '.join(self.restart_devices))
+                self.execute(msg, '/bin/networkctl', 'reconfigure',
+                             *self.restart_devices)
+
+        if activate:
+            # networkd leaves ethtool settings to udev .link files, which
+            # only apply when a link appears
+            self.set_ethtool_opts(sorted(self.device_ethtool_opts))
+
+        update_files.update(self.persist_queue_steering())
+        update_files.update(self.persist_link_up_hook(dispatcher_hook_path(),
+                                                      '$IFACE'))
+        if activate:
+            self.set_queue_steering(sorted(self.device_queue_steering))
+        return update_files
@@ -16,40 +16,94 @@
 
 import logging
 import netaddr
+import re
+import threading
+
 from oslo_utils import strutils
 
+from os_net_config import bridge
 from os_net_config import utils
 
 
 logger = logging.getLogger(__name__)
 
-_NUMBERED_NICS = None
+# The resolver used by objects created without one
+_NIC_RESOLVER = None
+
+# A list of CPU numbers and ranges, e.g. 0-3,8
+_CPU_LIST_RE = re.compile(r'^\d+(-\d+)?(,\d+(-\d+)?)*$')
 
 
 class InvalidConfigException(ValueError):
     pass
 
 
-def object_from_json(json):
+def object_from_json(json, nic_resolver=None):
     obj_type = json.get("type")
     if obj_type == "interface":
-        return Interface.from_json(json)
+        return Interface.from_json(json, nic_resolver)
     elif obj_type == "vlan":
-        return Vlan.from_json(json)
+        return Vlan.from_json(json, nic_resolver)
     elif obj_type == "ovs_bridge":
-        return OvsBridge.from_json(json)
+        return OvsBridge.from_json(json, nic_resolver)
     elif obj_type == "ovs_bond":
-        return OvsBond.from_json(json)
+        return OvsBond.from_json(json, nic_resolver)
+    elif obj_type == "ovs_user_bridge":
+        return OvsUserBridge.from_json(json, nic_resolver)
+    elif obj_type == "ovs_dpdk_port":
+        return OvsDpdkPort.from_json(json, nic_resolver)
+    elif obj_type == "ovs_dpdk_bond":
+        return OvsDpdkBond.from_json(json, nic_resolver)
+    elif obj_type == "sriov_pf":
+        return SriovPF.from_json(json, nic_resolver)
+    elif obj_type == "sriov_vf":
+        return SriovVF.from_json(json, nic_resolver)
     elif obj_type == "linux_bond":
-        return LinuxBond.from_json(json)
+        return LinuxBond.from_json(json, nic_resolver)
     elif obj_type == "linux_bridge":
-        return LinuxBridge.from_json(json)
+        return LinuxBridge.from_json(json, nic_resolver)
     elif obj_type == "ivs_bridge":
-        return IvsBridge.from_json(json)
+        return IvsBridge.from_json(json, nic_resolver)
     elif obj_type == "ivs_interface":
-        return IvsInterface.from_json(json)
+        return IvsInterface.from_json(json, nic_resolver)
     elif obj_type == "ovs_tunnel":
-        return OvsTunnel.from_json(json)
+        return OvsTunnel.from_json(json, nic_resolver)
+    elif obj_type == "vlan_range":
+        return VlanRange.from_json(json, nic_resolver)
+
+
+def expand_object(obj):
+    """Yield the objects an object expands to.
+
+    Range objects (see VlanRange) yield each of the objects they
+    describe, lazily; any other object is yielded as is.
+    """
+    if isinstance(obj, VlanRange):
+        for vlan in obj.vlans():
+            yield vlan
+    else:
+        yield obj
+
+
+def object_to_json(obj):
+    """Return a normalized, JSON serializable representation of an object.
+
+    Objects are reduced to a dict of their public attributes plus their
+    class name (members, addresses and routes included), so two objects which
+    would render the same configuration map to equal values.
+    """
+    if isinstance(obj, (list, tuple)):
+        return [object_to_json(item) for item in obj]
+    elif isinstance(obj, dict):
+        return dict((str(key), object_to_json(value))
+                    for key, value in obj.items())
+    elif hasattr(obj, '__dict__'):
+        data = object_to_json(dict((key, value)
+                                   for key, value in vars(obj).items()
+                                   if not key.startswith('_')))
+        data['__class__'] = obj.__class__.__name__
+        return data
+    return obj
 
 
 def _get_required_field(json, name, object_name):
@@ -61,64 +115,283 @@ def _get_required_field(json, name, object_name):
     return field
 
 
-def _numbered_nics(nic_mapping=None):
-    mapping = nic_mapping or {}
-    global _NUMBERED_NICS
-    if _NUMBERED_NICS:
-        return _NUMBERED_NICS
-    _NUMBERED_NICS = {}
-    count = 0
-    active_nics = utils.ordered_active_nics()
-    for nic in active_nics:
-        count += 1
-        nic_alias = "nic%i" % count
-        nic_mapped = mapping.get(nic_alias, nic)
-
-        # The mapping is either invalid, or specifies a mac
-        if nic_mapped not in active_nics:
-            for active in active_nics:
+def _bridge_vlans_from_json(json, object_name):
+    """Return the VLANs (ranges) and PVID of a Linux bridge port."""
+    vlans_json = json.get('bridge_vlans') or []
+    if not isinstance(vlans_json, list):
+        vlans_json = str(vlans_json).split(',')
+    try:
+        vids = bridge.parse_vlan_list(vlans_json)
+    except ValueError:
+        msg = 'Invalid %s bridge_vlans: %s' % (object_name, vlans_json)
+        raise InvalidConfigException(msg)
+    if vids and (min(vids) < bridge.MIN_VLAN or max(vids) > bridge.MAX_VLAN):
+        msg = '%s bridge_vlans out of range: %s' % (object_name, vlans_json)
+        raise InvalidConfigException(msg)
+    pvid = json.get('bridge_pvid')
+    if pvid is not None:
+        pvid = _int_field(pvid, 'bridge_pvid', object_name,
+                          bridge.MIN_VLAN, bridge.MAX_VLAN)
+    return bridge.vlan_ranges(vids), pvid
+
+
+def _members_from_json(json, nic_resolver=None, bridge_ports=False):
+    members = []
+    members_json = json.get('members')
+    if members_json:
+        if isinstance(members_json, list):
+            for member in members_json:
+                # the parent needs all of its members up front
+                member_objs = list(expand_object(
+                    object_from_json(member, nic_resolver)))
+                if bridge_ports:
+                    vlans, pvid = _bridge_vlans_from_json(
+                        member, member.get('name', 'Bridge port'))
+                    for member_obj in member_objs:
+                        member_obj.bridge_vlans = vlans
+                        member_obj.bridge_pvid = pvid
+                members.extend(member_objs)
+        else:
+            msg = 'Members must be a list.'
+            raise InvalidConfigException(msg)
+    return members
+
+
+class NicResolver(object):
+    """Map the nicN aliases of a config to active nic names.
+
+    A resolver is meant to be created once per render context (e.g. per
+    host) and passed to the objects it builds. Results are memoized per
+    nic_mapping and the resolver can be shared between threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._numbered = {}
+        self._active_nics = None
+        self._mac_index = None
+
+    def _nic_by_mac(self, mac):
+        if self._mac_index is None:
+            self._mac_index = {}
+            for active in self._active_nics:
                 try:
                     active_mac = utils.interface_mac(active)
                 except IOError:
                     continue
-                if nic_mapped == active_mac:
+                self._mac_index.setdefault(active_mac.lower(), active)
+        return self._mac_index.get(mac.lower())
+
+    def _number_nics(self, mapping):
+        numbered_nics = {}
+        if self._active_nics is None:
+            self._active_nics = utils.ordered_active_nics()
+        active_nics = self._active_nics
+        for count, nic in enumerate(active_nics, 1):
+            nic_alias = "nic%i" % count
+            nic_mapped = mapping.get(nic_alias, nic)
+
+            # The mapping is either invalid, or specifies a mac
+            if nic_mapped not in active_nics:
+                active = self._nic_by_mac(nic_mapped)
+                if active:
                     logger.debug("%s matches device %s" % (nic_mapped, active))
                     nic_mapped = active
-                    break
-            else:
-                # The mapping can't specify a non-active or non-existent nic
-                logger.warning('interface %s is not in an active nic (%s)'
-                               % (nic_mapped, ', '.join(active_nics)))
-                continue
+                else:
+                    # The mapping can't specify a non-active or non-existent
+                    # nic
+                    logger.warning('interface %s is not in an active nic (%s)'
+                                   % (nic_mapped, ', '.join(active_nics)))
+                    continue
 
-        # Duplicate mappings are not allowed
-        if nic_mapped in _NUMBERED_NICS.values():
-            msg = ('interface %s already mapped, '
-                   'check mapping file for duplicates'
-                   % nic_mapped)
-            raise InvalidConfigException(msg)
+            # Duplicate mappings are not allowed
+            if nic_mapped in numbered_nics.values():
+                msg = ('interface %s already mapped, '
+                       'check mapping file for duplicates'
+                       % nic_mapped)
+                raise InvalidConfigException(msg)
 
-        _NUMBERED_NICS[nic_alias] = nic_mapped
-        logger.info("%s mapped to: %s" % (nic_alias, nic_mapped))
-    if not _NUMBERED_NICS:
-        logger.warning('No active nics found.')
-    return _NUMBERED_NICS
+            numbered_nics[nic_alias] = nic_mapped
+            logger.info("%s mapped to: %s" % (nic_alias, nic_mapped))
+        if not numbered_nics:
+            logger.warning('No active nics found.')
+        return numbered_nics
+
+    def numbered_nics(self, nic_mapping=None):
+        """Return the dict of nicN aliases to nic names for a mapping.
+
+        :param nic_mapping: A dict of nicN aliases to nic names or MACs,
+            overriding the default numbering of the active nics.
+        """
+        mapping = nic_mapping or {}
+        key = tuple(sorted(mapping.items()))
+        with self._lock:
+            if key not in self._numbered:
+                self._numbered[key] = self._number_nics(mapping)
+            return self._numbered[key]
+
+    def refresh(self):
+        """Number the nics which became active since the last numbering.
+
+        Newly active nics are numbered after the known ones and nics which
+        are gone keep their number, so the existing aliases never move:
+        only aliases which did not resolve before can be added.
+
+        :returns: the set of the nicN aliases added by the refresh.
+        :raises: InvalidConfigException if a new nic is already mapped.
+        """
+        with self._lock:
+            if self._active_nics is None:
+                return set()
+            new_nics = [nic for nic in utils.ordered_active_nics()
+                        if nic not in self._active_nics]
+            if not new_nics:
+                return set()
+            logger.info('New active nics: %s' % ', '.join(new_nics))
+            self._active_nics = self._active_nics + new_nics
+            self._mac_index = None
+            added = set()
+            for key, numbered in list(self._numbered.items()):
+                renumbered = self._number_nics(dict(key))
+                renumbered.update(numbered)
+                added.update(set(renumbered) - set(numbered))
+                self._numbered[key] = renumbered
+            return added
+
+
+def _numbered_nics(nic_mapping=None):
+    global _NIC_RESOLVER
+    if _NIC_RESOLVER is None:
+        _NIC_RESOLVER = NicResolver()
+    return _NIC_RESOLVER.numbered_nics(nic_mapping)
+
+
+def _resolve_nics(nic_mapping=None, nic_resolver=None):
+    if nic_resolver is not None:
+        return nic_resolver.numbered_nics(nic_mapping)
+    return _numbered_nics(nic_mapping)
+
+
+class NextHop(object):
+    """Base class for the next hops of multipath routes.
+
+    The device defaults to the device of the route, and the weight to 1.
+    """
+
+    def __init__(self, next_hop, device=None, weight=None):
+        self.next_hop = next_hop
+        self.device = device
+        self.weight = weight
+
+    @staticmethod
+    def from_json(json):
+        if not isinstance(json, dict):
+            msg = 'Next hops must be dicts.'
+            raise InvalidConfigException(msg)
+        next_hop = _get_required_field(json, 'next_hop', 'NextHop')
+        device = json.get('device')
+        weight = json.get('weight')
+        if weight is not None:
+            weight = _int_field(weight, 'weight', 'NextHop', 1, 256)
+        return NextHop(next_hop, device, weight)
 
 
 class Route(object):
-    """Base class for network routes."""
+    """Base class for network routes.
+
+    A route goes through either a single next_hop, or through all of its
+    next_hops (objects.NextHop) as an equal-cost multipath route. table
+    and metric place the route, while mtu (locked or not), advmss,
+    initcwnd, initrwnd, quickack and congctl tune the TCP connections
+    using it.
+    """
+
+    METRICS = ('mtu', 'advmss', 'initcwnd', 'initrwnd', 'quickack',
+               'congctl')
 
-    def __init__(self, next_hop, ip_netmask="", default=False):
+    def __init__(self, next_hop=None, ip_netmask="", default=False,
+                 next_hops=None, table=None, metric=None, mtu=None,
+                 mtu_lock=False, advmss=None, initcwnd=None, initrwnd=None,
+                 quickack=None, congctl=None):
         self.next_hop = next_hop
         self.ip_netmask = ip_netmask
         self.default = default
+        self.next_hops = next_hops or []
+        self.table = table
+        self.metric = metric
+        self.mtu = mtu
+        self.mtu_lock = mtu_lock
+        self.advmss = advmss
+        self.initcwnd = initcwnd
+        self.initrwnd = initrwnd
+        self.quickack = quickack
+        self.congctl = congctl
+
+    def gateways(self):
+        """Return the next hop addresses of the route."""
+        if self.next_hops:
+            return [hop.next_hop for hop in self.next_hops]
+        return [self.next_hop]
+
+    def version(self):
+        """Return the IP version of the route, from its next hops."""
+        return 6 if ':' in self.gateways()[0] else 4
+
+    @staticmethod
+    def _table_from_json(table):
+        if isinstance(table, int) or str(table).isdigit():
+            return str(_int_field(table, 'table', 'Route', 1, 2 ** 32 - 1))
+        table = str(table)
+        if not re.match(r'^[A-Za-z][\w.-]*$', table):
+            msg = 'Invalid Route table: %s' % table
+            raise InvalidConfigException(msg)
+        return table
 
     @staticmethod
     def from_json(json):
-        next_hop = _get_required_field(json, 'next_hop', 'Route')
+        next_hops_json = json.get('next_hops')
+        if next_hops_json:
+            if not isinstance(next_hops_json, list):
+                msg = 'Route next_hops must be a list.'
+                raise InvalidConfigException(msg)
+            if json.get('next_hop'):
+                msg = 'Routes take either next_hop or next_hops.'
+                raise InvalidConfigException(msg)
+            next_hop = None
+            next_hops = [NextHop.from_json(hop) for hop in next_hops_json]
+        else:
+            next_hop = _get_required_field(json, 'next_hop', 'Route')
+            next_hops = None
         ip_netmask = json.get('ip_netmask', "")
         default = strutils.bool_from_string(str(json.get('default', False)))
-        return Route(next_hop, ip_netmask, default)
+        opts = {}
+        if json.get('table') is not None:
+            opts['table'] = Route._table_from_json(json['table'])
+        if json.get('metric') is not None:
+            opts['metric'] = _int_field(json['metric'], 'metric', 'Route', 0,
+                                        2 ** 32 - 1)
+        for name, minimum in (('mtu', 68), ('advmss', 1), ('initcwnd', 1),
+                              ('initrwnd', 1)):
+            if json.get(name) is not None:
+                opts[name] = _int_field(json[name], name, 'Route', minimum,
+                                        65535)
+        if json.get('mtu_lock') is not None:
+            opts['mtu_lock'] = strutils.bool_from_string(
+                str(json['mtu_lock']))
+            if opts['mtu_lock'] and 'mtu' not in opts:
+                msg = 'Route mtu_lock needs an mtu.'
+                raise InvalidConfigException(msg)
+        if json.get('quickack') is not None:
+            opts['quickack'] = strutils.bool_from_string(
+                str(json['quickack']))
+        if json.get('congctl') is not None:
+            congctl = str(json['congctl'])
+            if not re.match(r'^[a-z0-9_]+$', congctl):
+                msg = 'Invalid Route congctl: %s' % congctl
+                raise InvalidConfigException(msg)
+            opts['congctl'] = congctl
+        return Route(next_hop, ip_netmask, default, next_hops=next_hops,
+                     **opts)
 
 
 class Address(object):
@@ -126,9 +399,13 @@ class Address(object):
 
     def __init__(self, ip_netmask):
         self.ip_netmask = ip_netmask
-        ip_nw = netaddr.IPNetwork(self.ip_netmask)
-        self.ip = str(ip_nw.ip)
-        self.netmask = str(ip_nw.netmask)
+        try:
+            ip_nw = utils.ip_network(self.ip_netmask)
+        except (netaddr.AddrFormatError, ValueError, TypeError):
+            msg = 'Invalid address: %s' % ip_netmask
+            raise InvalidConfigException(msg)
+        self.ip = ip_nw.ip
+        self.netmask = ip_nw.netmask
         self.prefixlen = ip_nw.prefixlen
         self.version = ip_nw.version
 
@@ -138,17 +415,135 @@ class Address(object):
         return Address(ip_netmask)
 
 
+def _int_field(value, name, object_name, minimum=None, maximum=None):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        msg = '%s %s must be an integer.' % (object_name, name)
+        raise InvalidConfigException(msg)
+    if ((minimum is not None and value < minimum) or
+            (maximum is not None and value > maximum)):
+        msg = '%s %s out of range: %i' % (object_name, name, value)
+        raise InvalidConfigException(msg)
+    return value
+
+
+class EthtoolOpts(object):
+    """Base class for the ethtool settings of a device.
+
+    Settings are grouped as ethtool sets them: rings (-G), channels
+    (-L), coalesce (-C) and features (-K). Each group is a dict of
+    ethtool parameter: value, with values normalized to the strings
+    ethtool takes (booleans to on/off).
+    """
+
+    GROUPS = ('rings', 'channels', 'coalesce', 'features')
+
+    def __init__(self, rings=None, channels=None, coalesce=None,
+                 features=None):
+        self.rings = rings or {}
+        self.channels = channels or {}
+        self.coalesce = coalesce or {}
+        self.features = features or {}
+
+    def __bool__(self):
+        return any(getattr(self, group) for group in self.GROUPS)
+
+    __nonzero__ = __bool__
+
+    @staticmethod
+    def _value(group, key, value):
+        if isinstance(value, bool):
+            return 'on' if value else 'off'
+        value = str(value)
+        if not re.match(r'^[\w.-]+$', value):
+            msg = 'Invalid ethtool %s value for %s: %s' % (group, key, value)
+            raise InvalidConfigException(msg)
+        return value
+
+    @staticmethod
+    def from_json(json):
+        if not isinstance(json, dict):
+            msg = 'Ethtool options must be a dict.'
+            raise InvalidConfigException(msg)
+        unknown = sorted(set(json) - set(EthtoolOpts.GROUPS))
+        if unknown:
+            msg = 'Unknown ethtool option groups: %s' % ', '.join(unknown)
+            raise InvalidConfigException(msg)
+        groups = {}
+        for group in EthtoolOpts.GROUPS:
+            settings = json.get(group) or {}
+            if not isinstance(settings, dict):
+                msg = 'Ethtool %s must be a dict.' % group
+                raise InvalidConfigException(msg)
+            groups[group] = {}
+            for key, value in settings.items():
+                key = str(key).lower()
+                if not re.match(r'^[a-z0-9-]+$', key):
+                    msg = 'Invalid ethtool %s parameter: %s' % (group, key)
+                    raise InvalidConfigException(msg)
+                groups[group][key] = EthtoolOpts._value(group, key, value)
+        return EthtoolOpts(**groups)
+
+
+class QueueSteering(object):
+    """Base class for the queue steering of a device.
+
+    Each setting is a CPU list (e.g. "0-3,8"), or "auto" for the CPUs of
+    the NUMA node of the device. The packets of every receive queue are
+    steered to all the rps_cpus, while the CPUs of xps_cpus and
+    irq_affinity are given round-robin to the transmit queues and to the
+    queue IRQs.
+    """
+
+    SETTINGS = ('rps_cpus', 'xps_cpus', 'irq_affinity')
+
+    def __init__(self, rps_cpus=None, xps_cpus=None, irq_affinity=None):
+        self.rps_cpus = rps_cpus
+        self.xps_cpus = xps_cpus
+        self.irq_affinity = irq_affinity
+
+    def __bool__(self):
+        return any(getattr(self, setting) for setting in self.SETTINGS)
+
+    __nonzero__ = __bool__
+
+    @staticmethod
+    def from_json(json):
+        if json == 'auto':
+            json = dict((setting, 'auto')
+                        for setting in QueueSteering.SETTINGS)
+        if not isinstance(json, dict):
+            msg = 'Queue steering must be "auto" or a dict.'
+            raise InvalidConfigException(msg)
+        unknown = sorted(set(json) - set(QueueSteering.SETTINGS))
+        if unknown:
+            msg = 'Unknown queue steering settings: %s' % ', '.join(unknown)
+            raise InvalidConfigException(msg)
+        settings = {}
+        for setting in QueueSteering.SETTINGS:
+            value = json.get(setting)
+            if value is None:
+                continue
+            value = str(value).replace(' ', '')
+            if value != 'auto' and not _CPU_LIST_RE.match(value):
+                msg = 'Invalid CPU list for %s: %s' % (setting, value)
+                raise InvalidConfigException(msg)
+            settings[setting] = value
+        return QueueSteering(**settings)
+
+
 class _BaseOpts(object):
     """Base abstraction for logical port options."""
 
     def __init__(self, name, use_dhcp=False, use_dhcpv6=False, addresses=None,
                  routes=None, mtu=None, primary=False, nic_mapping=None,
                  persist_mapping=False, defroute=True, dhclient_args=None,
-                 dns_servers=None):
+                 dns_servers=None, nic_resolver=None):
         addresses = addresses or []
         routes = routes or []
         dns_servers = dns_servers or []
-        numbered_nic_names = _numbered_nics(nic_mapping)
+        numbered_nic_names = _resolve_nics(nic_mapping, nic_resolver)
         self.hwaddr = None
         self.hwname = None
         self.renamed = False
@@ -162,6 +557,10 @@ class _BaseOpts(object):
                 self.name = numbered_nic_names[name]
         else:
             self.name = name
+        for route in routes:
+            for hop in route.next_hops:
+                if hop.device in numbered_nic_names and not persist_mapping:
+                    hop.device = numbered_nic_names[hop.device]
 
         self.mtu = mtu
         self.use_dhcp = use_dhcp
@@ -178,6 +577,10 @@ class _BaseOpts(object):
         self.linux_bond_name = None  # internal
         self.ovs_port = False  # internal
         self.primary_interface_name = None  # internal
+        # the VLANs of the port of the device on a VLAN filtering Linux
+        # bridge, set by the bridge
+        self.bridge_vlans = []
+        self.bridge_pvid = None
 
     def v4_addresses(self):
         v4_addresses = []
@@ -248,20 +651,117 @@ class Interface(_BaseOpts):
     def __init__(self, name, use_dhcp=False, use_dhcpv6=False, addresses=None,
                  routes=None, mtu=None, primary=False, nic_mapping=None,
                  persist_mapping=False, defroute=True, dhclient_args=None,
-                 dns_servers=None):
+                 dns_servers=None, ethtool_opts=None, queue_steering=None,
+                 nic_resolver=None):
         addresses = addresses or []
         routes = routes or []
         dns_servers = dns_servers or []
         super(Interface, self).__init__(name, use_dhcp, use_dhcpv6, addresses,
                                         routes, mtu, primary, nic_mapping,
                                         persist_mapping, defroute,
-                                        dhclient_args, dns_servers)
+                                        dhclient_args, dns_servers,
+                                        nic_resolver=nic_resolver)
+        self.ethtool_opts = ethtool_opts
+        self.queue_steering = queue_steering
 
     @staticmethod
-    def from_json(json):
+    def from_json(json, nic_resolver=None):
         name = _get_required_field(json, 'name', 'Interface')
         opts = _BaseOpts.base_opts_from_json(json)
-        return Interface(name, *opts)
+        ethtool_opts = None
+        ethtool_json = json.get('ethtool_opts')
+        if ethtool_json:
+            ethtool_opts = EthtoolOpts.from_json(ethtool_json)
+        queue_steering = None
+        steering_json = json.get('queue_steering')
+        if steering_json:
+            queue_steering = QueueSteering.from_json(steering_json)
+        return Interface(name, *opts, ethtool_opts=ethtool_opts,
+                         queue_steering=queue_steering,
+                         nic_resolver=nic_resolver)
+
+
+class SriovPF(Interface):
+    """Base class for SR-IOV physical functions.
+
+    A PF is configured as an interface and gets numvfs virtual functions,
+    whose settings are given by SriovVF objects.
+    """
+
+    def __init__(self, name, numvfs, use_dhcp=False, use_dhcpv6=False,
+                 addresses=None, routes=None, mtu=None, primary=False,
+                 nic_mapping=None, persist_mapping=False, defroute=True,
+                 dhclient_args=None, dns_servers=None, ethtool_opts=None,
+                 queue_steering=None, nic_resolver=None):
+        super(SriovPF, self).__init__(name, use_dhcp, use_dhcpv6, addresses,
+                                      routes, mtu, primary, nic_mapping,
+                                      persist_mapping, defroute,
+                                      dhclient_args, dns_servers,
+                                      ethtool_opts=ethtool_opts,
+                                      queue_steering=queue_steering,
+                                      nic_resolver=nic_resolver)
+        self.numvfs = _int_field(numvfs, 'numvfs', 'SriovPF', 0)
+
+    @staticmethod
+    def from_json(json, nic_resolver=None):
+        name = _get_required_field(json, 'name', 'SriovPF')
+        numvfs = json.get('numvfs')
+        if numvfs is None:
+            msg = 'SriovPF JSON objects require \'numvfs\' to be configured.'
+            raise InvalidConfigException(msg)
+        opts = _BaseOpts.base_opts_from_json(json)
+        return SriovPF(name, numvfs, *opts, nic_resolver=nic_resolver)
+
+
+class SriovVF(object):
+    """Base class for the settings of SR-IOV virtual functions.
+
+    VFs are set up through their PF, they are not configured as devices
+    of their own. Settings left to None are not changed.
+    """
+
+    def __init__(self, device, vfid, macaddr=None, vlan_id=None,
+                 spoofchk=None, trust=None, min_tx_rate=None,
+                 max_tx_rate=None, nic_mapping=None, nic_resolver=None):
+        numbered_nic_names = _resolve_nics(nic_mapping, nic_resolver)
+        self.device = numbered_nic_names.get(device, device)
+        self.vfid = _int_field(vfid, 'vfid', 'SriovVF', 0)
+        self.name = '%s_vf%i' % (self.device, self.vfid)
+        if macaddr is not None and not netaddr.valid_mac(str(macaddr)):
+            msg = 'Invalid macaddr for %s: %s' % (self.name, macaddr)
+            raise InvalidConfigException(msg)
+        self.macaddr = macaddr
+        self.vlan_id = None
+        if vlan_id is not None:
+            self.vlan_id = _int_field(vlan_id, 'vlan_id', 'SriovVF', 0, 4095)
+        self.spoofchk = spoofchk
+        self.trust = trust
+        self.min_tx_rate = None
+        if min_tx_rate is not None:
+            self.min_tx_rate = _int_field(min_tx_rate, 'min_tx_rate',
+                                          'SriovVF', 0)
+        self.max_tx_rate = None
+        if max_tx_rate is not None:
+            self.max_tx_rate = _int_field(max_tx_rate, 'max_tx_rate',
+                                          'SriovVF', 0)
+
+    @staticmethod
+    def from_json(json, nic_resolver=None):
+        device = _get_required_field(json, 'device', 'SriovVF')
+        vfid = json.get('vfid')
+        if vfid is None:
+            msg = 'SriovVF JSON objects require \'vfid\' to be configured.'
+            raise InvalidConfigException(msg)
+        flags = {}
+        for flag in ('spoofchk', 'trust'):
+            if json.get(flag) is not None:
+                flags[flag] = strutils.bool_from_string(str(json[flag]))
+        return SriovVF(device, vfid, macaddr=json.get('macaddr'),
+                       vlan_id=json.get('vlan_id'),
+                       min_tx_rate=json.get('min_tx_rate'),
+                       max_tx_rate=json.get('max_tx_rate'),
+                       nic_mapping=json.get('nic_mapping'),
+                       nic_resolver=nic_resolver, **flags)
 
 
 class Vlan(_BaseOpts):
@@ -274,7 +774,8 @@ class Vlan(_BaseOpts):
     def __init__(self, device, vlan_id, use_dhcp=False, use_dhcpv6=False,
                  addresses=None, routes=None, mtu=None, primary=False,
                  nic_mapping=None, persist_mapping=False, defroute=True,
-                 dhclient_args=None, dns_servers=None):
+                 dhclient_args=None, dns_servers=None,
+                 nic_resolver=None):
         addresses = addresses or []
         routes = routes or []
         dns_servers = dns_servers or []
@@ -282,22 +783,23 @@ class Vlan(_BaseOpts):
         super(Vlan, self).__init__(name, use_dhcp, use_dhcpv6, addresses,
                                    routes, mtu, primary, nic_mapping,
                                    persist_mapping, defroute, dhclient_args,
-                                   dns_servers)
+                                   dns_servers,
+                                   nic_resolver=nic_resolver)
         self.vlan_id = int(vlan_id)
 
-        numbered_nic_names = _numbered_nics(nic_mapping)
+        numbered_nic_names = _resolve_nics(nic_mapping, nic_resolver)
         if device in numbered_nic_names:
             self.device = numbered_nic_names[device]
         else:
             self.device = device
 
     @staticmethod
-    def from_json(json):
+    def from_json(json, nic_resolver=None):
         # A vlan on an OVS bridge won't require a device (OVS Int Port)
         device = json.get('device')
         vlan_id = _get_required_field(json, 'vlan_id', 'Vlan')
         opts = _BaseOpts.base_opts_from_json(json)
-        return Vlan(device, vlan_id, *opts)
+        return Vlan(device, vlan_id, *opts, nic_resolver=nic_resolver)
 
 
 class IvsInterface(_BaseOpts):
@@ -306,7 +808,8 @@ class IvsInterface(_BaseOpts):
     def __init__(self, vlan_id, name='ivs', use_dhcp=False, use_dhcpv6=False,
                  addresses=None, routes=None, mtu=1500, primary=False,
                  nic_mapping=None, persist_mapping=False, defroute=True,
-                 dhclient_args=None, dns_servers=None):
+                 dhclient_args=None, dns_servers=None,
+                 nic_resolver=None):
         addresses = addresses or []
         routes = routes or []
         dns_servers = dns_servers or []
@@ -315,15 +818,17 @@ class IvsInterface(_BaseOpts):
                                            addresses, routes, mtu, primary,
                                            nic_mapping, persist_mapping,
                                            defroute, dhclient_args,
-                                           dns_servers)
+                                           dns_servers,
+                                           nic_resolver=nic_resolver)
         self.vlan_id = int(vlan_id)
 
     @staticmethod
-    def from_json(json):
+    def from_json(json, nic_resolver=None):
         name = json.get('name')
         vlan_id = _get_required_field(json, 'vlan_id', 'IvsInterface')
         opts = _BaseOpts.base_opts_from_json(json)
-        return IvsInterface(vlan_id, name, *opts)
+        return IvsInterface(vlan_id, name, *opts,
+                            nic_resolver=nic_resolver)
 
 
 class OvsBridge(_BaseOpts):
@@ -332,7 +837,8 @@ class OvsBridge(_BaseOpts):
     def __init__(self, name, use_dhcp=False, use_dhcpv6=False, addresses=None,
                  routes=None, mtu=None, members=None, ovs_options=None,
                  ovs_extra=None, nic_mapping=None, persist_mapping=False,
-                 defroute=True, dhclient_args=None, dns_servers=None):
+                 defroute=True, dhclient_args=None, dns_servers=None,
+                 nic_resolver=None):
         addresses = addresses or []
         routes = routes or []
         members = members or []
@@ -341,7 +847,8 @@ class OvsBridge(_BaseOpts):
         super(OvsBridge, self).__init__(name, use_dhcp, use_dhcpv6, addresses,
                                         routes, mtu, False, nic_mapping,
                                         persist_mapping, defroute,
-                                        dhclient_args, dns_servers)
+                                        dhclient_args, dns_servers,
+                                        nic_resolver=nic_resolver)
         self.members = members
         self.ovs_options = ovs_options
         self.ovs_extra = ovs_extra
@@ -359,7 +866,7 @@ class OvsBridge(_BaseOpts):
                     self.primary_interface_name = member.name
 
     @staticmethod
-    def from_json(json):
+    def from_json(json, nic_resolver=None):
         name = _get_required_field(json, 'name', 'OvsBridge')
         (use_dhcp, use_dhcpv6, addresses, routes, mtu, nic_mapping,
          persist_mapping, defroute,
@@ -367,33 +874,194 @@ class OvsBridge(_BaseOpts):
              json, include_primary=False)
         ovs_options = json.get('ovs_options')
         ovs_extra = json.get('ovs_extra', [])
-        members = []
-
-        # members
-        members_json = json.get('members')
-        if members_json:
-            if isinstance(members_json, list):
-                for member in members_json:
-                    members.append(object_from_json(member))
-            else:
-                msg = 'Members must be a list.'
-                raise InvalidConfigException(msg)
+        members = _members_from_json(json, nic_resolver)
 
         return OvsBridge(name, use_dhcp=use_dhcp, use_dhcpv6=use_dhcpv6,
                          addresses=addresses, routes=routes, mtu=mtu,
                          members=members, ovs_options=ovs_options,
                          ovs_extra=ovs_extra, nic_mapping=nic_mapping,
                          persist_mapping=persist_mapping, defroute=defroute,
-                         dhclient_args=dhclient_args, dns_servers=dns_servers)
+                         dhclient_args=dhclient_args, dns_servers=dns_servers,
+                         nic_resolver=nic_resolver)
+
+
+class OvsUserBridge(OvsBridge):
+    """Base class for OVS bridges with a userspace (DPDK) datapath.
+
+    :param pmd_cpus: The CPU list of the DPDK poll mode driver threads
+        (pmd-cpu-mask).
+    :param socket_mem: The hugepage memory in MB DPDK takes from each
+        NUMA node, e.g. "1024,1024" (dpdk-socket-mem).
+    """
+
+    def __init__(self, name, use_dhcp=False, use_dhcpv6=False, addresses=None,
+                 routes=None, mtu=None, members=None, ovs_options=None,
+                 ovs_extra=None, nic_mapping=None, persist_mapping=False,
+                 defroute=True, dhclient_args=None, dns_servers=None,
+                 pmd_cpus=None, socket_mem=None, nic_resolver=None):
+        super(OvsUserBridge, self).__init__(
+            name, use_dhcp, use_dhcpv6, addresses, routes, mtu, members,
+            ovs_options, ovs_extra, nic_mapping, persist_mapping, defroute,
+            dhclient_args, dns_servers, nic_resolver=nic_resolver)
+        if pmd_cpus is not None:
+            pmd_cpus = str(pmd_cpus).replace(' ', '')
+            if not _CPU_LIST_RE.match(pmd_cpus):
+                msg = 'Invalid CPU list for pmd_cpus: %s' % pmd_cpus
+                raise InvalidConfigException(msg)
+        if socket_mem is not None:
+            socket_mem = str(socket_mem).replace(' ', '')
+            if not re.match(r'^\d+(,\d+)*$', socket_mem):
+                msg = 'Invalid socket_mem: %s' % socket_mem
+                raise InvalidConfigException(msg)
+        self.pmd_cpus = pmd_cpus
+        self.socket_mem = socket_mem
+
+    @staticmethod
+    def from_json(json, nic_resolver=None):
+        name = _get_required_field(json, 'name', 'OvsUserBridge')
+        (use_dhcp, use_dhcpv6, addresses, routes, mtu, nic_mapping,
+         persist_mapping, defroute,
+         dhclient_args, dns_servers) = _BaseOpts.base_opts_from_json(
+             json, include_primary=False)
+        ovs_options = json.get('ovs_options')
+        ovs_extra = json.get('ovs_extra', [])
+        pmd_cpus = json.get('pmd_cpus')
+        socket_mem = json.get('socket_mem')
+        members = _members_from_json(json, nic_resolver)
+
+        return OvsUserBridge(name, use_dhcp=use_dhcp, use_dhcpv6=use_dhcpv6,
+                             addresses=addresses, routes=routes, mtu=mtu,
+                             members=members, ovs_options=ovs_options,
+                             ovs_extra=ovs_extra, nic_mapping=nic_mapping,
+                             persist_mapping=persist_mapping,
+                             defroute=defroute, dhclient_args=dhclient_args,
+                             dns_servers=dns_servers, pmd_cpus=pmd_cpus,
+                             socket_mem=socket_mem, nic_resolver=nic_resolver)
+
+
+def _rx_queue_from_json(json, object_name):
+    rx_queue = json.get('rx_queue')
+    if rx_queue is not None:
+        rx_queue = _int_field(rx_queue, 'rx_queue', object_name, 1)
+    return rx_queue
+
+
+class OvsDpdkPort(_BaseOpts):
+    """Base class for OVS DPDK ports.
+
+    A DPDK port has a single member, the nic bound to its DPDK driver.
+    Unless it is set with pci_address, the PCI address of the nic is
+    looked up when the port is rendered or applied (see get_pci_address).
+    """
+
+    def __init__(self, name, mtu=None, members=None, driver='vfio-pci',
+                 rx_queue=None, ovs_options=None, ovs_extra=None,
+                 pci_address=None, nic_mapping=None, persist_mapping=False,
+                 nic_resolver=None):
+        members = members or []
+        ovs_extra = ovs_extra or []
+        super(OvsDpdkPort, self).__init__(name, mtu=mtu,
+                                          nic_mapping=nic_mapping,
+                                          persist_mapping=persist_mapping,
+                                          nic_resolver=nic_resolver)
+        if len(members) != 1 or not isinstance(members[0], Interface):
+            msg = 'OVS DPDK port %s needs a single interface member.' % name
+            raise InvalidConfigException(msg)
+        self.members = members
+        self.driver = driver
+        self.rx_queue = rx_queue
+        self.ovs_options = ovs_options
+        self.ovs_extra = ovs_extra
+        self.pci_address = pci_address
+
+    def get_pci_address(self):
+        """Return the PCI address of the nic of the port.
+
+        It is looked up in the nic inventory, or the local system, when
+        pci_address is not set (see utils.get_pci_address).
+
+        :raises: InvalidConfigException if it is unknown.
+        """
+        pci_address = self.pci_address or utils.get_pci_address(
+            self.members[0].name)
+        if not pci_address:
+            msg = 'Unable to find the PCI address of %s.' % (
+                self.members[0].name)
+            raise InvalidConfigException(msg)
+        return pci_address
+
+    @staticmethod
+    def from_json(json, nic_resolver=None):
+        name = _get_required_field(json, 'name', 'OvsDpdkPort')
+        mtu = json.get('mtu')
+        driver = json.get('driver') or 'vfio-pci'
+        rx_queue = _rx_queue_from_json(json, 'OvsDpdkPort')
+        ovs_options = json.get('ovs_options')
+        ovs_extra = json.get('ovs_extra', [])
+        members = _members_from_json(json, nic_resolver)
+
+        return OvsDpdkPort(name, mtu=mtu, members=members, driver=driver,
+                           rx_queue=rx_queue, ovs_options=ovs_options,
+                           ovs_extra=ovs_extra,
+                           pci_address=json.get('pci_address'),
+                           nic_mapping=json.get('nic_mapping'),
+                           persist_mapping=json.get('persist_mapping'),
+                           nic_resolver=nic_resolver)
+
+
+class OvsDpdkBond(_BaseOpts):
+    """Base class for OVS DPDK bonds, whose members are OvsDpdkPorts."""
+
+    def __init__(self, name, mtu=None, members=None, rx_queue=None,
+                 ovs_options=None, ovs_extra=None, nic_mapping=None,
+                 persist_mapping=False, nic_resolver=None):
+        members = members or []
+        ovs_extra = ovs_extra or []
+        super(OvsDpdkBond, self).__init__(name, mtu=mtu,
+                                          nic_mapping=nic_mapping,
+                                          persist_mapping=persist_mapping,
+                                          nic_resolver=nic_resolver)
+        if len(members) < 2 or not all(isinstance(member, OvsDpdkPort)
+                                       for member in members):
+            msg = ('OVS DPDK bond %s needs at least two OVS DPDK port '
+                   'members.' % name)
+            raise InvalidConfigException(msg)
+        self.members = members
+        self.rx_queue = rx_queue
+        self.ovs_options = ovs_options
+        self.ovs_extra = ovs_extra
+
+    @staticmethod
+    def from_json(json, nic_resolver=None):
+        name = _get_required_field(json, 'name', 'OvsDpdkBond')
+        mtu = json.get('mtu')
+        rx_queue = _rx_queue_from_json(json, 'OvsDpdkBond')
+        ovs_options = json.get('ovs_options')
+        ovs_extra = json.get('ovs_extra', [])
+        members = _members_from_json(json, nic_resolver)
+
+        return OvsDpdkBond(name, mtu=mtu, members=members, rx_queue=rx_queue,
+                           ovs_options=ovs_options, ovs_extra=ovs_extra,
+                           nic_mapping=json.get('nic_mapping'),
+                           persist_mapping=json.get('persist_mapping'),
+                           nic_resolver=nic_resolver)
 
 
 class LinuxBridge(_BaseOpts):
-    """Base class for Linux bridges."""
+    """Base class for Linux bridges.
+
+    With vlan_filtering, the bridge forwards the VLANs of each of its
+    ports (bridge_vlans and bridge_pvid of the members, and of the bridge
+    itself for its own port) instead of all the traffic. ageing_time is in
+    seconds.
+    """
 
     def __init__(self, name, use_dhcp=False, use_dhcpv6=False, addresses=None,
                  routes=None, mtu=None, members=None, nic_mapping=None,
                  persist_mapping=False, defroute=True, dhclient_args=None,
-                 dns_servers=None):
+                 dns_servers=None, vlan_filtering=False, stp=None,
+                 multicast_snooping=None, ageing_time=None,
+                 bridge_vlans=None, bridge_pvid=None, nic_resolver=None):
         addresses = addresses or []
         routes = routes or []
         members = members or []
@@ -401,8 +1069,15 @@ class LinuxBridge(_BaseOpts):
         super(LinuxBridge, self).__init__(name, use_dhcp, use_dhcpv6,
                                           addresses, routes, mtu, False,
                                           nic_mapping, persist_mapping,
-                                          defroute, dhclient_args, dns_servers)
+                                          defroute, dhclient_args, dns_servers,
+                                          nic_resolver=nic_resolver)
         self.members = members
+        self.vlan_filtering = vlan_filtering
+        self.stp = stp
+        self.multicast_snooping = multicast_snooping
+        self.ageing_time = ageing_time
+        self.bridge_vlans = bridge_vlans or []
+        self.bridge_pvid = bridge_pvid
         for member in self.members:
             member.linux_bridge_name = name
             member.ovs_port = False
@@ -414,32 +1089,47 @@ class LinuxBridge(_BaseOpts):
                     self.primary_interface_name = member.primary_interface_name
                 else:
                     self.primary_interface_name = member.name
+        if not vlan_filtering:
+            for port in [self] + self.members:
+                if port.bridge_vlans or port.bridge_pvid is not None:
+                    msg = ('%s: the VLANs of bridge ports need '
+                           'vlan_filtering.' % name)
+                    raise InvalidConfigException(msg)
 
     @staticmethod
-    def from_json(json):
+    def from_json(json, nic_resolver=None):
         name = _get_required_field(json, 'name', 'LinuxBridge')
         (use_dhcp, use_dhcpv6, addresses, routes, mtu, nic_mapping,
          persist_mapping, defroute, dhclient_args,
          dns_servers) = _BaseOpts.base_opts_from_json(
              json, include_primary=False)
-        members = []
-
-        # members
-        members_json = json.get('members')
-        if members_json:
-            if isinstance(members_json, list):
-                for member in members_json:
-                    members.append(object_from_json(member))
-            else:
-                msg = 'Members must be a list.'
-                raise InvalidConfigException(msg)
+        members = _members_from_json(json, nic_resolver, bridge_ports=True)
+        vlan_filtering = strutils.bool_from_string(
+            str(json.get('vlan_filtering', False)))
+        stp = json.get('stp')
+        if stp is not None:
+            stp = strutils.bool_from_string(str(stp))
+        multicast_snooping = json.get('multicast_snooping')
+        if multicast_snooping is not None:
+            multicast_snooping = strutils.bool_from_string(
+                str(multicast_snooping))
+        ageing_time = json.get('ageing_time')
+        if ageing_time is not None:
+            ageing_time = _int_field(ageing_time, 'ageing_time',
+                                     'LinuxBridge', minimum=0)
+        bridge_vlans, bridge_pvid = _bridge_vlans_from_json(json, name)
 
         return LinuxBridge(name, use_dhcp=use_dhcp, use_dhcpv6=use_dhcpv6,
                            addresses=addresses, routes=routes, mtu=mtu,
                            members=members, nic_mapping=nic_mapping,
                            persist_mapping=persist_mapping, defroute=defroute,
                            dhclient_args=dhclient_args,
-                           dns_servers=dns_servers)
+                           dns_servers=dns_servers,
+                           vlan_filtering=vlan_filtering, stp=stp,
+                           multicast_snooping=multicast_snooping,
+                           ageing_time=ageing_time,
+                           bridge_vlans=bridge_vlans, bridge_pvid=bridge_pvid,
+                           nic_resolver=nic_resolver)
 
 
 class IvsBridge(_BaseOpts):
@@ -458,7 +1148,8 @@ class IvsBridge(_BaseOpts):
     def __init__(self, name='ivs', use_dhcp=False, use_dhcpv6=False,
                  addresses=None, routes=None, mtu=1500, members=None,
                  nic_mapping=None, persist_mapping=False, defroute=True,
-                 dhclient_args=None, dns_servers=None):
+                 dhclient_args=None, dns_servers=None,
+                 nic_resolver=None):
         addresses = addresses or []
         routes = routes or []
         members = members or []
@@ -466,7 +1157,8 @@ class IvsBridge(_BaseOpts):
         super(IvsBridge, self).__init__(name, use_dhcp, use_dhcpv6,
                                         addresses, routes, mtu, False,
                                         nic_mapping, persist_mapping,
-                                        defroute, dhclient_args, dns_servers)
+                                        defroute, dhclient_args, dns_servers,
+                                        nic_resolver=nic_resolver)
         self.members = members
         for member in self.members:
             if isinstance(member, OvsBond) or isinstance(member, LinuxBond):
@@ -477,30 +1169,21 @@ class IvsBridge(_BaseOpts):
             self.primary_interface_name = None  # ivs doesn't use primary intf
 
     @staticmethod
-    def from_json(json):
+    def from_json(json, nic_resolver=None):
         name = 'ivs'
         (use_dhcp, use_dhcpv6, addresses, routes, mtu, nic_mapping,
          persist_mapping, defroute, dhclient_args,
          dns_servers) = _BaseOpts.base_opts_from_json(
              json, include_primary=False)
-        members = []
-
-        # members
-        members_json = json.get('members')
-        if members_json:
-            if isinstance(members_json, list):
-                for member in members_json:
-                    members.append(object_from_json(member))
-            else:
-                msg = 'Members must be a list.'
-                raise InvalidConfigException(msg)
+        members = _members_from_json(json, nic_resolver)
 
         return IvsBridge(name, use_dhcp=use_dhcp, use_dhcpv6=use_dhcpv6,
                          addresses=addresses, routes=routes, mtu=mtu,
                          members=members, nic_mapping=nic_mapping,
                          persist_mapping=persist_mapping, defroute=defroute,
                          dhclient_args=dhclient_args,
-                         dns_servers=dns_servers)
+                         dns_servers=dns_servers,
+                         nic_resolver=nic_resolver)
 
 
 class LinuxBond(_BaseOpts):
@@ -509,7 +1192,8 @@ class LinuxBond(_BaseOpts):
     def __init__(self, name, use_dhcp=False, use_dhcpv6=False, addresses=None,
                  routes=None, mtu=None, primary=False, members=None,
                  bonding_options=None, nic_mapping=None, persist_mapping=False,
-                 defroute=True, dhclient_args=None, dns_servers=None):
+                 defroute=True, dhclient_args=None, dns_servers=None,
+                 nic_resolver=None):
         addresses = addresses or []
         routes = routes or []
         members = members or []
@@ -517,7 +1201,8 @@ class LinuxBond(_BaseOpts):
         super(LinuxBond, self).__init__(name, use_dhcp, use_dhcpv6, addresses,
                                         routes, mtu, primary, nic_mapping,
                                         persist_mapping, defroute,
-                                        dhclient_args, dns_servers)
+                                        dhclient_args, dns_servers,
+                                        nic_resolver=nic_resolver)
         self.members = members
         self.bonding_options = bonding_options
         for member in self.members:
@@ -532,31 +1217,22 @@ class LinuxBond(_BaseOpts):
                     self.primary_interface_name = member.name
 
     @staticmethod
-    def from_json(json):
+    def from_json(json, nic_resolver=None):
         name = _get_required_field(json, 'name', 'LinuxBond')
         (use_dhcp, use_dhcpv6, addresses, routes, mtu, nic_mapping,
          persist_mapping, defroute, dhclient_args,
          dns_servers) = _BaseOpts.base_opts_from_json(
              json, include_primary=False)
         bonding_options = json.get('bonding_options')
-        members = []
-
-        # members
-        members_json = json.get('members')
-        if members_json:
-            if isinstance(members_json, list):
-                for member in members_json:
-                    members.append(object_from_json(member))
-            else:
-                msg = 'Members must be a list.'
-                raise InvalidConfigException(msg)
+        members = _members_from_json(json, nic_resolver)
 
         return LinuxBond(name, use_dhcp=use_dhcp, use_dhcpv6=use_dhcpv6,
                          addresses=addresses, routes=routes, mtu=mtu,
                          members=members, bonding_options=bonding_options,
                          nic_mapping=nic_mapping,
                          persist_mapping=persist_mapping, defroute=defroute,
-                         dhclient_args=dhclient_args, dns_servers=dns_servers)
+                         dhclient_args=dhclient_args, dns_servers=dns_servers,
+                         nic_resolver=nic_resolver)
 
 
 class OvsBond(_BaseOpts):
@@ -566,7 +1242,7 @@ class OvsBond(_BaseOpts):
                  routes=None, mtu=None, primary=False, members=None,
                  ovs_options=None, ovs_extra=None, nic_mapping=None,
                  persist_mapping=False, defroute=True, dhclient_args=None,
-                 dns_servers=None):
+                 dns_servers=None, nic_resolver=None):
         addresses = addresses or []
         routes = routes or []
         members = members or []
@@ -575,7 +1251,8 @@ class OvsBond(_BaseOpts):
         super(OvsBond, self).__init__(name, use_dhcp, use_dhcpv6, addresses,
                                       routes, mtu, primary, nic_mapping,
                                       persist_mapping, defroute, dhclient_args,
-                                      dns_servers)
+                                      dns_servers,
+                                      nic_resolver=nic_resolver)
         self.members = members
         self.ovs_options = ovs_options
         self.ovs_extra = ovs_extra
@@ -594,7 +1271,7 @@ class OvsBond(_BaseOpts):
             self.primary_interface_name = bond_members[0].name
 
     @staticmethod
-    def from_json(json):
+    def from_json(json, nic_resolver=None):
         name = _get_required_field(json, 'name', 'OvsBond')
         (use_dhcp, use_dhcpv6, addresses, routes, mtu, nic_mapping,
          persist_mapping, defroute, dhclient_args,
@@ -602,24 +1279,15 @@ class OvsBond(_BaseOpts):
              json, include_primary=False)
         ovs_options = json.get('ovs_options')
         ovs_extra = json.get('ovs_extra', [])
-        members = []
-
-        # members
-        members_json = json.get('members')
-        if members_json:
-            if isinstance(members_json, list):
-                for member in members_json:
-                    members.append(object_from_json(member))
-            else:
-                msg = 'Members must be a list.'
-                raise InvalidConfigException(msg)
+        members = _members_from_json(json, nic_resolver)
 
         return OvsBond(name, use_dhcp=use_dhcp, use_dhcpv6=use_dhcpv6,
                        addresses=addresses, routes=routes, mtu=mtu,
                        members=members, ovs_options=ovs_options,
                        ovs_extra=ovs_extra, nic_mapping=nic_mapping,
                        persist_mapping=persist_mapping, defroute=defroute,
-                       dhclient_args=dhclient_args, dns_servers=dns_servers)
+                       dhclient_args=dhclient_args, dns_servers=dns_servers,
+                       nic_resolver=nic_resolver)
 
 
 class OvsTunnel(_BaseOpts):
@@ -629,7 +1297,7 @@ class OvsTunnel(_BaseOpts):
                  routes=None, mtu=None, primary=False, nic_mapping=None,
                  persist_mapping=False, defroute=True, dhclient_args=None,
                  dns_servers=None, tunnel_type=None, ovs_options=None,
-                 ovs_extra=None):
+                 ovs_extra=None, nic_resolver=None):
         addresses = addresses or []
         routes = routes or []
         ovs_extra = ovs_extra or []
@@ -637,13 +1305,14 @@ class OvsTunnel(_BaseOpts):
         super(OvsTunnel, self).__init__(name, use_dhcp, use_dhcpv6, addresses,
                                         routes, mtu, primary, nic_mapping,
                                         persist_mapping, defroute,
-                                        dhclient_args, dns_servers)
+                                        dhclient_args, dns_servers,
+                                        nic_resolver=nic_resolver)
         self.tunnel_type = tunnel_type
         self.ovs_options = ovs_options or []
         self.ovs_extra = ovs_extra or []
 
     @staticmethod
-    def from_json(json):
+    def from_json(json, nic_resolver=None):
         name = _get_required_field(json, 'name', 'OvsTunnel')
         tunnel_type = _get_required_field(json, 'tunnel_type', 'OvsTunnel')
         ovs_options = json.get('ovs_options', [])
@@ -651,4 +1320,93 @@ class OvsTunnel(_BaseOpts):
         ovs_extra = json.get('ovs_extra', [])
         opts = _BaseOpts.base_opts_from_json(json)
         return OvsTunnel(name, *opts, tunnel_type=tunnel_type,
-                         ovs_options=ovs_options, ovs_extra=ovs_extra)
+                         ovs_options=ovs_options, ovs_extra=ovs_extra,
+                         nic_resolver=nic_resolver)
+
+
+class VlanRange(object):
+    """Base class for ranges of VLANs sharing the same settings.
+
+       Expands lazily into one Vlan object per ID from vlan_id_start to
+       vlan_id_end (inclusive). Addresses are those of the first VLAN,
+       each following VLAN gets the next subnet of the same size, e.g.
+       192.0.2.1/24 on vlan100 becomes 192.0.3.1/24 on vlan101.
+    """
+
+    def __init__(self, device, vlan_id_start, vlan_id_end, use_dhcp=False,
+                 use_dhcpv6=False, addresses=None, mtu=None,
+                 nic_mapping=None, persist_mapping=False, defroute=True,
+                 dhclient_args=None, dns_servers=None,
+                 nic_resolver=None):
+        self.device = device
+        self.vlan_id_start = int(vlan_id_start)
+        self.vlan_id_end = int(vlan_id_end)
+        self.use_dhcp = use_dhcp
+        self.use_dhcpv6 = use_dhcpv6
+        self.addresses = addresses or []
+        self.mtu = mtu
+        self.nic_mapping = nic_mapping
+        self.persist_mapping = persist_mapping
+        self.defroute = defroute
+        self.dhclient_args = dhclient_args
+        self.dns_servers = dns_servers or []
+        self._nic_resolver = nic_resolver
+
+        if not 1 <= self.vlan_id_start <= self.vlan_id_end <= 4094:
+            msg = 'Invalid VLAN range %s-%s.' % (vlan_id_start, vlan_id_end)
+            raise InvalidConfigException(msg)
+        count = self.vlan_id_end - self.vlan_id_start
+        for address in self.addresses:
+            # make sure the last VLAN's subnet still exists
+            self._offset_address(address, count)
+
+    @staticmethod
+    def _offset_address(address, index):
+        ip_nw = utils.ip_network(address.ip_netmask)
+        size = ip_nw.last - ip_nw.first + 1
+        try:
+            ip = netaddr.IPAddress(ip_nw.value + index * size,
+                                   ip_nw.version)
+        except netaddr.AddrFormatError:
+            msg = 'Address %s can not be offset by %i subnets.' % (
+                address.ip_netmask, index)
+            raise InvalidConfigException(msg)
+        return Address('%s/%i' % (ip, ip_nw.prefixlen))
+
+    def vlans(self):
+        """Generate the Vlan objects of this range, in VLAN ID order."""
+        for index in range(self.vlan_id_end - self.vlan_id_start + 1):
+            addresses = [self._offset_address(address, index)
+                         for address in self.addresses]
+            yield Vlan(self.device, self.vlan_id_start + index,
+                       use_dhcp=self.use_dhcp, use_dhcpv6=self.use_dhcpv6,
+                       addresses=addresses, mtu=self.mtu,
+                       nic_mapping=self.nic_mapping,
+                       persist_mapping=self.persist_mapping,
+                       defroute=self.defroute,
+                       dhclient_args=self.dhclient_args,
+                       dns_servers=self.dns_servers,
+                       nic_resolver=self._nic_resolver)
+
+    @staticmethod
+    def from_json(json, nic_resolver=None):
+        # A vlan on an OVS bridge won't require a device (OVS Int Port)
+        device = json.get('device')
+        vlan_id_start = _get_required_field(json, 'vlan_id_start',
+                                            'VlanRange')
+        vlan_id_end = _get_required_field(json, 'vlan_id_end', 'VlanRange')
+        (use_dhcp, use_dhcpv6, addresses, routes, mtu, nic_mapping,
+         persist_mapping, defroute, dhclient_args,
+         dns_servers) = _BaseOpts.base_opts_from_json(
+             json, include_primary=False)
+        if routes:
+            msg = 'VlanRange does not support routes.'
+            raise InvalidConfigException(msg)
+        return VlanRange(device, vlan_id_start, vlan_id_end,
+                         use_dhcp=use_dhcp, use_dhcpv6=use_dhcpv6,
+                         addresses=addresses, mtu=mtu,
+                         nic_mapping=nic_mapping,
+                         persist_mapping=persist_mapping, defroute=defroute,
+                         dhclient_args=dhclient_args,
+                         dns_servers=dns_servers,
+                         nic_resolver=nic_resolver)
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014-2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import hashlib
+import json
+import logging
+import os
+
+from os_net_config import utils
+
+
+logger = logging.getLogger(__name__)
+
+PLAN_VERSION = 1
+
+
+def file_hash(filename):
+    """Return the sha256 of a file's content, or None if it is missing."""
+    if not os.path.exists(filename):
+        return None
+    with open(filename, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class PlanException(Exception):
+    pass
+
+
+class Plan(object):
+    """The ordered steps of an apply, recorded instead of being run.
+
+    A NetConfig with a plan set records its command executions, file
+    and sysfs writes and file removals here. Each file a step writes or
+    removes gets a precondition on its content at the time the plan was
+    made, so the plan is only replayed on the system state it was
+    computed for.
+    """
+
+    def __init__(self, steps=None, preconditions=None):
+        self.steps = steps or []
+        self.preconditions = preconditions or {}
+
+    def _add_precondition(self, filename):
+        if filename not in self.preconditions:
+            self.preconditions[filename] = file_hash(filename)
+
+    def add_execute(self, msg, cmd, args, kwargs):
+        self.steps.append({'action': 'execute', 'msg': msg,
+                           'cmd': [cmd] + list(args), 'kwargs': kwargs})
+
+    def add_write(self, filename, data, msg, mode=None):
+        self._add_precondition(filename)
+        step = {'action': 'write', 'filename': filename, 'data': data,
+                'msg': msg}
+        if mode is not None:
+            step['mode'] = mode
+        self.steps.append(step)
+
+    def add_write_sysfs(self, path, value, msg):
+        self.steps.append({'action': 'write_sysfs', 'path': path,
+                           'value': value, 'msg': msg})
+
+    def add_remove(self, filename, msg):
+        self._add_precondition(filename)
+        self.steps.append({'action': 'remove', 'filename': filename,
+                           'msg': msg})
+
+    def check(self):
+        """Return the list of files whose content changed since planning."""
+        changed = []
+        for filename, expected in sorted(self.preconditions.items()):
+            if file_hash(filename) != expected:
+                changed.append(filename)
+        return changed
+
+    def replay(self, net_config):
+        """Run the steps of the plan.
+
+        :param net_config: The NetConfig (without a plan) used to run the
+            steps, in noop mode the steps are only logged.
+        :raises: PlanException if a precondition does not hold.
+        """
+        changed = self.check()
+        if changed:
+            msg = ('Files changed since the plan was made: %s'
+                   % ', '.join(changed))
+            raise PlanException(msg)
+        for step in self.steps:
+            if step['action'] == 'execute':
+                net_config.execute(step['msg'], *step['cmd'],
+                                   **step['kwargs'])
+            elif step['action'] == 'write':
+                net_config.write_config(step['filename'], step['data'],
+                                        step['msg'], step.get('mode'))
+            elif step['action'] == 'write_sysfs':
+                net_config.write_sysfs(step['path'], step['value'],
+                                       step['msg'])
+            elif step['action'] == 'remove':
+                net_config.remove_config(step['filename'], step['msg'])
+
+    def save(self, filename):
+        data = {'version': PLAN_VERSION, 'steps': self.steps,
+                'preconditions': self.preconditions}
+        utils.write_config(filename, json.dumps(data, indent=2,
+                                                sort_keys=True))
+
+    @staticmethod
+    def load(filename):
+        try:
+            with open(filename) as f:
+                data = json.load(f)
+        except (IOError, ValueError) as e:
+            raise PlanException('Unable to read plan %s: %s' % (filename, e))
+        if data.get('version') != PLAN_VERSION:
+            msg = 'Unsupported plan version: %s' % data.get('version')
+            raise PlanException(msg)
+        return Plan(data.get('steps'), data.get('preconditions'))
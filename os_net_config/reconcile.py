@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014-2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import json
+import logging
+
+from oslo_concurrency import processutils
+
+from os_net_config import utils
+
+
+logger = logging.getLogger(__name__)
+
+# Kernel route protocols which are ours to manage, routes added by the
+# kernel or router advertisements are left alone. dhclient-script adds
+# its routes with the boot protocol too, so those of the address
+# families configured by DHCP are not deleted either, see
+# RouteReconciler.
+MANAGED_PROTOCOLS = ('boot', 'static')
+
+# The metric of routes added without one
+_DEFAULT_METRICS = {4: 0, 6: 1024}
+
+# The names ip shows for the reserved table ids
+_TABLE_NAMES = {'253': 'default', '254': 'main', '255': 'local'}
+
+
+def _normalize_dst(dst, version):
+    if not dst or dst == 'default':
+        return '0.0.0.0/0' if version == 4 else '::/0'
+    if '/' not in dst:
+        return '%s/%i' % (dst, 32 if version == 4 else 128)
+    ip_nw = utils.ip_network(dst)
+    return '%s/%i' % (ip_nw.network, ip_nw.prefixlen)
+
+
+def _route_devices(value):
+    """Return the devices of a (gateway, device, metrics) route value."""
+    gateway, device, metrics = value
+    if isinstance(gateway, tuple):
+        return set(hop[1] for hop in gateway)
+    return set([device])
+
+
+def _parse_metrics(metrics):
+    """Return the route metrics of ip -json as utils.route_metrics does."""
+    if isinstance(metrics, dict):
+        metrics = [metrics]
+    values = {}
+    locked = set()
+    for item in metrics or []:
+        if not isinstance(item, dict):
+            continue
+        for name, value in item.items():
+            if name == 'lock':
+                locked.update(value if isinstance(value, list) else [value])
+            else:
+                values[name] = value
+    parsed = []
+    if values.get('mtu'):
+        parsed.append('mtu %s%i' % ('lock ' if 'mtu' in locked else '',
+                                    values['mtu']))
+    for name in ('advmss', 'initcwnd', 'initrwnd'):
+        if values.get(name):
+            parsed.append('%s %i' % (name, values[name]))
+    if values.get('quickack'):
+        parsed.append('quickack 1')
+    if values.get('congctl'):
+        parsed.append('congctl %s' % values['congctl'])
+    return tuple(parsed)
+
+
+def desired_routes(device_routes):
+    """Return the routes of a config, keyed for comparison with the kernel.
+
+    :param device_routes: A dict of device name: list of objects.Route.
+    :returns: a dict of (version, table, destination, metric): (gateway,
+        device, metrics). Destinations are explicit prefixes, so that ip
+        can tell the address family of a route from them. The gateway of
+        multipath routes is the sorted tuple of their (gateway, device,
+        weight) next hops, and their device None. metrics is the tuple of
+        the TCP settings of the route (see utils.route_metrics).
+    """
+    routes = {}
+    for device, device_route_list in device_routes.items():
+        for route in device_route_list:
+            version = route.version()
+            dst = None if route.default else route.ip_netmask
+            table = str(route.table or 'main')
+            metric = route.metric
+            if metric is None:
+                metric = _DEFAULT_METRICS[version]
+            key = (version, _TABLE_NAMES.get(table, table),
+                   _normalize_dst(dst, version), metric)
+            metrics = tuple(utils.route_metrics(route))
+            if route.next_hops:
+                routes[key] = (tuple(sorted(
+                    (hop.next_hop.lower(), hop.device or device,
+                     hop.weight or 1) for hop in route.next_hops)), None,
+                    metrics)
+            else:
+                routes[key] = (route.next_hop.lower(), device, metrics)
+    return routes
+
+
+def parse_kernel_routes(data, version, devices=None):
+    """Parse the output of `ip -json route show table all`.
+
+    :param data: The JSON output of ip.
+    :param version: The IP version of the routes, 4 or 6.
+    :param devices: The devices whose routes are returned, all if None.
+        Multipath routes are returned if any of their next hops is on
+        one of the devices.
+    :returns: a dict of (version, table, destination, metric): (gateway,
+        device, metrics) of the unicast routes with a managed protocol,
+        see desired_routes.
+    """
+    routes = {}
+    for route in json.loads(data or '[]'):
+        if route.get('type', 'unicast') != 'unicast':
+            continue
+        if route.get('protocol') not in MANAGED_PROTOCOLS:
+            continue
+        metrics = _parse_metrics(route.get('metrics'))
+        if route.get('nexthops'):
+            value = (tuple(sorted(
+                (hop.get('gateway'), hop.get('dev'), hop.get('weight', 1))
+                for hop in route['nexthops'])), None, metrics)
+        else:
+            value = (route.get('gateway'), route.get('dev'), metrics)
+        if devices is not None and not _route_devices(value) & set(devices):
+            continue
+        key = (version, str(route.get('table', 'main')),
+               _normalize_dst(route.get('dst'), version),
+               route.get('metric', _DEFAULT_METRICS[version]))
+        routes[key] = value
+    return routes
+
+
+class RouteReconciler(object):
+    """Make the kernel routing tables match the routes of a config.
+
+    The kernel routes are dumped once per address family and all the
+    differences are installed with a single `ip -batch`, instead of one
+    `ip route` process per route.
+
+    :param net_config: The NetConfig which built the config, its routes
+        are reconciled and the batch is run (or recorded) through it.
+    :param devices: The devices whose routes are reconciled. By default
+        the devices of the config: routes of other devices are not
+        touched.
+
+    Kernel routes missing from the config are not deleted from devices
+    using DHCP for the address family of the route, as the routes the
+    DHCP client adds cannot be told from ours.
+    """
+
+    def __init__(self, net_config, devices=None):
+        self.net_config = net_config
+        if devices is None:
+            devices = net_config.topology.devices()
+        self.devices = set(devices)
+
+    def kernel_routes(self):
+        routes = {}
+        for version in (4, 6):
+            out, err = processutils.execute('/sbin/ip', '-%i' % version,
+                                            '-json', 'route', 'show',
+                                            'table', 'all')
+            routes.update(parse_kernel_routes(out, version, self.devices))
+        return routes
+
+    def commands(self, kernel_routes):
+        """Return the ip batch commands turning kernel_routes into ours."""
+        wanted = dict((key, value) for key, value in
+                      desired_routes(self.net_config.device_routes).items()
+                      if _route_devices(value) & self.devices)
+        commands = []
+        for key in sorted(kernel_routes):
+            if key not in wanted:
+                version, table, dst, metric = key
+                if _route_devices(kernel_routes[key]) & self._dhcp_devices(
+                        version):
+                    continue
+                gateway, device, metrics = kernel_routes[key]
+                command = 'route del %s' % dst
+                if device:
+                    command += ' dev %s' % device
+                commands.append(command + self._placement(key))
+        for key in sorted(wanted):
+            if kernel_routes.get(key) != wanted[key]:
+                version, table, dst, metric = key
+                gateway, device, metrics = wanted[key]
+                if device:
+                    command = ' '.join(
+                        ('route replace %s via %s dev %s%s proto static' %
+                         (dst, gateway, device, self._placement(key)),) +
+                        metrics)
+                else:
+                    # all the next hops are replaced at once, last as ip
+                    # takes everything after the first nexthop as next hops
+                    command = ' '.join(
+                        ('route replace %s%s proto static' %
+                         (dst, self._placement(key)),) + metrics +
+                        tuple('nexthop via %s dev %s weight %i' % hop
+                              for hop in gateway))
+                commands.append(command)
+        return commands
+
+    def _dhcp_devices(self, version):
+        return set(name for name, versions in
+                   self.net_config.dhcp_versions.items()
+                   if version in versions)
+
+    @staticmethod
+    def _placement(key):
+        version, table, dst, metric = key
+        placement = ' table %s' % table
+        if metric != _DEFAULT_METRICS[version]:
+            placement += ' metric %i' % metric
+        return placement
+
+    def reconcile(self):
+        """Install the route differences.
+
+        :returns: the list of the ip batch commands run (or which would be
+            run in noop mode).
+        """
+        commands = self.commands(self.kernel_routes())
+        if commands:
+            msg = 'reconciling routes: %i changes' % len(commands)
+            self.net_config.execute(msg, '/sbin/ip', '-force', '-batch', '-',
+                                    process_input='\n'.join(commands) + '\n')
+        else:
+            logger.info('Kernel routes are up to date')
+        return commands
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014-2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import collections
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+
+logger = logging.getLogger(__name__)
+
+
+class RenderCache(object):
+    """On disk cache of rendered configuration text.
+
+    Entries are stored one per file, named after the hash of their key.
+    Reading an entry refreshes its modification time, which is what the
+    least recently used eviction is based on.
+    """
+
+    def __init__(self, cache_dir, max_entries=4096):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+        self._added = 0
+
+    @staticmethod
+    def key(*parts):
+        """Return a stable hash for a list of JSON serializable parts."""
+        data = json.dumps(parts, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def _disable(self, error):
+        logger.warning('Disabling render cache %s: %s' %
+                       (self.cache_dir, error))
+        self.enabled = False
+
+    def get(self, key):
+        """Return the cached value for key, or None."""
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                value = json.load(f)
+            os.utime(path, None)
+        except (IOError, OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        """Store a JSON serializable value for key."""
+        if not self.enabled:
+            return
+        try:
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir,
+                                            prefix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(value, f)
+            os.rename(tmp_path, self._path(key))
+        except (IOError, OSError) as e:
+            self._disable(e)
+            return
+        self._added += 1
+        if self._added >= self.max_entries // 8 + 1:
+            self._added = 0
+            self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries above max_entries."""
+        try:
+            entries = []
+            for name in os.listdir(self.cache_dir):
+                if name.startswith('.'):
+                    continue
+                path = self._path(name)
+                entries.append((os.stat(path).st_mtime, path))
+            entries.sort()
+            excess = len(entries) - self.max_entries
+            for mtime, path in entries[:max(excess, 0)]:
+                os.remove(path)
+        except (IOError, OSError) as e:
+            self._disable(e)
+
+
+class MemoryRenderCache(object):
+    """In memory least recently used cache of rendered configuration text.
+
+    Used by long running processes (see cli --watch), it has the same
+    interface as RenderCache.
+    """
+
+    key = staticmethod(RenderCache.key)
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+
+    def get(self, key):
+        """Return the cached value for key, or None."""
+        value = self._entries.pop(key, None)
+        if value is None:
+            self.misses += 1
+            return None
+        self._entries[key] = value
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        """Store a value for key."""
+        self._entries.pop(key, None)
+        self._entries[key] = value
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
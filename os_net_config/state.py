@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014-2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    ctime REAL NOT NULL,
+    inode INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS applies (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started REAL NOT NULL,
+    duration REAL NOT NULL,
+    success INTEGER NOT NULL,
+    config_file TEXT,
+    model_sha256 TEXT,
+    model TEXT,
+    files_changed INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS device_timings (
+    apply_id INTEGER NOT NULL REFERENCES applies(id),
+    device TEXT NOT NULL,
+    duration REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS device_timings_device
+    ON device_timings(device);
+"""
+
+_APPLY_COLUMNS = ('id', 'started', 'duration', 'success', 'config_file',
+                  'model_sha256', 'files_changed')
+
+
+def default_path(root_dir=''):
+    return root_dir + '/var/lib/os-net-config/state.db'
+
+
+def data_hash(data):
+    return hashlib.sha256(str(data).encode('utf-8')).hexdigest()
+
+
+class StateStore(object):
+    """SQLite record of what was applied, when, and how long it took.
+
+    For each file written, the hash of its content is stored along with
+    its stat data. As long as the stat data of a file is unchanged, its
+    content does not need to be read to know whether new data differs.
+    Database errors disable the store rather than failing the apply.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.enabled = True
+        self._db = None
+        try:
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            self._db = sqlite3.connect(path, timeout=30)
+            self._db.executescript(_SCHEMA)
+        except (IOError, OSError, sqlite3.Error) as e:
+            self._disable(e)
+
+    def _disable(self, error):
+        logger.warning('Disabling state store %s: %s' % (self.path, error))
+        self.enabled = False
+
+    @staticmethod
+    def _stat(filename):
+        try:
+            st = os.stat(filename)
+        except OSError:
+            return None
+        return (st.st_size, st.st_mtime, st.st_ctime, st.st_ino)
+
+    def file_changed(self, filename, data):
+        """Tell whether data differs from a file, without reading it.
+
+        :returns: True or False when the file is unchanged since it was
+            recorded, None when that is unknown and the file has to be
+            read.
+        """
+        if not self.enabled:
+            return None
+        try:
+            row = self._db.execute(
+                'SELECT sha256, size, mtime, ctime, inode FROM files '
+                'WHERE path = ?', (filename,)).fetchone()
+        except sqlite3.Error as e:
+            self._disable(e)
+            return None
+        if row is None or tuple(row[1:]) != self._stat(filename):
+            return None
+        return row[0] != data_hash(data)
+
+    def record_file(self, filename, data):
+        """Record the data just written to a file."""
+        stat = self._stat(filename)
+        if not self.enabled or stat is None:
+            return
+        try:
+            self._db.execute(
+                'INSERT OR REPLACE INTO files '
+                '(path, sha256, size, mtime, ctime, inode) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (filename, data_hash(data)) + stat)
+        except sqlite3.Error as e:
+            self._disable(e)
+
+    def forget_file(self, filename):
+        """Forget a removed file."""
+        if not self.enabled:
+            return
+        try:
+            self._db.execute('DELETE FROM files WHERE path = ?', (filename,))
+        except sqlite3.Error as e:
+            self._disable(e)
+
+    def record_apply(self, started, duration, success, config_file=None,
+                     model=None, files_changed=0, device_timings=None):
+        """Record an apply and commit the files recorded with it.
+
+        :param started: The time the apply started, in seconds since the
+            epoch.
+        :param duration: The duration of the apply in seconds.
+        :param success: Whether the apply succeeded.
+        :param model: The normalized objects (see objects.object_to_json).
+        :param files_changed: The number of files changed.
+        :param device_timings: A dict of device name: seconds it took to
+            bring the device up.
+        :returns: the id of the apply, or None if the store is disabled.
+        """
+        if not self.enabled:
+            return None
+        model_json = None
+        if model is not None:
+            model_json = json.dumps(model, sort_keys=True)
+        try:
+            with self._db:
+                cursor = self._db.execute(
+                    'INSERT INTO applies (started, duration, success, '
+                    'config_file, model_sha256, model, files_changed) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (started, duration, int(bool(success)), config_file,
+                     model_json and data_hash(model_json), model_json,
+                     files_changed))
+                apply_id = cursor.lastrowid
+                self._db.executemany(
+                    'INSERT INTO device_timings (apply_id, device, duration) '
+                    'VALUES (?, ?, ?)',
+                    [(apply_id, device, device_duration)
+                     for device, device_duration
+                     in sorted((device_timings or {}).items())])
+        except sqlite3.Error as e:
+            self._disable(e)
+            return None
+        return apply_id
+
+    def _applies(self, where, args, limit):
+        if not self.enabled:
+            return []
+        try:
+            rows = self._db.execute(
+                'SELECT %s FROM applies %s ORDER BY id DESC LIMIT ?'
+                % (', '.join(_APPLY_COLUMNS), where), args + (limit,))
+            return [dict(zip(_APPLY_COLUMNS, row)) for row in rows]
+        except sqlite3.Error as e:
+            self._disable(e)
+            return []
+
+    def history(self, limit=10):
+        """Return the last applies, most recent first, as dicts."""
+        return self._applies('', (), limit)
+
+    def last_apply(self, success=True):
+        """Return the last (successful by default) apply, or None."""
+        applies = self._applies('WHERE success = ?', (int(success),), 1)
+        return applies[0] if applies else None
+
+    def last_model(self):
+        """Return the model of the last successful apply, or None."""
+        if not self.enabled:
+            return None
+        try:
+            row = self._db.execute(
+                'SELECT model FROM applies WHERE success = 1 '
+                'ORDER BY id DESC LIMIT 1').fetchone()
+        except sqlite3.Error as e:
+            self._disable(e)
+            return None
+        if row is None or row[0] is None:
+            return None
+        return json.loads(row[0])
+
+    def slowest_devices(self, limit=10):
+        """Return the devices slowest to come up.
+
+        :returns: a list of (device, maximum seconds, average seconds,
+            number of times it was brought up) tuples, slowest first.
+        """
+        if not self.enabled:
+            return []
+        try:
+            return [tuple(row) for row in self._db.execute(
+                'SELECT device, MAX(duration), AVG(duration), COUNT(*) '
+                'FROM device_timings GROUP BY device '
+                'ORDER BY MAX(duration) DESC, device LIMIT ?', (limit,))]
+        except sqlite3.Error as e:
+            self._disable(e)
+            return []
+
+    def close(self):
+        if self._db is not None:
+            try:
+                self._db.commit()
+            except sqlite3.Error as e:
+                self._disable(e)
+            self._db.close()
+            self._db = None
+        self.enabled = False
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014-2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import glob
+import logging
+import re
+
+from os_net_config import utils
+
+
+logger = logging.getLogger(__name__)
+
+_SYS_DEVICES_CPU = '/sys/devices/system/cpu'
+_PROC_IRQ = '/proc/irq'
+_PROC_INTERRUPTS = '/proc/interrupts'
+
+OS_NET_CONFIG = '/usr/bin/os-net-config'
+UDEV_RULES_PATH = '/etc/udev/rules.d/81-os-net-config-queues.rules'
+
+
+def parse_cpu_list(cpu_list):
+    """Return the sorted CPU numbers of a CPU list such as "0-3,8"."""
+    cpus = set()
+    for item in cpu_list.strip().split(','):
+        if not item:
+            continue
+        first, sep, last = item.partition('-')
+        cpus.update(range(int(first), int(last or first) + 1))
+    return sorted(cpus)
+
+
+def cpu_mask(cpus):
+    """Return the sysfs hexadecimal mask of a list of CPU numbers.
+
+    Masks are written as comma separated 32 bit words, e.g.
+    "00000001,00000000" for CPU 32.
+    """
+    mask = 0
+    for cpu in cpus:
+        mask |= 1 << cpu
+    words = []
+    while True:
+        words.insert(0, '%08x' % (mask & 0xffffffff))
+        mask >>= 32
+        if not mask:
+            break
+    return ','.join(words)
+
+
+def _read(path):
+    try:
+        with open(path, 'r') as f:
+            return f.read().strip()
+    except IOError:
+        return None
+
+
+def local_cpus(name):
+    """Return the CPUs of the NUMA node of a device.
+
+    Devices without a NUMA node (e.g. virtual ones) get all the online
+    CPUs.
+    """
+    cpu_list = _read(utils._SYS_CLASS_NET + '/%s/device/local_cpulist' %
+                     name)
+    if not cpu_list:
+        cpu_list = _read(_SYS_DEVICES_CPU + '/online') or '0'
+    return parse_cpu_list(cpu_list)
+
+
+def queues(name, direction):
+    """Return the sysfs directories of the rx or tx queues of a device."""
+    return sorted(glob.glob(utils._SYS_CLASS_NET + '/%s/queues/%s-*' %
+                            (name, direction)),
+                  key=utils._natural_sort_key)
+
+
+def queue_irqs(name):
+    """Return the IRQs of the queues of a device, in queue order.
+
+    They are the IRQs whose action is named after the device in
+    /proc/interrupts, e.g. em1-TxRx-0.
+    """
+    irqs = []
+    pattern = re.compile(r'^%s([-_@].*)?$' % re.escape(name))
+    try:
+        with open(_PROC_INTERRUPTS, 'r') as f:
+            for line in f:
+                fields = line.split()
+                if (len(fields) < 2 or not fields[0].rstrip(':').isdigit()
+                        or not pattern.match(fields[-1])):
+                    continue
+                irqs.append((fields[-1], fields[0].rstrip(':')))
+    except IOError:
+        return []
+    return [irq for action, irq in sorted(
+        irqs, key=lambda item: utils._natural_sort_key(item[0]))]
+
+
+def desired_settings(name, steering):
+    """Return the sysfs and procfs values implementing a queue steering.
+
+    :param name: The device name.
+    :param steering: An objects.QueueSteering.
+    :returns: a list of (path, value) tuples.
+    """
+    settings = []
+    cpus = {}
+    for setting in steering.SETTINGS:
+        value = getattr(steering, setting)
+        if value == 'auto':
+            cpus[setting] = local_cpus(name)
+        elif value:
+            cpus[setting] = parse_cpu_list(value)
+    if cpus.get('rps_cpus'):
+        mask = cpu_mask(cpus['rps_cpus'])
+        for queue in queues(name, 'rx'):
+            settings.append((queue + '/rps_cpus', mask))
+    if cpus.get('xps_cpus'):
+        xps_cpus = cpus['xps_cpus']
+        for i, queue in enumerate(queues(name, 'tx')):
+            settings.append((queue + '/xps_cpus',
+                             cpu_mask([xps_cpus[i % len(xps_cpus)]])))
+    if cpus.get('irq_affinity'):
+        irq_cpus = cpus['irq_affinity']
+        for i, irq in enumerate(queue_irqs(name)):
+            settings.append((_PROC_IRQ + '/%s/smp_affinity_list' % irq,
+                             str(irq_cpus[i % len(irq_cpus)])))
+    return settings
+
+
+def _same_value(path, current, value):
+    try:
+        if path.endswith('_list'):
+            return parse_cpu_list(current) == parse_cpu_list(value)
+        return (int(current.replace(',', ''), 16) ==
+                int(value.replace(',', ''), 16))
+    except ValueError:
+        return False
+
+
+def changed_settings(settings):
+    """Return the settings which differ from the current values."""
+    return [(path, value) for path, value in settings
+            if not _same_value(path, _read(path) or '', value)]
+
+
+def steer_command(name, steering):
+    """Return the os-net-config command line steering a device's queues.
+
+    :param name: The device name.
+    :param steering: An objects.QueueSteering.
+    """
+    args = ' '.join('%s=%s' % (setting, getattr(steering, setting))
+                    for setting in steering.SETTINGS
+                    if getattr(steering, setting))
+    return '%s --steer-queues %s %s' % (OS_NET_CONFIG, name, args)
+
+
+def udev_rules(device_steering):
+    """Return udev rules steering the queues of devices when they appear.
+
+    Network devices are renamed after their add event, so the rules
+    match the name given by earlier rules (NAME), or the kernel name of
+    the devices which are not renamed. The IRQs of the queues only exist
+    once a device is up, their affinity is set again then (see
+    NetConfig.persist_link_up_hook).
+
+    :param device_steering: A dict of device name: objects.QueueSteering.
+    """
+    data = ''
+    for name in sorted(device_steering):
+        command = steer_command(name, device_steering[name])
+        data += ('ACTION=="add", SUBSYSTEM=="net", NAME=="%s", '
+                 'RUN+="%s"\n' % (name, command))
+        data += ('ACTION=="add", SUBSYSTEM=="net", NAME=="", KERNEL=="%s", '
+                 'RUN+="%s"\n' % (name, command))
+    if data:
+        data = '# This file is autogenerated by os-net-config\n' + data
+    return data
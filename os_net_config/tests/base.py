@@ -40,8 +40,13 @@ class TestCase(testtools.TestCase):
 
         def dummy_numbered_nics(nic_mapping=None):
             return self.stubbed_numbered_nics
+
+        def dummy_resolver_numbered_nics(resolver, nic_mapping=None):
+            return self.stubbed_numbered_nics
         if self.stub_numbered_nics:
             self.stubs.Set(objects, '_numbered_nics', dummy_numbered_nics)
+            self.stubs.Set(objects.NicResolver, 'numbered_nics',
+                           dummy_resolver_numbered_nics)
 
         test_timeout = os.environ.get('OS_TEST_TIMEOUT', 0)
         try:
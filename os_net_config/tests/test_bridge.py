@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+from oslo_concurrency import processutils
+
+import os_net_config
+from os_net_config import bridge
+from os_net_config import objects
+from os_net_config.tests import base
+
+
+_VLANS_JSON = """[{"ifname": "em1", "vlans": [
+    {"vlan": 1, "flags": ["PVID", "Egress Untagged"]},
+    {"vlan": 100, "vlanEnd": 149}]},
+ {"ifname": "br0", "vlans": [
+    {"vlan": 1, "flags": ["PVID", "Egress Untagged"]}]}]"""
+
+_OLD_VLANS_JSON = """{"em1": [
+    {"vlan": 1, "flags": ["PVID", "Egress Untagged"]},
+    {"vlan": 100}, {"vlan": 101}]}"""
+
+
+class TestBridgeVlans(base.TestCase):
+
+    def test_vlan_ranges(self):
+        self.assertEqual(set([1, 5, 6, 7]),
+                         bridge.parse_vlan_list(['1', 5, '6-7']))
+        self.assertEqual(['1', '5-7', '9'],
+                         bridge.vlan_ranges([9, 7, 1, 6, 5]))
+        self.assertRaises(ValueError, bridge.parse_vlan_list, ['7-5'])
+
+    def test_parse_vlans(self):
+        current = bridge.parse_vlans(_VLANS_JSON)
+        self.assertEqual((set([1] + list(range(100, 150))), 1, set([1])),
+                         current['em1'])
+        self.assertEqual((set([1]), 1, set([1])), current['br0'])
+        self.assertEqual({'em1': (set([1, 100, 101]), 1, set([1]))},
+                         bridge.parse_vlans(_OLD_VLANS_JSON))
+
+    def test_vlan_commands(self):
+        self.assertEqual(['vlan add dev em1 vid 100-199',
+                          'vlan add dev em1 vid 10 pvid untagged'],
+                         bridge.vlan_commands('em1', ['100-199'], 10))
+        current = bridge.parse_vlans(_VLANS_JSON)
+        self.assertEqual(['vlan del dev em1 vid 1',
+                          'vlan del dev em1 vid 120-149',
+                          'vlan add dev em1 vid 200',
+                          'vlan add dev em1 vid 10 pvid untagged'],
+                         bridge.vlan_commands('em1', ['100-119', '200'], 10,
+                                              current['em1']))
+        self.assertEqual([], bridge.vlan_commands(
+            'em1', ['100-149'], 1, current['em1']))
+        # the tagged VLAN was the untagged PVID
+        self.assertEqual(['vlan add dev br0 vid 1 self'],
+                         bridge.vlan_commands('br0', ['1'], None,
+                                              current['br0'],
+                                              self_port=True))
+
+    def test_configure_bridge_vlans(self):
+        commands = []
+
+        def test_execute(*args, **kwargs):
+            commands.append((args, kwargs.get('process_input')))
+            if args[1:] == ('-json', 'vlan', 'show'):
+                return _VLANS_JSON, ''
+            return '', ''
+        self.stubs.Set(processutils, 'execute', test_execute)
+
+        provider = os_net_config.NetConfig()
+        interface = objects.Interface('em1')
+        interface.bridge_vlans = ['100-149']
+        interface.bridge_pvid = 1
+        provider._track_object(objects.LinuxBridge(
+            'br0', members=[interface], vlan_filtering=True,
+            bridge_vlans=['10']))
+        provider._track_object(interface)
+        provider.configure_bridge_vlans()
+        self.assertEqual([((bridge.BRIDGE, '-json', 'vlan', 'show'), None),
+                          ((bridge.BRIDGE, '-force', '-batch', '-'),
+                           'vlan del dev br0 vid 1 self\n'
+                           'vlan add dev br0 vid 10 self\n')], commands)
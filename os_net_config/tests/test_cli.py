@@ -15,12 +15,16 @@
 # under the License.
 
 import os.path
+import shutil
 import sys
+import tempfile
 
 import os_net_config
 from os_net_config import cli
 from os_net_config import impl_ifcfg
+from os_net_config import objects
 from os_net_config.tests import base
+from os_net_config import utils
 import six
 
 
@@ -61,7 +65,8 @@ class TestCli(base.TestCase):
                           'DEVICE=em2',
                           'DEVICE=em1',
                           'DEVICE=bond1',
-                          'DEVICETYPE=ovs']
+                          'DEVICETYPE=ovs',
+                          'Devices to restart: br-ctlplane, bond1, em1, em2']
         for dev in sanity_devices:
             self.assertIn(dev, stdout_yaml)
         self.assertEqual(stdout_yaml, stdout_json)
@@ -115,6 +120,18 @@ class TestCli(base.TestCase):
             self.assertIn(dev, stdout_yaml)
         self.assertEqual(stdout_yaml, stdout_json)
 
+    def test_interface_networkd_noop_output(self):
+        interface_yaml = os.path.join(SAMPLE_BASE, 'interface.yaml')
+        stdout_yaml, stderr = self.run_cli('ARG0 --provider=networkd --noop '
+                                           '-c %s' % interface_yaml)
+        self.assertEqual('', stderr)
+        sanity_devices = ['File: /etc/systemd/network/'
+                          '10-os-net-config-em1.network',
+                          'Name=em1',
+                          'Address=192.0.2.1/24']
+        for dev in sanity_devices:
+            self.assertIn(dev, stdout_yaml)
+
     def test_bridge_noop_rootfs(self):
         for provider in ('ifcfg', 'eni'):
             bond_yaml = os.path.join(SAMPLE_BASE, 'bridge_dhcp.yaml')
@@ -146,3 +163,199 @@ class TestCli(base.TestCase):
         stdout_yaml, stderr = self.run_cli('ARG0 --provider=ifcfg --noop '
                                            '-c %s --detailed-exit-codes'
                                            % interface_yaml, exitcodes=(0,))
+
+    def test_invalid_config_no_files_written(self):
+        config = tempfile.NamedTemporaryFile(suffix='.yaml')
+        config.write(b"""network_config:
+  - type: interface
+    name: em1
+    addresses:
+      - ip_netmask: 192.0.2.1/24
+  - type: interface
+    name: em2
+    addresses:
+      - ip_netmask: 192.0.2.1/24
+""")
+        config.flush()
+        stdout_yaml, stderr = self.run_cli('ARG0 --provider=ifcfg --noop '
+                                           '-c %s' % config.name,
+                                           exitcodes=(1,))
+        self.assertEqual('', stdout_yaml)
+        config.close()
+
+    def test_diff(self):
+        interface_yaml = os.path.join(SAMPLE_BASE, 'interface.yaml')
+        config = tempfile.NamedTemporaryFile(suffix='.yaml')
+        config.write(b"""network_config:
+  - type: interface
+    name: em1
+    use_dhcp: true
+""")
+        config.flush()
+        stdout, stderr = self.run_cli('ARG0 --diff %s -c %s'
+                                      % (interface_yaml, interface_yaml))
+        self.assertEqual('', stdout)
+        stdout, stderr = self.run_cli('ARG0 --diff %s -c %s '
+                                      '--detailed-exit-codes'
+                                      % (interface_yaml, config.name),
+                                      exitcodes=(2,))
+        self.assertEqual('', stderr)
+        self.assertIn('~ em1 (interface)', stdout)
+        self.assertIn('    use_dhcp: false -> true', stdout)
+        self.assertIn('Devices to restart: em1', stdout)
+        config.close()
+
+    def test_state_db_history(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        state_db = os.path.join(tmpdir, 'state.db')
+        interface_yaml = os.path.join(SAMPLE_BASE, 'interface.yaml')
+
+        class TestImpl(os_net_config.NetConfig):
+
+            def add_interface(self, interface):
+                pass
+
+            def apply(self, cleanup=False, activate=True):
+                self.ifup('em1')
+                return {'ifcfg-em1': 'data'}
+
+        self.stubs.Set(impl_ifcfg, 'IfcfgNetConfig', TestImpl)
+        self.stubs.Set(os_net_config.processutils, 'execute',
+                       lambda *args, **kwargs: None)
+        self.run_cli('ARG0 --provider=ifcfg -c %s --state-db %s'
+                     % (interface_yaml, state_db))
+        stdout, stderr = self.run_cli('ARG0 --history --state-db %s'
+                                      % state_db)
+        self.assertIn('ok', stdout)
+        self.assertIn('%s, 1 files changed' % interface_yaml, stdout)
+        self.assertIn('  em1: ', stdout)
+
+    def test_iter_network_config(self):
+        stream = six.StringIO("""other: [1, 2]
+network_config:
+  - type: interface
+    name: em1
+    use_dhcp: true
+  - {"type": "interface", "name": "em2"}
+""")
+        entries = cli.iter_network_config(stream)
+        self.assertEqual({'type': 'interface', 'name': 'em1',
+                          'use_dhcp': True}, next(entries))
+        self.assertEqual({'type': 'interface', 'name': 'em2'},
+                         next(entries))
+        self.assertRaises(StopIteration, next, entries)
+
+    def test_iter_network_config_json(self):
+        stream = six.StringIO('{"network_config": [{"type": "interface", '
+                              '"name": "em1"}]}')
+        self.assertEqual([{'type': 'interface', 'name': 'em1'}],
+                         list(cli.iter_network_config(stream)))
+
+    def test_iter_network_config_not_a_list(self):
+        for data in ('network_config: em1', 'foo: bar', ''):
+            self.assertRaises(objects.InvalidConfigException, list,
+                              cli.iter_network_config(six.StringIO(data)))
+
+    def test_add_config_objects_inferred_mtu(self):
+        config = tempfile.NamedTemporaryFile(suffix='.yaml')
+        config.write(b"""network_config:
+  - type: interface
+    name: em1
+  - type: vlan
+    device: em1
+    vlan_id: 10
+    mtu: 9000
+""")
+        config.flush()
+        self.addCleanup(config.close)
+        provider = impl_ifcfg.IfcfgNetConfig()
+        added = []
+
+        def add_object(obj):
+            # the provider gets each object as it is read, and em1 again
+            # once its MTU is inferred from the VLAN
+            added.append((obj.name, obj.mtu))
+            impl_ifcfg.IfcfgNetConfig.add_object(provider, obj)
+        self.stubs.Set(provider, 'add_object', add_object)
+        cli.add_config_objects(provider, config.name)
+        self.assertEqual([('em1', None), ('vlan10', 9000), ('em1', 9000)],
+                         added)
+        self.assertIn('MTU=9000', provider.interface_data['em1'])
+
+    def test_add_config_objects_not_kept(self):
+        config = tempfile.NamedTemporaryFile(suffix='.yaml')
+        config.write(b"""network_config:
+  - type: interface
+    name: em1
+  - type: vlan
+    device: em1
+    vlan_id: 10
+    mtu: 9000
+""")
+        config.flush()
+        self.addCleanup(config.close)
+        provider = impl_ifcfg.IfcfgNetConfig()
+        self.assertIsNone(cli.add_config_objects(provider, config.name,
+                                                 keep_objects=False))
+        # em1 is kept until its MTU is inferred
+        self.assertIn('MTU=9000', provider.interface_data['em1'])
+
+    def test_add_config_objects_sriov_vf(self):
+        config = tempfile.NamedTemporaryFile(suffix='.yaml')
+        config.write(b"""network_config:
+  - type: sriov_pf
+    name: em1
+    numvfs: 4
+    mtu: 9000
+  - type: sriov_vf
+    device: em1
+    vfid: 0
+    vlan_id: 100
+""")
+        config.flush()
+        self.addCleanup(config.close)
+        provider = impl_ifcfg.IfcfgNetConfig()
+        cli.add_config_objects(provider, config.name)
+        self.assertEqual(['em1_vf0'], list(provider.sriov_vfs))
+        self.assertIn('MTU=9000', provider.interface_data['em1'])
+
+    def test_batch(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        with open(os.path.join(tmpdir, 'nics.yaml'), 'w') as f:
+            f.write('nics:\n  em1: "52:54:00:00:00:01"\n')
+        with open(os.path.join(tmpdir, 'manifest.yaml'), 'w') as f:
+            f.write("""hosts:
+  - config: %s
+    nic_inventory: nics.yaml
+    root_dir: host1
+  - config: %s
+    root_dir: host2
+    provider: eni
+""" % (os.path.join(SAMPLE_BASE, 'interface.yaml'),
+                os.path.join(SAMPLE_BASE, 'bridge_dhcp.yaml')))
+
+        for workers in (1, 2):
+            for host in ('host1', 'host2'):
+                shutil.rmtree(os.path.join(tmpdir, host), True)
+            stdout, stderr = self.run_cli(
+                'ARG0 --provider=ifcfg --workers=%i --batch=%s' %
+                (workers, os.path.join(tmpdir, 'manifest.yaml')))
+            self.assertEqual('', stderr)
+            self.assertIn('host1: 6 files written', stdout)
+            self.assertIn('host2: 1 files written', stdout)
+
+        ifcfg = os.path.join(tmpdir, 'host1', 'etc', 'sysconfig',
+                             'network-scripts', 'ifcfg-em1')
+        self.assertIn('IPADDR=192.0.2.1', utils.get_file_data(ifcfg))
+        eni = os.path.join(tmpdir, 'host2', 'etc', 'network', 'interfaces')
+        self.assertIn('iface br-ctlplane inet dhcp',
+                      utils.get_file_data(eni))
+
+    def test_batch_invalid_manifest(self):
+        manifest = tempfile.NamedTemporaryFile(suffix='.yaml')
+        manifest.write(b'hosts:\n  - config: foo.yaml\n')
+        manifest.flush()
+        self.run_cli('ARG0 --batch=%s' % manifest.name, exitcodes=(1,))
+        manifest.close()
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+from os_net_config import diff
+from os_net_config import objects
+from os_net_config.tests import base
+
+
+def _bridge(mtu=1500, members=('em1', 'em2'), vlan_id=10):
+    data = {'type': 'ovs_bridge', 'name': 'br-ex', 'use_dhcp': True,
+            'members': [{'type': 'interface', 'name': name, 'mtu': mtu}
+                        for name in members]}
+    data['members'].append({'type': 'vlan', 'vlan_id': vlan_id})
+    return objects.object_from_json(data)
+
+
+class TestConfigDiff(base.TestCase):
+
+    def test_no_differences(self):
+        config_diff = diff.ConfigDiff([_bridge()], [_bridge()])
+        self.assertFalse(config_diff)
+        self.assertEqual([], config_diff.restart_devices)
+        self.assertEqual('', config_diff.report())
+
+    def test_modified(self):
+        config_diff = diff.ConfigDiff([_bridge()], [_bridge(mtu=9000)])
+        self.assertTrue(config_diff)
+        self.assertEqual([], config_diff.added)
+        self.assertEqual([], config_diff.removed)
+        self.assertEqual({'em1': {'mtu': (1500, 9000)},
+                          'em2': {'mtu': (1500, 9000)}},
+                         dict(config_diff.modified))
+        self.assertEqual(['em1', 'em2'], config_diff.restart_devices)
+
+    def test_added_removed(self):
+        old = [_bridge()]
+        new = [_bridge(members=('em1', 'em3'), vlan_id=20)]
+        config_diff = diff.ConfigDiff(old, new)
+        self.assertEqual(['em3', 'vlan20'], config_diff.added)
+        self.assertEqual(['em2', 'vlan10'], config_diff.removed)
+        self.assertEqual(['br-ex'], list(config_diff.modified))
+        self.assertEqual(['br-ex', 'em1', 'em3', 'vlan20'],
+                         config_diff.restart_devices)
+        self.assertEqual("""+ em3 (interface)
++ vlan20 (vlan)
+- em2 (interface)
+- vlan10 (vlan)
+~ br-ex (bridge)
+    members: ["em1", "em2", "vlan10"] -> ["em1", "em3", "vlan20"]
+Devices to restart: br-ex, em1, em3, vlan20""", config_diff.report())
+
+    def test_vlan_restarted_with_device(self):
+        def interface(mtu):
+            return objects.object_from_json({'type': 'interface',
+                                             'name': 'em1', 'mtu': mtu})
+        vlan = objects.object_from_json({'type': 'vlan', 'device': 'em1',
+                                         'vlan_id': 5})
+        config_diff = diff.ConfigDiff([interface(1500), vlan],
+                                      [interface(9000), vlan])
+        self.assertEqual(['em1'], list(config_diff.modified))
+        self.assertEqual(['em1', 'vlan5'], config_diff.restart_devices)
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+from oslo_concurrency import processutils
+
+from os_net_config import ethtool
+from os_net_config import objects
+from os_net_config.tests import base
+
+
+_RINGS = """Ring parameters for em1:
+Pre-set maximums:
+RX:\t\t4096
+RX Mini:\t0
+RX Jumbo:\t0
+TX:\t\t4096
+Current hardware settings:
+RX:\t\t256
+RX Mini:\t0
+RX Jumbo:\t0
+TX:\t\t4096
+"""
+
+_COALESCE = """Coalesce parameters for em1:
+Adaptive RX: on  TX: off
+stats-block-usecs: 0
+rx-usecs: 3
+rx-frames: 0
+"""
+
+_FEATURES = """Features for em1:
+rx-checksumming: on
+tx-checksumming: on
+\ttx-checksum-ipv4: off [fixed]
+generic-receive-offload: on
+large-receive-offload: off [fixed]
+"""
+
+
+class TestEthtool(base.TestCase):
+
+    def setUp(self):
+        super(TestEthtool, self).setUp()
+        self.opts = objects.EthtoolOpts(
+            rings={'rx': '4096', 'tx': '4096'},
+            coalesce={'adaptive-rx': 'on', 'rx-usecs': '50'},
+            features={'gro': 'on', 'lro': 'on'})
+
+    def test_parse_rings(self):
+        self.assertEqual({'rx': '256', 'rx-mini': '0', 'rx-jumbo': '0',
+                          'tx': '4096'},
+                         ethtool.parse_settings('rings', _RINGS))
+
+    def test_parse_coalesce(self):
+        self.assertEqual({'adaptive-rx': 'on', 'adaptive-tx': 'off',
+                          'stats-block-usecs': '0', 'rx-usecs': '3',
+                          'rx-frames': '0'},
+                         ethtool.parse_settings('coalesce', _COALESCE))
+
+    def test_parse_features(self):
+        features = ethtool.parse_settings('features', _FEATURES)
+        self.assertEqual('on', features['generic-receive-offload'])
+        self.assertEqual('off', features['tx-checksum-ipv4'])
+
+    def test_commands(self):
+        self.assertEqual([['-G', 'em1', 'rx', '4096', 'tx', '4096'],
+                          ['-C', 'em1', 'adaptive-rx', 'on', 'rx-usecs',
+                           '50'],
+                          ['-K', 'em1', 'gro', 'on', 'lro', 'on']],
+                         ethtool.commands('em1', self.opts))
+        self.assertEqual('-G em1 rx 4096 tx 4096; '
+                         '-C em1 adaptive-rx on rx-usecs 50; '
+                         '-K em1 gro on lro on',
+                         ethtool.ifcfg_opts('em1', self.opts))
+
+    def test_commands_differences(self):
+        outputs = {'-g': _RINGS, '-c': _COALESCE, '-k': _FEATURES}
+
+        def test_execute(*args, **kwargs):
+            return outputs[args[1]], ''
+        self.stubs.Set(processutils, 'execute', test_execute)
+        current = ethtool.current_settings('em1', self.opts)
+        self.assertEqual(['rings', 'coalesce', 'features'], sorted(
+            current, key=lambda group: objects.EthtoolOpts.GROUPS.index(
+                group)))
+        self.assertEqual([['-G', 'em1', 'rx', '4096'],
+                          ['-C', 'em1', 'rx-usecs', '50'],
+                          ['-K', 'em1', 'lro', 'on']],
+                         ethtool.commands('em1', self.opts, current))
+
+    def test_unreadable_settings_are_applied(self):
+        def test_execute(*args, **kwargs):
+            if args[1] == '-k':
+                raise processutils.ProcessExecutionError('not supported')
+            return '', ''
+        self.stubs.Set(processutils, 'execute', test_execute)
+        current = ethtool.current_settings('em1', self.opts)
+        self.assertNotIn('features', current)
+        self.assertIn(['-K', 'em1', 'gro', 'on', 'lro', 'on'],
+                      ethtool.commands('em1', self.opts, current))
@@ -88,6 +88,18 @@ iface vlan5 inet manual
     ovs_options tag=5
 """
 
+_LINUX_BRIDGE_VLAN_AWARE = """auto br0
+iface br0 inet static
+    address 192.168.1.2
+    netmask 255.255.255.0
+    bridge_ports eth0
+    bridge_fd 0
+    bridge_stp off
+    bridge_vlan_aware yes
+    bridge_ageing 30
+    bridge_vids 10
+"""
+
 _RTS = """up route add -net 172.19.0.0 netmask 255.255.255.0 gw 192.168.1.1
 down route del -net 172.19.0.0 netmask 255.255.255.0 gw 192.168.1.1
 """
@@ -118,6 +130,26 @@ class TestENINetConfig(base.TestCase):
         self.provider.add_interface(interface)
         self.assertEqual(_v4_IFACE_NO_IP, self.get_interface_config())
 
+    def test_interface_ethtool_opts(self):
+        opts = objects.EthtoolOpts(channels={'combined': '8'},
+                                   features={'lro': 'off'})
+        interface = objects.Interface(self.if_name, ethtool_opts=opts)
+        self.provider.add_interface(interface)
+        self.assertEqual(_v4_IFACE_NO_IP +
+                         "    pre-up /sbin/ethtool -L eth0 combined 8\n"
+                         "    pre-up /sbin/ethtool -K eth0 lro off\n",
+                         self.get_interface_config())
+
+    def test_interface_queue_steering(self):
+        queue_steering = objects.QueueSteering(irq_affinity='2-3')
+        interface = objects.Interface(self.if_name,
+                                      queue_steering=queue_steering)
+        self.provider.add_interface(interface)
+        self.assertEqual(_v4_IFACE_NO_IP +
+                         "    post-up /usr/bin/os-net-config --steer-queues "
+                         "eth0 irq_affinity=2-3\n",
+                         self.get_interface_config())
+
     def test_add_interface_with_v4(self):
         v4_addr = objects.Address('192.168.1.2/24')
         interface = self._default_interface([v4_addr])
@@ -175,6 +207,28 @@ class TestENINetConfig(base.TestCase):
         self.assertEqual(_V4_IFACE_STATIC_IP, self.get_interface_config())
         self.assertEqual(_RTS, self.get_route_config())
 
+    def test_network_with_multipath_routes(self):
+        route = objects.Route(ip_netmask='172.19.0.0/24', next_hops=[
+            objects.NextHop('192.168.1.1', weight=1),
+            objects.NextHop('192.168.2.1', 'eth1', weight=3)])
+        self.provider.add_interface(self._default_interface(rts=[route]))
+        self.assertEqual("up ip -4 route add 172.19.0.0/24 "
+                         "nexthop via 192.168.1.1 dev eth0 weight 1 "
+                         "nexthop via 192.168.2.1 dev eth1 weight 3\n"
+                         "down ip -4 route del 172.19.0.0/24\n",
+                         self.get_route_config())
+
+    def test_network_with_route_settings(self):
+        route = objects.Route('192.168.1.1', '172.19.0.0/24', table='100',
+                              metric=10, initcwnd=10, congctl='bbr')
+        self.provider.add_interface(self._default_interface(rts=[route]))
+        self.assertEqual("up ip -4 route add 172.19.0.0/24 via 192.168.1.1 "
+                         "dev eth0 table 100 metric 10 initcwnd 10 "
+                         "congctl bbr\n"
+                         "down ip -4 route del 172.19.0.0/24 table 100 "
+                         "metric 10\n",
+                         self.get_route_config())
+
     def test_network_ovs_bridge_with_dhcp(self):
         interface = self._default_interface()
         bridge = objects.OvsBridge('br0', use_dhcp=True,
@@ -216,6 +270,22 @@ class TestENINetConfig(base.TestCase):
         self.assertEqual(_OVS_BRIDGE_DHCP_OVS_EXTRA,
                          self.provider.bridges['br0'])
 
+    def test_network_linux_bridge_vlan_aware(self):
+        interface = self._default_interface()
+        interface.bridge_vlans = ['100-199', '300']
+        interface.bridge_pvid = 10
+        bridge = objects.LinuxBridge(
+            'br0', addresses=[objects.Address('192.168.1.2/24')],
+            members=[interface], vlan_filtering=True, stp=False,
+            ageing_time=30, bridge_vlans=['10'])
+        self.provider.add_object(bridge)
+        self.assertEqual(_LINUX_BRIDGE_VLAN_AWARE,
+                         self.provider.bridges['br0'])
+        self.assertEqual(_v4_IFACE_NO_IP +
+                         "    bridge_vids 100-199 300\n"
+                         "    bridge_pvid 10\n",
+                         self.get_interface_config())
+
     def test_vlan(self):
         vlan = objects.Vlan('eth0', 5)
         self.provider.add_vlan(vlan)
@@ -291,6 +361,7 @@ class TestENINetConfigApply(base.TestCase):
         self.provider.add_interface(interface)
         self.provider.add_bridge(bridge)
         self.provider.apply()
+        self.provider.wait_for_dhcp()
         iface_data = utils.get_file_data(self.temp_config_file.name)
         self.assertEqual((_OVS_BRIDGE_DHCP + _OVS_PORT_IFACE), iface_data)
         self.assertIn('eth0', self.ifup_interface_names)
@@ -15,7 +15,10 @@
 # under the License.
 
 import os.path
+import shutil
 import tempfile
+import threading
+import time
 
 from oslo_concurrency import processutils
 
@@ -294,6 +297,14 @@ class TestIfcfgNetConfig(base.TestCase):
         self.provider.add_interface(interface)
         self.assertEqual(_IFCFG_VLAN, self.get_interface_config('em1.120'))
 
+    def test_add_interface_ethtool_opts(self):
+        opts = objects.EthtoolOpts(rings={'rx': '4096'},
+                                   features={'gro': 'off'})
+        interface = objects.Interface('em1', ethtool_opts=opts)
+        self.provider.add_interface(interface)
+        self.assertEqual(_NO_IP + 'ETHTOOL_OPTS="-G em1 rx 4096; '
+                         '-K em1 gro off"\n', self.get_interface_config())
+
     def test_add_ovs_interface(self):
         interface = objects.Interface('em1')
         interface.ovs_port = True
@@ -380,6 +391,55 @@ class TestIfcfgNetConfig(base.TestCase):
         self.assertEqual(_V4_V6_IFCFG, self.get_interface_config())
         self.assertEqual(_ROUTES_V6, self.get_route6_config())
 
+    def test_network_with_multipath_routes(self):
+        route1 = objects.Route(default=True, next_hops=[
+            objects.NextHop('192.168.1.1'),
+            objects.NextHop('192.168.2.1', 'em2', weight=2)])
+        route2 = objects.Route(ip_netmask='2001:db8::/32', next_hops=[
+            objects.NextHop('fe80::1'), objects.NextHop('fe80::2', 'em2')])
+        interface = objects.Interface('em1', routes=[route1, route2])
+        self.provider.add_interface(interface)
+        # written to the route files of the device of the last next hop
+        self.assertEqual('', self.get_route_config())
+        self.assertEqual('', self.get_route6_config())
+        self.assertEqual('default nexthop via 192.168.1.1 dev em1 '
+                         'nexthop via 192.168.2.1 dev em2 weight 2\n',
+                         self.get_route_config('em2'))
+        self.assertEqual('2001:db8::/32 nexthop via fe80::1 dev em1 '
+                         'nexthop via fe80::2 dev em2\n',
+                         self.get_route6_config('em2'))
+
+        route3 = objects.Route('192.168.1.1', '172.19.0.0/24')
+        self.provider.add_interface(objects.Interface('em2', routes=[route3]))
+        self.assertEqual('172.19.0.0/24 via 192.168.1.1 dev em2\n'
+                         'default nexthop via 192.168.1.1 dev em1 '
+                         'nexthop via 192.168.2.1 dev em2 weight 2\n',
+                         self.get_route_config('em2'))
+
+        # and removed from them with the route
+        self.provider.add_interface(objects.Interface('em1',
+                                                      routes=[route3]))
+        self.assertEqual('172.19.0.0/24 via 192.168.1.1 dev em2\n',
+                         self.get_route_config('em2'))
+        self.assertEqual('', self.get_route6_config('em2'))
+
+    def test_network_with_route_settings(self):
+        route1 = objects.Route('192.168.1.1', default=True, metric=100,
+                               initcwnd=10, initrwnd=10, quickack=True)
+        route2 = objects.Route(ip_netmask='172.19.0.0/24', table='100',
+                               mtu=1400, mtu_lock=True, advmss=1360,
+                               congctl='bbr', next_hops=[
+                                   objects.NextHop('192.168.1.1'),
+                                   objects.NextHop('192.168.1.2')])
+        interface = objects.Interface('em1', routes=[route1, route2])
+        self.provider.add_interface(interface)
+        self.assertEqual('default via 192.168.1.1 dev em1 metric 100 '
+                         'initcwnd 10 initrwnd 10 quickack 1\n'
+                         '172.19.0.0/24 table 100 mtu lock 1400 advmss 1360 '
+                         'congctl bbr nexthop via 192.168.1.1 dev em1 '
+                         'nexthop via 192.168.1.2 dev em1\n',
+                         self.get_route_config())
+
     def test_network_ovs_bridge_with_dhcp(self):
         interface = objects.Interface('em1')
         bridge = objects.OvsBridge('br-ctlplane', use_dhcp=True,
@@ -400,6 +460,17 @@ class TestIfcfgNetConfig(base.TestCase):
         self.assertEqual(_LINUX_BRIDGE_DHCP,
                          self.provider.linuxbridge_data['br-ctlplane'])
 
+    def test_network_linux_bridge_vlan_filtering(self):
+        bridge = objects.LinuxBridge('br-ctlplane', use_dhcp=True,
+                                     vlan_filtering=True, stp=False,
+                                     multicast_snooping=False,
+                                     ageing_time=30)
+        self.provider.add_linux_bridge(bridge)
+        self.assertEqual(_LINUX_BRIDGE_DHCP.replace(
+            'DELAY=0\n', 'DELAY=0\nSTP=no\nBRIDGING_OPTS="vlan_filtering=1 '
+            'multicast_snooping=0 ageing_time=3000"\n'),
+            self.provider.linuxbridge_data['br-ctlplane'])
+
     def test_network_ovs_bridge_static(self):
         v4_addr = objects.Address('192.168.1.2/24')
         interface = objects.Interface('em1')
@@ -620,6 +691,112 @@ DNS2=5.6.7.8
         self.assertEqual(em1_config, self.get_interface_config('em1'))
 
 
+class TestIfcfgNetConfigDpdk(base.TestCase):
+
+    def setUp(self):
+        super(TestIfcfgNetConfigDpdk, self).setUp()
+        pci_addresses = {'em1': '0000:00:01.0', 'em2': '0000:00:02.0'}
+        self.stubs.Set(utils, 'get_pci_address', pci_addresses.get)
+        self.provider = impl_ifcfg.IfcfgNetConfig()
+
+    def test_ovs_user_bridge_dpdk_port(self):
+        dpdk_port = objects.OvsDpdkPort(
+            'dpdk0', mtu=9000, rx_queue=2,
+            members=[objects.Interface('em1')])
+        bridge = objects.OvsUserBridge('br-link', members=[dpdk_port],
+                                       pmd_cpus='2-3', socket_mem='1024')
+        self.provider.add_object(bridge)
+        self.assertEqual(
+            _BASE_IFCFG.replace('em1', 'br-link') +
+            'DEVICETYPE=ovs\nTYPE=OVSUserBridge\n'
+            'OVS_EXTRA="set Open_vSwitch . other_config:dpdk-init=true -- '
+            'set Open_vSwitch . other_config:pmd-cpu-mask=c -- '
+            'set Open_vSwitch . other_config:dpdk-socket-mem=1024"\n',
+            self.provider.bridge_data['br-link'])
+        self.assertEqual(
+            _BASE_IFCFG.replace('em1', 'dpdk0') +
+            'DEVICETYPE=ovs\nTYPE=OVSDPDKPort\n'
+            'OVS_BRIDGE=br-link\n'
+            'OVS_EXTRA="set Interface dpdk0 '
+            'options:dpdk-devargs=0000:00:01.0 -- '
+            'set Interface dpdk0 mtu_request=9000 -- '
+            'set Interface dpdk0 options:n_rxq=2"\n',
+            self.provider.interface_data['dpdk0'])
+        # the nic is bound to DPDK, not configured
+        self.assertEqual(['dpdk0'], list(self.provider.interface_data))
+
+    def test_ovs_dpdk_bond(self):
+        dpdk_ports = [objects.OvsDpdkPort('dpdk%i' % i,
+                                          members=[objects.Interface(nic)])
+                      for i, nic in enumerate(['em1', 'em2'])]
+        bond = objects.OvsDpdkBond('dpdkbond0', members=dpdk_ports,
+                                   rx_queue=4,
+                                   ovs_options='bond_mode=active-backup')
+        bridge = objects.OvsUserBridge('br-link', members=[bond])
+        self.provider.add_object(bridge)
+        self.assertEqual(
+            _BASE_IFCFG.replace('em1', 'dpdkbond0') +
+            'DEVICETYPE=ovs\nTYPE=OVSDPDKBond\n'
+            'OVS_BRIDGE=br-link\n'
+            'BOND_IFACES="dpdk0 dpdk1"\n'
+            'OVS_OPTIONS="bond_mode=active-backup"\n'
+            'OVS_EXTRA="set Interface dpdk0 '
+            'options:dpdk-devargs=0000:00:01.0 -- '
+            'set Interface dpdk0 options:n_rxq=4 -- '
+            'set Interface dpdk1 options:dpdk-devargs=0000:00:02.0 -- '
+            'set Interface dpdk1 options:n_rxq=4"\n',
+            self.provider.interface_data['dpdkbond0'])
+        self.assertEqual(['dpdk0', 'dpdk1'],
+                         sorted(self.provider.dpdk_ports))
+
+    def test_bind_dpdk_ports(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        mapping_file = os.path.join(tmpdir, 'dpdk_mapping.yaml')
+        self.stubs.Set(utils, 'DPDK_MAPPING_FILE', mapping_file)
+        commands = []
+
+        def test_execute(*args, **kwargs):
+            commands.append(' '.join(args))
+        self.stubs.Set(processutils, 'execute', test_execute)
+        drivers = {'0000:00:02.0': 'vfio-pci'}
+        self.stubs.Set(utils, 'get_pci_driver', drivers.get)
+        self.stubs.Set(utils, 'interface_mac',
+                       lambda name: '52:54:00:00:00:01')
+        for i, nic in enumerate(['em1', 'em2']):
+            self.provider.add_object(objects.OvsDpdkPort(
+                'dpdk%i' % i, members=[objects.Interface(nic)]))
+        self.provider.bind_dpdk_ports()
+        self.assertEqual(['/usr/sbin/driverctl set-override 0000:00:01.0 '
+                          'vfio-pci'], commands)
+        # the mapping is read back to look the bound nic up
+        self.assertEqual({'em1': {'pci_address': '0000:00:01.0',
+                                  'mac_address': '52:54:00:00:00:01',
+                                  'driver': 'vfio-pci'}},
+                         utils.get_dpdk_mapping())
+
+    def test_bind_dpdk_ports_root_dir(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        mapping_file = os.path.join(tmpdir, 'dpdk_mapping.yaml')
+        self.stubs.Set(utils, 'DPDK_MAPPING_FILE', mapping_file)
+        commands = []
+
+        def test_execute(*args, **kwargs):
+            commands.append(' '.join(args))
+        self.stubs.Set(processutils, 'execute', test_execute)
+        self.stubs.Set(utils, 'get_pci_driver', lambda pci_address: None)
+        # the local nics are not bound for the config of another root
+        self.provider = impl_ifcfg.IfcfgNetConfig(root_dir=tmpdir)
+        self.provider.add_object(objects.OvsDpdkPort(
+            'dpdk0', members=[objects.Interface('em1')],
+            pci_address='0000:00:01.0'))
+        self.provider.bind_dpdk_ports()
+        self.assertEqual([], commands)
+        self.assertFalse(os.path.exists(mapping_file))
+        self.assertEqual([], os.listdir(tmpdir))
+
+
 class TestIfcfgNetConfigApply(base.TestCase):
 
     def setUp(self):
@@ -652,6 +829,12 @@ class TestIfcfgNetConfigApply(base.TestCase):
             return self.temp_cleanup_file.name
         self.stubs.Set(impl_ifcfg, 'cleanup_pattern', test_cleanup_pattern)
 
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        self.ifup_local = os.path.join(tmpdir, 'ifup-local')
+        self.stubs.Set(impl_ifcfg, 'ifup_local_path',
+                       lambda: self.ifup_local)
+
         def test_execute(*args, **kwargs):
             if args[0] == '/sbin/ifup':
                 self.ifup_interface_names.append(args[1])
@@ -671,6 +854,31 @@ class TestIfcfgNetConfigApply(base.TestCase):
             self.temp_cleanup_file.close()
         super(TestIfcfgNetConfigApply, self).tearDown()
 
+    def test_bridge_vlans_persisted(self):
+        # initscripts have no port VLAN setting, ifup-local sets them
+        interface = objects.Interface('em1')
+        interface.bridge_vlans = ['100-199']
+        interface.bridge_pvid = 10
+        bridge = objects.LinuxBridge('br-tenant', vlan_filtering=True,
+                                     bridge_vlans=['10'],
+                                     members=[interface])
+        self.provider.add_object(bridge)
+        self.provider.apply(activate=False)
+        self.assertEqual(
+            '#!/bin/sh\n'
+            '# This file is autogenerated by os-net-config\n'
+            'case "$1" in\n'
+            'br-tenant)\n'
+            '    /sbin/bridge vlan del dev br-tenant vid 1 self\n'
+            '    /sbin/bridge vlan add dev br-tenant vid 10 self\n'
+            '    ;;\n'
+            'em1)\n'
+            '    /sbin/bridge vlan del dev em1 vid 1\n'
+            '    /sbin/bridge vlan add dev em1 vid 100-199\n'
+            '    /sbin/bridge vlan add dev em1 vid 10 pvid untagged\n'
+            '    ;;\n'
+            'esac\n', utils.get_file_data(self.ifup_local))
+
     def test_network_apply(self):
         route1 = objects.Route('192.168.1.1', default=True)
         route2 = objects.Route('192.168.1.1', '172.19.0.0/24')
@@ -744,6 +952,7 @@ class TestIfcfgNetConfigApply(base.TestCase):
         self.provider.add_interface(interface)
         self.provider.add_bridge(bridge)
         self.provider.apply()
+        self.provider.wait_for_dhcp()
         self.assertIn('em1', self.ifup_interface_names)
         self.assertIn('br-ctlplane', self.ifup_interface_names)
 
@@ -768,6 +977,7 @@ class TestIfcfgNetConfigApply(base.TestCase):
         self.provider.add_bond(bond)
         self.provider.add_bridge(bridge)
         self.provider.apply()
+        self.provider.wait_for_dhcp()
 
         # changing the bridge should restart everything
         self.ifup_interface_names = []
@@ -792,6 +1002,244 @@ class TestIfcfgNetConfigApply(base.TestCase):
         self.assertEqual(1, self.ifup_interface_names.count("em1"))
         self.assertEqual(1, self.ifup_interface_names.count("em2"))
 
+    def test_route_change_reconciled(self):
+        route1 = objects.Route('192.168.1.1', default=True)
+        route2 = objects.Route('192.168.1.1', '172.19.0.0/24')
+        interface = objects.Interface('em1', routes=[route1])
+        self.provider.add_interface(interface)
+        self.provider.apply()
+        self.assertEqual(['em1'], self.ifup_interface_names)
+
+        self.ifup_interface_names = []
+        self.provider = impl_ifcfg.IfcfgNetConfig()
+        self.provider.reconcile_routes = True
+        interface = objects.Interface('em1', routes=[route1, route2])
+        self.provider.add_interface(interface)
+        self.provider.apply()
+        self.assertEqual([], self.ifup_interface_names)
+        self.assertEqual(_ROUTES, utils.get_file_data(
+            self.temp_route_file.name))
+        self.assertEqual({'em1': [route1, route2]},
+                         self.provider.device_routes)
+
+    def test_multipath_route_after_ifup(self):
+        commands = []
+
+        def test_execute(*args, **kwargs):
+            if args[0] == '/sbin/ifup':
+                commands.append('ifup %s' % args[1])
+            elif args[0] == '/sbin/ip':
+                commands.append(' '.join(args[1:]) + ': ' +
+                                kwargs.get('process_input', ''))
+        self.stubs.Set(processutils, 'execute', test_execute)
+
+        route = objects.Route(ip_netmask='172.19.0.0/24', next_hops=[
+            objects.NextHop('192.168.1.1'),
+            objects.NextHop('192.168.2.1', 'vlan10')])
+        interface = objects.Interface('em1', routes=[route])
+        vlan = objects.Vlan('em1', 10)
+        self.provider.add_interface(interface)
+        self.provider.add_vlan(vlan)
+        self.provider.apply()
+        self.assertEqual(['ifup em1', 'ifup vlan10',
+                          '-4 -force -batch -: route replace 172.19.0.0/24 '
+                          'nexthop via 192.168.1.1 dev em1 '
+                          'nexthop via 192.168.2.1 dev vlan10\n'],
+                         commands)
+
+    def test_mtu_change_live(self):
+        commands = []
+
+        def test_execute(*args, **kwargs):
+            if args[0] == '/sbin/ifup':
+                self.ifup_interface_names.append(args[1])
+            elif args[0] == '/sbin/ip':
+                commands.append(' '.join(args[1:]))
+        self.stubs.Set(processutils, 'execute', test_execute)
+        self.stubs.Set(utils, 'interface_mtu', lambda name: 1500)
+
+        self.provider.add_interface(objects.Interface('em1', mtu=1500))
+        self.provider.apply()
+        self.assertEqual(['em1'], self.ifup_interface_names)
+
+        self.ifup_interface_names = []
+        self.provider = impl_ifcfg.IfcfgNetConfig()
+        self.provider.add_interface(objects.Interface('em1', mtu=9000))
+        self.provider.apply()
+        self.assertEqual([], self.ifup_interface_names)
+        self.assertEqual(['link set dev em1 mtu 9000'], commands)
+        self.assertIn('MTU=9000\n', utils.get_file_data(
+            self.temp_ifcfg_file.name))
+
+        # other changes still restart the device
+        self.provider = impl_ifcfg.IfcfgNetConfig()
+        v4_addr = objects.Address('192.0.2.1/24')
+        self.provider.add_interface(objects.Interface('em1', mtu=1500,
+                                                      addresses=[v4_addr]))
+        self.provider.apply()
+        self.assertEqual(['em1'], self.ifup_interface_names)
+
+    def test_ethtool_opts_change_live(self):
+        commands = []
+
+        def test_execute(*args, **kwargs):
+            if args[0] == '/sbin/ifup':
+                self.ifup_interface_names.append(args[1])
+            elif args[0] == '/sbin/ethtool':
+                if args[1] == '-g':
+                    return 'Current hardware settings:\nRX:\t256\n', ''
+                commands.append(' '.join(args[1:]))
+            return '', ''
+        self.stubs.Set(processutils, 'execute', test_execute)
+        self.stubs.Set(utils, 'interface_mtu', lambda name: 1500)
+
+        opts = objects.EthtoolOpts(rings={'rx': '256'})
+        self.provider.add_interface(objects.Interface('em1',
+                                                      ethtool_opts=opts))
+        self.provider.apply()
+        self.assertEqual(['em1'], self.ifup_interface_names)
+        self.assertEqual([], commands)
+
+        self.ifup_interface_names = []
+        self.provider = impl_ifcfg.IfcfgNetConfig()
+        opts = objects.EthtoolOpts(rings={'rx': '4096'})
+        self.provider.add_interface(objects.Interface('em1',
+                                                      ethtool_opts=opts))
+        self.provider.apply()
+        self.assertEqual([], self.ifup_interface_names)
+        self.assertEqual(['-G em1 rx 4096'], commands)
+        self.assertIn('ETHTOOL_OPTS="-G em1 rx 4096"\n',
+                      utils.get_file_data(self.temp_ifcfg_file.name))
+
+    def test_set_mtus_order(self):
+        commands = []
+
+        def test_execute(*args, **kwargs):
+            commands.append(' '.join(args[4:]))
+        self.stubs.Set(processutils, 'execute', test_execute)
+        self.stubs.Set(utils, 'interface_mtu', lambda name: 1600)
+        interface = objects.Interface('em1')
+        bond = objects.LinuxBond('bond0', members=[interface])
+        self.provider.topology.add_object(bond)
+        self.provider.topology.add_object(objects.Vlan('bond0', 5))
+        self.provider.set_mtus({'vlan5': 9000, 'bond0': 9000, 'em1': 9000})
+        self.assertEqual(['em1 mtu 9000', 'bond0 mtu 9000',
+                          'vlan5 mtu 9000'], commands)
+        del commands[:]
+        self.provider.set_mtus({'vlan5': 1500, 'bond0': 1500, 'em1': 1500})
+        self.assertEqual(['vlan5 mtu 1500', 'bond0 mtu 1500',
+                          'em1 mtu 1500'], commands)
+
+    def test_restart_devices_once(self):
+        interface1 = objects.Interface('em1')
+        interface2 = objects.Interface('em2')
+        bond = objects.OvsBond('bond0', members=[interface1, interface2])
+        bridge = objects.OvsBridge('br-ctlplane', members=[bond])
+        vlan = objects.Vlan('bond0', 5)
+        self.provider.add_object(bridge)
+        self.provider.add_object(vlan)
+        self.provider.apply()
+        self.assertEqual(['br-ctlplane', 'bond0', 'em1', 'em2', 'vlan5'],
+                         self.provider.restart_devices)
+        for name in self.provider.restart_devices:
+            self.assertEqual(1, self.ifup_interface_names.count(name))
+        # vlans are brought up last
+        self.assertEqual('vlan5', self.ifup_interface_names[-1])
+
+    def test_dhcp_ifup_in_background(self):
+        lease = threading.Event()
+
+        def test_execute(*args, **kwargs):
+            if args[0] == '/sbin/ifup':
+                if args[1] in ('em2', 'em3'):
+                    lease.wait()
+                if args[1] == 'em3':
+                    raise processutils.ProcessExecutionError('no lease')
+                self.ifup_interface_names.append(args[1])
+        self.stubs.Set(processutils, 'execute', test_execute)
+
+        self.provider.add_interface(objects.Interface('em1'))
+        self.provider.add_interface(objects.Interface('em2', use_dhcp=True))
+        self.provider.add_interface(objects.Interface('em3', use_dhcpv6=True))
+        self.provider.apply()
+        self.assertEqual(['em1'], self.ifup_interface_names)
+        self.assertEqual({'em2': 'pending', 'em3': 'pending'},
+                         self.provider.wait_for_dhcp(timeout=0))
+
+        lease.set()
+        self.assertEqual({'em2': 'bound', 'em3': 'failed'},
+                         self.provider.wait_for_dhcp(timeout=5))
+        self.assertEqual(['em1', 'em2'], self.ifup_interface_names)
+
+    def test_dhcp_ifup_dependencies(self):
+        lease = threading.Event()
+
+        def test_execute(*args, **kwargs):
+            if args[0] == '/sbin/ifup':
+                if args[1] == 'br-ctlplane':
+                    lease.wait(5)
+                self.ifup_interface_names.append(args[1])
+        self.stubs.Set(processutils, 'execute', test_execute)
+
+        interface = objects.Interface('em1')
+        bridge = objects.LinuxBridge('br-ctlplane', use_dhcp=True,
+                                     members=[interface])
+        self.provider.add_object(bridge)
+        self.provider.add_object(objects.Vlan('em2', 5))
+        self.provider.apply()
+        # the Linux bridge port and the unrelated vlan do not wait for the
+        # lease of the bridge
+        self.assertEqual(['em1', 'vlan5'], self.ifup_interface_names)
+        lease.set()
+        self.assertEqual({'br-ctlplane': 'bound'},
+                         self.provider.wait_for_dhcp(timeout=5))
+
+    def test_dhcp_ifup_ovs_members_wait(self):
+        def test_execute(*args, **kwargs):
+            if args[0] == '/sbin/ifup':
+                if args[1] == 'br-ctlplane':
+                    # ifup-ovs brings up the OVSDHCPINTERFACES
+                    time.sleep(0.1)
+                self.ifup_interface_names.append(args[1])
+        self.stubs.Set(processutils, 'execute', test_execute)
+
+        bond = objects.OvsBond('bond1', members=[objects.Interface('em2'),
+                                                 objects.Interface('em3')])
+        bridge = objects.OvsBridge('br-ctlplane', use_dhcp=True,
+                                   members=[objects.Interface('em1'), bond])
+        self.provider.add_object(bridge)
+        self.provider.apply()
+        self.assertIn('OVSDHCPINTERFACES="em1 bond1"',
+                      self.provider.bridge_data['br-ctlplane'])
+        # the members do not race the ifup of the bridge
+        self.assertEqual('br-ctlplane', self.ifup_interface_names[0])
+        self.assertEqual(['bond1', 'em1', 'em2', 'em3'],
+                         sorted(self.ifup_interface_names[1:]))
+
+    def test_dhcp_ifup_vlan_waits(self):
+        def test_execute(*args, **kwargs):
+            if args[0] == '/sbin/ifup':
+                if args[1] == 'br-ctlplane':
+                    time.sleep(0.1)
+                self.ifup_interface_names.append(args[1])
+        self.stubs.Set(processutils, 'execute', test_execute)
+
+        interface = objects.Interface('em1')
+        bridge = objects.OvsBridge('br-ctlplane', use_dhcp=True,
+                                   members=[interface])
+        self.provider.add_object(bridge)
+        self.provider.add_object(objects.Vlan('br-ctlplane', 5))
+        self.provider.apply()
+        # the vlan on top of the bridge waits for its lease
+        self.assertEqual(['br-ctlplane', 'em1', 'vlan5'],
+                         self.ifup_interface_names)
+
+    def test_dhcp_ifup_noop(self):
+        provider = impl_ifcfg.IfcfgNetConfig(noop=True)
+        provider.add_interface(objects.Interface('em1', use_dhcp=True))
+        provider.apply()
+        self.assertEqual({}, provider.wait_for_dhcp())
+
     def test_vlan_apply(self):
         vlan = objects.Vlan('em1', 5)
         self.provider.add_vlan(vlan)
@@ -815,3 +1263,11 @@ class TestIfcfgNetConfigApply(base.TestCase):
         self.provider.apply(cleanup=True)
         self.assertTrue(os.path.exists(tmp_lo_file))
         os.remove(tmp_lo_file)
+
+    def test_vlan_range_apply(self):
+        vlan_range = objects.VlanRange('em1', 5, 6)
+        self.provider.add_object(vlan_range)
+        self.assertEqual(['vlan5', 'vlan6'], sorted(self.provider.vlan_data))
+        self.provider.apply()
+        self.assertEqual(['vlan5', 'vlan6'],
+                         sorted(self.ifup_interface_names))
@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014-2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import shutil
+import tempfile
+
+from oslo_concurrency import processutils
+
+import os_net_config
+from os_net_config import impl_networkd
+from os_net_config import objects
+from os_net_config.tests import base
+from os_net_config import utils
+
+
+_HEADER = "# This file is autogenerated by os-net-config\n"
+
+_V4_NETWORK = _HEADER + """[Match]
+Name=em1
+
+[Network]
+Address=192.168.1.2/24
+
+[Route]
+Gateway=192.168.1.1
+
+[Route]
+Destination=172.19.0.0/24
+Gateway=192.168.1.1
+"""
+
+_DHCP_NETWORK = _HEADER + """[Match]
+Name=em1
+
+[Link]
+MTUBytes=9000
+
+[Network]
+DHCP=yes
+DNS=192.0.2.53
+
+[DHCP]
+UseRoutes=false
+"""
+
+_VLAN_NETDEV = _HEADER + """[NetDev]
+Name=vlan5
+Kind=vlan
+
+[VLAN]
+Id=5
+"""
+
+_BOND_NETDEV = _HEADER + """[NetDev]
+Name=bond0
+Kind=bond
+MACAddress=a1:b2:c3:d4:e5
+
+[Bond]
+Mode=802.3ad
+MIIMonitorSec=100ms
+"""
+
+_BOND_MEMBER_NETWORK = _HEADER + """[Match]
+Name=em1
+
+[Network]
+Bond=bond0
+PrimarySlave=true
+"""
+
+_BRIDGE_NETDEV = _HEADER + """[NetDev]
+Name=br0
+Kind=bridge
+
+[Bridge]
+VLANFiltering=yes
+STP=yes
+MulticastSnooping=no
+AgeingTimeSec=30
+"""
+
+_BRIDGE_PORT_NETWORK = _HEADER + """[Match]
+Name=em1
+
+[Network]
+Bridge=br0
+
+[BridgeVLAN]
+VLAN=100-199
+
+[BridgeVLAN]
+PVID=10
+EgressUntagged=10
+"""
+
+
+class TestNetworkdNetConfig(base.TestCase):
+
+    def setUp(self):
+        super(TestNetworkdNetConfig, self).setUp()
+        self.provider = impl_networkd.NetworkdNetConfig()
+
+    def get_network_config(self, name='em1'):
+        files = self.provider._network_files()
+        return files[impl_networkd.network_config_path(name)][1]
+
+    def get_netdev_config(self, name):
+        return self.provider.netdev_data[name]
+
+    def test_interface_static(self):
+        routes = [objects.Route('192.168.1.1', default=True),
+                  objects.Route('192.168.1.1', '172.19.0.0/24')]
+        interface = objects.Interface(
+            'em1', addresses=[objects.Address('192.168.1.2/24')],
+            routes=routes)
+        self.provider.add_interface(interface)
+        self.assertEqual(_V4_NETWORK, self.get_network_config())
+
+    def test_interface_dhcp(self):
+        interface = objects.Interface('em1', use_dhcp=True, use_dhcpv6=True,
+                                      mtu=9000, defroute=False,
+                                      dns_servers=['192.0.2.53'])
+        self.provider.add_interface(interface)
+        self.assertEqual(_DHCP_NETWORK, self.get_network_config())
+
+    def test_multipath_route(self):
+        route = objects.Route(default=True, next_hops=[
+            objects.NextHop('192.168.1.1'),
+            objects.NextHop('192.168.2.1', 'em2', weight=2)])
+        self.provider.add_interface(objects.Interface('em1', routes=[route]))
+        self.assertTrue(self.get_network_config().endswith(
+            '[Route]\nMultiPathRoute=192.168.1.1\n'
+            'MultiPathRoute=192.168.2.1@em2 2\n'))
+
+    def test_route_settings(self):
+        route = objects.Route('192.168.1.1', '172.19.0.0/24', table='100',
+                              metric=10, mtu=1400, advmss=1360, initcwnd=10,
+                              initrwnd=20, quickack=False, congctl='bbr')
+        self.provider.add_interface(objects.Interface('em1', routes=[route]))
+        self.assertTrue(self.get_network_config().endswith(
+            '[Route]\nDestination=172.19.0.0/24\nGateway=192.168.1.1\n'
+            'Table=100\nMetric=10\nMTUBytes=1400\n'
+            'TCPAdvertisedMaximumSegmentSize=1360\n'
+            'InitialCongestionWindow=10\n'
+            'InitialAdvertisedReceiveWindow=20\nQuickAck=no\n'
+            'TCPCongestionControlAlgorithm=bbr\n'))
+
+    def test_vlan(self):
+        self.provider.add_vlan(objects.Vlan('em1', 5))
+        self.assertEqual(_VLAN_NETDEV, self.get_netdev_config('vlan5'))
+        self.assertIn('VLAN=vlan5\n', self.get_network_config('em1'))
+
+        self.provider.add_interface(objects.Interface('em1', use_dhcp=True))
+        self.assertIn('DHCP=ipv4\nVLAN=vlan5\n', self.get_network_config())
+
+    def test_linux_bond(self):
+        self.stubs.Set(utils, 'interface_mac', lambda name: 'a1:b2:c3:d4:e5')
+        interface1 = objects.Interface('em1', primary=True)
+        interface2 = objects.Interface('em2')
+        bond = objects.LinuxBond('bond0', members=[interface1, interface2],
+                                 bonding_options='mode=802.3ad miimon=100')
+        self.provider.add_object(bond)
+        self.assertEqual(_BOND_NETDEV, self.get_netdev_config('bond0'))
+        self.assertEqual(_BOND_MEMBER_NETWORK, self.get_network_config())
+        self.assertIn('Bond=bond0\n', self.get_network_config('em2'))
+        self.assertNotIn('PrimarySlave', self.get_network_config('em2'))
+
+    def test_linux_bond_invalid_option(self):
+        bond = objects.LinuxBond('bond0',
+                                 bonding_options='mode=1 frobnicate=yes')
+        self.assertRaises(objects.InvalidConfigException,
+                          self.provider.add_linux_bond, bond)
+
+    def test_linux_bridge(self):
+        interface = objects.Interface('em1')
+        bridge = objects.LinuxBridge(
+            'br0', members=[interface],
+            addresses=[objects.Address('192.0.2.1/24')])
+        self.provider.add_object(bridge)
+        self.assertIn('Kind=bridge\n', self.get_netdev_config('br0'))
+        self.assertIn('Address=192.0.2.1/24\n', self.get_network_config('br0'))
+        self.assertIn('Bridge=br0\n', self.get_network_config('em1'))
+
+    def test_linux_bridge_vlan_filtering(self):
+        interface = objects.Interface('em1')
+        interface.bridge_vlans = ['100-199']
+        interface.bridge_pvid = 10
+        bridge = objects.LinuxBridge(
+            'br0', members=[interface], vlan_filtering=True, stp=True,
+            multicast_snooping=False, ageing_time=30, bridge_vlans=['10'])
+        self.provider.add_object(bridge)
+        self.provider.add_vlan(objects.Vlan('br0', 10))
+        self.assertEqual(_BRIDGE_NETDEV, self.get_netdev_config('br0'))
+        self.assertEqual(_BRIDGE_PORT_NETWORK, self.get_network_config())
+        self.assertTrue(self.get_network_config('br0').endswith(
+            'VLAN=vlan10\n\n[BridgeVLAN]\nVLAN=10\n'))
+
+    def test_ovs_not_implemented(self):
+        bridge = objects.OvsBridge('br0', members=[objects.Interface('em1')])
+        self.assertRaises(os_net_config.NotImplemented,
+                          self.provider.add_object, bridge)
+
+
+class TestNetworkdNetConfigApply(base.TestCase):
+
+    def setUp(self):
+        super(TestNetworkdNetConfigApply, self).setUp()
+        self.root_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root_dir)
+        self.config_dir = self.root_dir + impl_networkd.networkd_config_dir()
+        os.makedirs(self.config_dir)
+        self.commands = []
+        self.links = ['em1']
+
+        def test_execute(*args, **kwargs):
+            self.commands.append(list(args))
+        self.stubs.Set(processutils, 'execute', test_execute)
+
+        def test_link_exists(name):
+            return name in self.links
+        self.stubs.Set(impl_networkd, 'link_exists', test_link_exists)
+
+    def _apply(self, objs, **kwargs):
+        provider = impl_networkd.NetworkdNetConfig(root_dir=self.root_dir)
+        for obj in objs:
+            provider.add_object(obj)
+        self.commands = []
+        return provider, provider.apply(**kwargs)
+
+    def test_apply(self):
+        interface = objects.Interface('em1', use_dhcp=True)
+        vlan = objects.Vlan('em1', 5)
+        provider, files = self._apply([interface, vlan])
+        self.assertEqual(sorted(['10-os-net-config-em1.network',
+                                 '10-os-net-config-vlan5.network',
+                                 '10-os-net-config-vlan5.netdev']),
+                         sorted(os.listdir(self.config_dir)))
+        self.assertEqual(3, len(files))
+        # vlan5 is created by the reload
+        self.assertEqual([['/bin/networkctl', 'reload'],
+                          ['/bin/networkctl', 'reconfigure', 'em1']],
+                         self.commands)
+
+        # nothing changed, nothing to do
+        provider, files = self._apply([interface, vlan])
+        self.assertEqual({}, files)
+        self.assertEqual([], self.commands)
+
+        # only the changed link is reconfigured
+        self.links.append('vlan5')
+        vlan = objects.Vlan('em1', 5, mtu=1400)
+        provider, files = self._apply([interface, vlan])
+        self.assertEqual([['/bin/networkctl', 'reload'],
+                          ['/bin/networkctl', 'reconfigure', 'vlan5']],
+                         self.commands)
+        self.assertEqual(['vlan5'], provider.restart_devices)
+
+    def test_apply_noactivate_and_cleanup(self):
+        stale = os.path.join(self.config_dir, '10-os-net-config-em2.network')
+        other = os.path.join(self.config_dir, '20-other.network')
+        utils.write_config(stale, 'stale')
+        utils.write_config(other, 'other')
+        self._apply([objects.Interface('em1')], cleanup=True, activate=False)
+        self.assertEqual([], self.commands)
+        self.assertFalse(os.path.exists(stale))
+        self.assertTrue(os.path.exists(other))
@@ -15,6 +15,7 @@
 # under the License.
 
 import json
+import threading
 import six
 
 from os_net_config import objects
@@ -46,6 +47,64 @@ class TestRoute(base.TestCase):
         self.assertEqual("172.19.0.0/24", route.ip_netmask)
         self.assertTrue(route.default)
 
+    def test_from_json_next_hops(self):
+        data = {'default': True,
+                'next_hops': [{'next_hop': '192.0.2.1', 'device': 'nic1'},
+                              {'next_hop': '198.51.100.1', 'device': 'em2',
+                               'weight': '2'}]}
+        route = objects.Route.from_json(data)
+        self.assertIsNone(route.next_hop)
+        self.assertEqual(['192.0.2.1', '198.51.100.1'], route.gateways())
+        self.assertEqual(4, route.version())
+        self.assertEqual('nic1', route.next_hops[0].device)
+        self.assertIsNone(route.next_hops[0].weight)
+        self.assertEqual(2, route.next_hops[1].weight)
+        # next hop devices are resolved with the device of the route
+        self.stubbed_numbered_nics = {'nic1': 'em1', 'nic2': 'em2'}
+        interface = objects.Interface('nic2', routes=[route])
+        self.assertEqual('em2', interface.name)
+        self.assertEqual('em1', route.next_hops[0].device)
+
+    def test_from_json_settings(self):
+        data = {'next_hop': '192.0.2.1', 'ip_netmask': '10.0.0.0/8',
+                'table': 100, 'metric': '10', 'mtu': 1400, 'mtu_lock': True,
+                'advmss': 1360, 'initcwnd': 10, 'initrwnd': '20',
+                'quickack': 'yes', 'congctl': 'bbr'}
+        route = objects.Route.from_json(data)
+        self.assertEqual('100', route.table)
+        self.assertEqual(10, route.metric)
+        self.assertEqual(1400, route.mtu)
+        self.assertTrue(route.mtu_lock)
+        self.assertEqual(1360, route.advmss)
+        self.assertEqual(10, route.initcwnd)
+        self.assertEqual(20, route.initrwnd)
+        self.assertTrue(route.quickack)
+        self.assertEqual('bbr', route.congctl)
+        route = objects.Route.from_json({'next_hop': '192.0.2.1',
+                                         'table': 'storage'})
+        self.assertEqual('storage', route.table)
+        self.assertIsNone(route.metric)
+        self.assertIsNone(route.quickack)
+
+    def test_from_json_invalid_settings(self):
+        for settings in ({'table': 0}, {'table': 'a b'}, {'metric': -1},
+                         {'mtu': 67}, {'mtu': 'big'}, {'initcwnd': 0},
+                         {'advmss': 65536}, {'mtu_lock': True},
+                         {'congctl': 'bbr;reboot'}):
+            data = dict(settings, next_hop='192.0.2.1')
+            self.assertRaises(objects.InvalidConfigException,
+                              objects.Route.from_json, data)
+
+    def test_from_json_invalid_next_hops(self):
+        hop = {'next_hop': '192.0.2.1'}
+        for data in ({'next_hops': hop},
+                     {'next_hops': [hop], 'next_hop': '192.0.2.1'},
+                     {'next_hops': [{'device': 'em1'}]},
+                     {'next_hops': [dict(hop, weight=0)]},
+                     {'next_hops': [dict(hop, weight=257)]}):
+            self.assertRaises(objects.InvalidConfigException,
+                              objects.Route.from_json, data)
+
 
 class TestAddress(base.TestCase):
 
@@ -77,6 +136,10 @@ class TestAddress(base.TestCase):
         self.assertRaises(objects.InvalidConfigException,
                           objects.Address.from_json,
                           json_data)
+        err = self.assertRaises(objects.InvalidConfigException,
+                                objects.Address.from_json,
+                                {'ip_netmask': '192.168.1.300/24'})
+        self.assertEqual('Invalid address: 192.168.1.300/24', str(err))
 
 
 class TestInterface(base.TestCase):
@@ -167,6 +230,118 @@ class TestInterface(base.TestCase):
         self.assertEqual("192.0.2.1", route1.next_hop)
         self.assertEqual("192.0.2.1/24", route1.ip_netmask)
 
+    def test_from_json_ethtool_opts(self):
+        data = """{
+"type": "interface",
+"name": "em1",
+"ethtool_opts": {
+    "rings": {"rx": 4096, "tx": 4096},
+    "channels": {"combined": 8},
+    "features": {"GRO": true, "lro": false}
+}
+}
+"""
+        interface = objects.object_from_json(json.loads(data))
+        opts = interface.ethtool_opts
+        self.assertEqual({'rx': '4096', 'tx': '4096'}, opts.rings)
+        self.assertEqual({'combined': '8'}, opts.channels)
+        self.assertEqual({}, opts.coalesce)
+        self.assertEqual({'gro': 'on', 'lro': 'off'}, opts.features)
+
+    def test_from_json_ethtool_opts_invalid(self):
+        for ethtool_opts in ({'ring': {'rx': 1}}, {'rings': [1]},
+                             {'features': {'gro': 'on; reboot'}}):
+            data = {'type': 'interface', 'name': 'em1',
+                    'ethtool_opts': ethtool_opts}
+            self.assertRaises(objects.InvalidConfigException,
+                              objects.object_from_json, data)
+
+    def test_from_json_queue_steering(self):
+        data = {'type': 'interface', 'name': 'em1',
+                'queue_steering': {'rps_cpus': 'auto', 'xps_cpus': '0-3,8'}}
+        interface = objects.object_from_json(data)
+        self.assertEqual('auto', interface.queue_steering.rps_cpus)
+        self.assertEqual('0-3,8', interface.queue_steering.xps_cpus)
+        self.assertIsNone(interface.queue_steering.irq_affinity)
+        data['queue_steering'] = 'auto'
+        interface = objects.object_from_json(data)
+        self.assertEqual('auto', interface.queue_steering.irq_affinity)
+        data['queue_steering'] = {'rps_cpus': 'all'}
+        self.assertRaises(objects.InvalidConfigException,
+                          objects.object_from_json, data)
+
+
+class TestLinuxBridgeVlans(base.TestCase):
+
+    def test_from_json(self):
+        data = {'type': 'linux_bridge', 'name': 'br0',
+                'vlan_filtering': True, 'stp': 'off',
+                'multicast_snooping': False, 'ageing_time': 30,
+                'bridge_vlans': [10],
+                'members': [{'type': 'interface', 'name': 'em1',
+                             'bridge_vlans': ['100-199', 200, '250-251'],
+                             'bridge_pvid': 10},
+                            {'type': 'interface', 'name': 'em2',
+                             'bridge_vlans': '300,302,301'}]}
+        bridge = objects.object_from_json(data)
+        self.assertTrue(bridge.vlan_filtering)
+        self.assertFalse(bridge.stp)
+        self.assertFalse(bridge.multicast_snooping)
+        self.assertEqual(30, bridge.ageing_time)
+        self.assertEqual(['10'], bridge.bridge_vlans)
+        self.assertIsNone(bridge.bridge_pvid)
+        em1, em2 = bridge.members
+        self.assertEqual(['100-200', '250-251'], em1.bridge_vlans)
+        self.assertEqual(10, em1.bridge_pvid)
+        self.assertEqual(['300-302'], em2.bridge_vlans)
+        self.assertIsNone(em2.bridge_pvid)
+
+    def test_invalid(self):
+        port = {'type': 'interface', 'name': 'em1', 'bridge_vlans': [10]}
+        data = {'type': 'linux_bridge', 'name': 'br0', 'members': [port]}
+        self.assertRaises(objects.InvalidConfigException,
+                          objects.object_from_json, data)
+        data['vlan_filtering'] = True
+        objects.object_from_json(data)
+        for invalid in ([0], ['10-5'], ['foo'], [4095]):
+            port['bridge_vlans'] = invalid
+            self.assertRaises(objects.InvalidConfigException,
+                              objects.object_from_json, data)
+        port['bridge_vlans'] = [10]
+        port['bridge_pvid'] = 4095
+        self.assertRaises(objects.InvalidConfigException,
+                          objects.object_from_json, data)
+
+
+class TestSriov(base.TestCase):
+
+    def test_pf_from_json(self):
+        data = {'type': 'sriov_pf', 'name': 'em1', 'numvfs': 16, 'mtu': 9000}
+        pf = objects.object_from_json(data)
+        self.assertIsInstance(pf, objects.Interface)
+        self.assertEqual(16, pf.numvfs)
+        self.assertEqual(9000, pf.mtu)
+        data['numvfs'] = -1
+        self.assertRaises(objects.InvalidConfigException,
+                          objects.object_from_json, data)
+
+    def test_vf_from_json(self):
+        data = {'type': 'sriov_vf', 'device': 'em1', 'vfid': 0,
+                'vlan_id': 100, 'macaddr': '52:54:00:00:00:10',
+                'spoofchk': 'off', 'trust': True, 'max_tx_rate': 1000}
+        vf = objects.object_from_json(data)
+        self.assertEqual('em1_vf0', vf.name)
+        self.assertEqual(100, vf.vlan_id)
+        self.assertFalse(vf.spoofchk)
+        self.assertTrue(vf.trust)
+        self.assertIsNone(vf.min_tx_rate)
+        self.assertEqual(1000, vf.max_tx_rate)
+        for invalid in ({'vlan_id': 4096}, {'macaddr': 'foo'},
+                        {'vfid': None}):
+            invalid_data = dict(data, **invalid)
+            self.assertRaises(objects.InvalidConfigException,
+                              objects.object_from_json, invalid_data)
+
 
 class TestVlan(base.TestCase):
 
@@ -267,6 +442,56 @@ class TestBridge(base.TestCase):
         self.assertEqual("br-foo", interface2.bridge_name)
 
 
+class TestOvsUserBridge(base.TestCase):
+
+    def setUp(self):
+        super(TestOvsUserBridge, self).setUp()
+        pci_addresses = {'em1': '0000:00:01.0', 'em2': '0000:00:02.0'}
+        self.stubs.Set(utils, 'get_pci_address', pci_addresses.get)
+
+    def test_from_json(self):
+        data = {'type': 'ovs_user_bridge', 'name': 'br-link',
+                'pmd_cpus': '2-3,10', 'socket_mem': '1024, 1024',
+                'members': [{
+                    'type': 'ovs_dpdk_bond', 'name': 'dpdkbond0',
+                    'rx_queue': 2,
+                    'members': [
+                        {'type': 'ovs_dpdk_port', 'name': 'dpdk0',
+                         'members': [{'type': 'interface', 'name': 'em1'}]},
+                        {'type': 'ovs_dpdk_port', 'name': 'dpdk1',
+                         'driver': 'igb_uio', 'pci_address': '0000:81:00.0',
+                         'members': [{'type': 'interface', 'name': 'em2'}]},
+                    ]}]}
+        bridge = objects.object_from_json(data)
+        self.assertIsInstance(bridge, objects.OvsUserBridge)
+        self.assertEqual('2-3,10', bridge.pmd_cpus)
+        self.assertEqual('1024,1024', bridge.socket_mem)
+        bond = bridge.members[0]
+        self.assertIsInstance(bond, objects.OvsDpdkBond)
+        self.assertEqual(2, bond.rx_queue)
+        self.assertEqual('br-link', bond.bridge_name)
+        # the PCI address is only looked up when it is not set
+        self.assertEqual([('dpdk0', 'vfio-pci', None, '0000:00:01.0'),
+                          ('dpdk1', 'igb_uio', '0000:81:00.0',
+                           '0000:81:00.0')],
+                         [(port.name, port.driver, port.pci_address,
+                           port.get_pci_address())
+                          for port in bond.members])
+
+    def test_invalid_dpdk_port(self):
+        self.assertRaises(objects.InvalidConfigException,
+                          objects.OvsDpdkPort, 'dpdk0')
+        # the nic is only needed when the port is rendered or applied
+        dpdk_port = objects.OvsDpdkPort('dpdk0',
+                                        members=[objects.Interface('em3')])
+        self.assertRaises(objects.InvalidConfigException,
+                          dpdk_port.get_pci_address)
+        data = {'type': 'ovs_dpdk_port', 'name': 'dpdk0', 'rx_queue': 0,
+                'members': [{'type': 'interface', 'name': 'em1'}]}
+        self.assertRaises(objects.InvalidConfigException,
+                          objects.object_from_json, data)
+
+
 class TestLinuxBridge(base.TestCase):
 
     def test_from_json_dhcp(self):
@@ -555,7 +780,7 @@ class TestNumberedNicsMapping(base.TestCase):
 
     def tearDown(self):
         super(TestNumberedNicsMapping, self).tearDown()
-        objects._NUMBERED_NICS = None
+        objects._NIC_RESOLVER = None
 
     def _stub_active_nics(self, nics):
         def dummy_ordered_active_nics():
@@ -609,3 +834,163 @@ class TestNumberedNicsMapping(base.TestCase):
         expected = {}
         # This only emits a warning, so it should still work
         self.assertEqual(expected, objects._numbered_nics())
+
+    def test_numbered_nics_different_mappings(self):
+        self._stub_active_nics(['em1', 'em2'])
+        self.assertEqual({'nic1': 'em1', 'nic2': 'em2'},
+                         objects._numbered_nics())
+        mapping = {'nic1': 'em2', 'nic2': 'em1'}
+        self.assertEqual({'nic1': 'em2', 'nic2': 'em1'},
+                         objects._numbered_nics(nic_mapping=mapping))
+
+    def test_resolver_memoized(self):
+        macs = []
+
+        def dummy_interface_mac(name):
+            macs.append(name)
+            mac_map = {'em1': '12:34:56:78:9a:bc',
+                       'em2': '12:34:56:de:f0:12'}
+            return mac_map[name]
+        self.stubs.Set(utils, 'interface_mac', dummy_interface_mac)
+        self._stub_active_nics(['em1', 'em2'])
+        resolver = objects.NicResolver()
+        mapping = {'nic1': '12:34:56:DE:F0:12', 'nic2': '12:34:56:78:9a:bc'}
+        for i in range(3):
+            self.assertEqual({'nic1': 'em2', 'nic2': 'em1'},
+                             resolver.numbered_nics(dict(mapping)))
+        self.assertEqual(['em1', 'em2'], macs)
+
+    def test_resolver_passed_to_objects(self):
+        self._stub_active_nics(['em1', 'em2'])
+        resolver = objects.NicResolver()
+        mapping = {'nic1': 'em2', 'nic2': 'em1'}
+        data = {'type': 'ovs_bridge', 'name': 'br-ctlplane',
+                'nic_mapping': mapping,
+                'members': [{'type': 'interface', 'name': 'nic1',
+                             'nic_mapping': mapping},
+                            {'type': 'vlan', 'device': 'nic1', 'vlan_id': 5,
+                             'nic_mapping': mapping}]}
+        bridge = objects.object_from_json(data, resolver)
+        self.assertEqual('em2', bridge.members[0].name)
+        self.assertEqual('em2', bridge.members[1].device)
+        self.assertIsNone(objects._NIC_RESOLVER)
+
+    def test_resolver_threads(self):
+        self._stub_active_nics(['em1', 'em2'])
+        resolver = objects.NicResolver()
+        results = []
+
+        def resolve():
+            results.append(resolver.numbered_nics({'nic1': 'em2',
+                                                  'nic2': 'em1'}))
+        threads = [threading.Thread(target=resolve) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(8, len(results))
+        for result in results:
+            self.assertIs(results[0], result)
+
+    def test_resolver_refresh(self):
+        self._stub_active_nics(['em1', 'em3'])
+        resolver = objects.NicResolver()
+        self.assertEqual(set(), resolver.refresh())
+        mapping = {'nic3': 'em2'}
+        self.assertEqual({'nic1': 'em1', 'nic2': 'em3'},
+                         resolver.numbered_nics(mapping))
+        self.assertEqual(set(), resolver.refresh())
+
+        # em2 sorts before em3 but is numbered after it, em1 is gone
+        self._stub_active_nics(['em2', 'em3', 'em4'])
+        self.assertEqual(set(['nic3', 'nic4']), resolver.refresh())
+        self.assertEqual({'nic1': 'em1', 'nic2': 'em3', 'nic3': 'em2',
+                          'nic4': 'em4'}, resolver.numbered_nics(mapping))
+        self.assertEqual({'nic1': 'em1', 'nic2': 'em3', 'nic3': 'em2',
+                          'nic4': 'em4'}, resolver.numbered_nics())
+
+
+class TestVlanRange(base.TestCase):
+
+    def test_from_json(self):
+        data = """{
+"type": "vlan_range",
+"device": "em1",
+"vlan_id_start": 100,
+"vlan_id_end": 102,
+"mtu": 1400,
+"addresses": [
+    {"ip_netmask": "192.0.2.1/24"},
+    {"ip_netmask": "2001:db8::1/64"}
+]
+}
+"""
+        vlan_range = objects.object_from_json(json.loads(data))
+        vlans = list(vlan_range.vlans())
+        self.assertEqual(['vlan100', 'vlan101', 'vlan102'],
+                         [vlan.name for vlan in vlans])
+        self.assertEqual([100, 101, 102], [vlan.vlan_id for vlan in vlans])
+        for vlan in vlans:
+            self.assertEqual('em1', vlan.device)
+            self.assertEqual(1400, vlan.mtu)
+        self.assertEqual(['192.0.2.1/24', '2001:db8::1/64'],
+                         [a.ip_netmask for a in vlans[0].addresses])
+        self.assertEqual(['192.0.4.1/24', '2001:db8:0:2::1/64'],
+                         [a.ip_netmask for a in vlans[2].addresses])
+
+    def test_host_addresses(self):
+        vlan_range = objects.VlanRange(
+            'em1', 10, 11, addresses=[objects.Address('192.0.2.10/32')])
+        self.assertEqual(['192.0.2.10/32', '192.0.2.11/32'],
+                         [v.addresses[0].ip_netmask
+                          for v in vlan_range.vlans()])
+
+    def test_vlans_lazy(self):
+        vlan_range = objects.VlanRange('em1', 1, 4094)
+        vlans = vlan_range.vlans()
+        self.assertEqual('vlan1', next(vlans).name)
+        self.assertEqual('vlan2', next(vlans).name)
+
+    def test_invalid_range(self):
+        self.assertRaises(objects.InvalidConfigException,
+                          objects.VlanRange, 'em1', 20, 10)
+        self.assertRaises(objects.InvalidConfigException,
+                          objects.VlanRange, 'em1', 0, 10)
+        self.assertRaises(objects.InvalidConfigException,
+                          objects.VlanRange, 'em1', 4000, 4095)
+
+    def test_address_overflow(self):
+        self.assertRaises(objects.InvalidConfigException,
+                          objects.VlanRange, 'em1', 1, 3,
+                          addresses=[objects.Address('255.255.254.1/24')])
+
+    def test_routes_not_supported(self):
+        data = {'type': 'vlan_range', 'vlan_id_start': 1, 'vlan_id_end': 2,
+                'routes': [{'next_hop': '192.0.2.1', 'default': True}]}
+        self.assertRaises(objects.InvalidConfigException,
+                          objects.object_from_json, data)
+
+    def test_ovs_bridge_members(self):
+        data = """{
+"type": "ovs_bridge",
+"name": "br-tenant",
+"members": [
+    {"type": "interface", "name": "em1"},
+    {"type": "vlan_range", "vlan_id_start": 10, "vlan_id_end": 12}
+]
+}
+"""
+        bridge = objects.object_from_json(json.loads(data))
+        self.assertEqual(['em1', 'vlan10', 'vlan11', 'vlan12'],
+                         [member.name for member in bridge.members])
+        for vlan in bridge.members[1:]:
+            self.assertTrue(vlan.ovs_port)
+            self.assertEqual('br-tenant', vlan.bridge_name)
+
+    def test_expand_object(self):
+        vlan_range = objects.VlanRange('em1', 10, 11)
+        self.assertEqual(['vlan10', 'vlan11'],
+                         [o.name for o in objects.expand_object(vlan_range)])
+        interface = objects.Interface('em1')
+        self.assertEqual([interface],
+                         list(objects.expand_object(interface)))
@@ -21,10 +21,82 @@ test_os_net_config
 Tests for `os_net_config` module.
 """
 
+import os
+import shutil
+import tempfile
+
+from oslo_concurrency import processutils
+
+import os_net_config
+from os_net_config import objects
 from os_net_config.tests import base
+from os_net_config import utils
 
 
 class TestOs_net_config(base.TestCase):
 
     def test_something(self):
         pass
+
+
+class TestSriov(base.TestCase):
+
+    def setUp(self):
+        super(TestSriov, self).setUp()
+        self.sys_class_net = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.sys_class_net)
+        self.stubs.Set(utils, '_SYS_CLASS_NET', self.sys_class_net)
+        self._set_numvfs('em1', 0)
+        self._set_numvfs('em2', 4)
+        self.commands = []
+
+        def test_execute(*args, **kwargs):
+            self.commands.append((args, kwargs.get('process_input')))
+        self.stubs.Set(processutils, 'execute', test_execute)
+
+    def _set_numvfs(self, name, numvfs):
+        device_dir = os.path.join(self.sys_class_net, name, 'device')
+        if not os.path.isdir(device_dir):
+            os.makedirs(device_dir)
+        with open(os.path.join(device_dir, 'sriov_numvfs'), 'w') as f:
+            f.write('%i\n' % numvfs)
+
+    def _numvfs(self, name):
+        return utils.get_sriov_numvfs(name)
+
+    def test_configure_sriov(self):
+        provider = os_net_config.NetConfig()
+        written = []
+        self.stubs.Set(provider, 'write_sysfs',
+                       lambda path, value, msg: written.append(
+                           (os.path.basename(os.path.dirname(
+                               os.path.dirname(path))), value)))
+        for name, numvfs in (('em1', 2), ('em2', 4), ('em3', 8)):
+            provider.sriov_pfs[name] = objects.SriovPF(name, numvfs)
+        provider.add_object(objects.SriovVF('em1', 0, vlan_id=10,
+                                            macaddr='52:54:00:00:00:10',
+                                            spoofchk=False, trust=True))
+        provider.add_object(objects.SriovVF('em1', 1, max_tx_rate=1000))
+        provider.configure_sriov()
+        # em2 already has its VFs, em3 has no SR-IOV
+        self.assertEqual([('em1', '2')], written)
+        self.assertEqual([(('/sbin/ip', '-force', '-batch', '-'),
+                           'link set dev em1 vf 0 mac 52:54:00:00:00:10 '
+                           'vlan 10 spoofchk off trust on\n'
+                           'link set dev em1 vf 1 max_tx_rate 1000\n')],
+                         self.commands)
+
+    def test_change_numvfs(self):
+        provider = os_net_config.NetConfig()
+        provider.sriov_pfs['em2'] = objects.SriovPF('em2', 8)
+        written = []
+
+        def test_write_sysfs(path, value, msg):
+            written.append(value)
+            with open(path, 'w') as f:
+                f.write(value)
+        self.stubs.Set(provider, 'write_sysfs', test_write_sysfs)
+        provider.configure_sriov()
+        self.assertEqual(['0', '8'], written)
+        self.assertEqual(8, self._numvfs('em2'))
+        self.assertEqual([], self.commands)
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014-2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import shutil
+import sys
+import tempfile
+
+from oslo_concurrency import processutils
+import six
+
+import os_net_config
+from os_net_config import cli
+from os_net_config import impl_eni
+from os_net_config import objects
+from os_net_config import plan
+from os_net_config.tests import base
+from os_net_config import utils
+
+
+class TestPlan(base.TestCase):
+
+    def setUp(self):
+        super(TestPlan, self).setUp()
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        os.makedirs(os.path.join(self.tmpdir, 'etc', 'network'))
+        self.eni_path = os.path.join(self.tmpdir, 'etc', 'network',
+                                     'interfaces')
+        self.plan_path = os.path.join(self.tmpdir, 'plan.json')
+        self.config_path = os.path.join(self.tmpdir, 'config.yaml')
+        utils.write_config(self.config_path, """network_config:
+  - type: interface
+    name: em1
+    addresses:
+      - ip_netmask: 192.0.2.1/24
+""")
+        self.commands = []
+
+        def test_execute(*args, **kwargs):
+            self.commands.append(list(args))
+        self.stubs.Set(processutils, 'execute', test_execute)
+
+    def run_cli(self, argstr, exitcodes=(0,)):
+        orig = sys.stdout
+        sys.stdout = six.StringIO()
+        ret = cli.main(argstr.split())
+        self.assertIn(ret, exitcodes)
+        stdout = sys.stdout.getvalue()
+        sys.stdout = orig
+        return stdout
+
+    def test_record(self):
+        provider = impl_eni.ENINetConfig(root_dir=self.tmpdir)
+        provider.plan = plan.Plan()
+        provider.add_interface(objects.Interface('em1'))
+        provider.apply()
+        self.assertEqual([], self.commands)
+        self.assertFalse(os.path.exists(self.eni_path))
+        self.assertEqual(['execute', 'write', 'execute'],
+                         [step['action'] for step in provider.plan.steps])
+        self.assertEqual(['/sbin/ifup', 'em1'], provider.plan.steps[2]['cmd'])
+        self.assertEqual({self.eni_path: None}, provider.plan.preconditions)
+
+    def test_plan_out_and_in(self):
+        stdout = self.run_cli('ARG0 --provider=eni --root-dir=%s -c %s '
+                              '--plan-out=%s' % (self.tmpdir,
+                                                 self.config_path,
+                                                 self.plan_path))
+        self.assertIn('Plan with 3 steps written to %s' % self.plan_path,
+                      stdout)
+        self.assertEqual([], self.commands)
+        self.assertFalse(os.path.exists(self.eni_path))
+
+        self.run_cli('ARG0 --plan-in=%s' % self.plan_path)
+        self.assertEqual([['/sbin/ifdown', 'em1'], ['/sbin/ifup', 'em1']],
+                         self.commands)
+        self.assertIn('address 192.0.2.1',
+                      utils.get_file_data(self.eni_path))
+
+    def test_plan_in_precondition_failed(self):
+        self.run_cli('ARG0 --provider=eni --root-dir=%s -c %s '
+                     '--plan-out=%s' % (self.tmpdir, self.config_path,
+                                        self.plan_path))
+        utils.write_config(self.eni_path, 'auto lo\n')
+        self.run_cli('ARG0 --plan-in=%s' % self.plan_path, exitcodes=(1,))
+        self.assertEqual([], self.commands)
+        self.assertEqual('auto lo\n', utils.get_file_data(self.eni_path))
+
+    def test_replay_noop(self):
+        recorded = plan.Plan()
+        recorded.add_write(self.eni_path, 'auto em1\n', None)
+        recorded.add_execute('ifup', '/sbin/ifup', ('em1',), {})
+        recorded.replay(os_net_config.NetConfig(noop=True))
+        self.assertEqual([], self.commands)
+        self.assertFalse(os.path.exists(self.eni_path))
+
+    def test_load_invalid(self):
+        utils.write_config(self.plan_path, '{"version": 42}')
+        self.assertRaises(plan.PlanException, plan.Plan.load, self.plan_path)
+        utils.write_config(self.plan_path, 'not json')
+        self.assertRaises(plan.PlanException, plan.Plan.load, self.plan_path)
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import json
+
+from oslo_concurrency import processutils
+
+import os_net_config
+from os_net_config import objects
+from os_net_config import reconcile
+from os_net_config.tests import base
+
+
+_KERNEL_ROUTES_V4 = json.dumps([
+    {'dst': 'default', 'gateway': '192.0.2.1', 'dev': 'em1',
+     'protocol': 'boot', 'flags': []},
+    {'dst': '172.19.0.0/24', 'gateway': '192.0.2.254', 'dev': 'em1',
+     'protocol': 'boot', 'flags': []},
+    {'dst': '10.0.0.0/8', 'gateway': '192.0.2.1', 'dev': 'em1',
+     'protocol': 'static', 'flags': []},
+    {'dst': '192.0.2.0/24', 'dev': 'em1', 'protocol': 'kernel',
+     'scope': 'link', 'prefsrc': '192.0.2.2', 'flags': []},
+    {'dst': '198.51.100.0/24', 'gateway': '192.0.2.1', 'dev': 'em9',
+     'protocol': 'boot', 'flags': []},
+    {'type': 'local', 'dst': '192.0.2.2', 'table': 'local', 'dev': 'em1',
+     'protocol': 'kernel', 'scope': 'host', 'prefsrc': '192.0.2.2',
+     'flags': []}])
+
+_KERNEL_ROUTES_V6 = json.dumps([
+    {'dst': 'fe80::/64', 'dev': 'em1', 'protocol': 'kernel',
+     'metric': 256, 'flags': []},
+    {'dst': 'default', 'gateway': '2001:db8::1', 'dev': 'em1',
+     'protocol': 'ra', 'metric': 1024, 'flags': []}])
+
+
+class TestRouteReconciler(base.TestCase):
+
+    def setUp(self):
+        super(TestRouteReconciler, self).setUp()
+        self.batches = []
+
+        def test_execute(*args, **kwargs):
+            if args[:2] == ('/sbin/ip', '-4'):
+                return (_KERNEL_ROUTES_V4, '')
+            elif args[:2] == ('/sbin/ip', '-6'):
+                return (_KERNEL_ROUTES_V6, '')
+            self.batches.append((args, kwargs))
+            return ('', '')
+        self.stubs.Set(processutils, 'execute', test_execute)
+
+        self.provider = os_net_config.NetConfig()
+        routes = [objects.Route('192.0.2.1', default=True),
+                  objects.Route('192.0.2.1', '172.19.0.0/24'),
+                  objects.Route('2001:DB8::2', '2001:db8:1::/64')]
+        for obj in (objects.Interface('em1', routes=routes),
+                    objects.Interface('em2')):
+            self.provider._track_object(obj)
+
+    def test_parse_kernel_routes(self):
+        self.assertEqual(
+            {(4, 'main', '0.0.0.0/0', 0): ('192.0.2.1', 'em1', ()),
+             (4, 'main', '172.19.0.0/24', 0): ('192.0.2.254', 'em1', ()),
+             (4, 'main', '10.0.0.0/8', 0): ('192.0.2.1', 'em1', ())},
+            reconcile.parse_kernel_routes(_KERNEL_ROUTES_V4, 4, ['em1']))
+
+    def test_reconcile(self):
+        commands = reconcile.RouteReconciler(self.provider).reconcile()
+        expected = ['route del 10.0.0.0/8 dev em1 table main',
+                    'route replace 172.19.0.0/24 via 192.0.2.1 dev em1 '
+                    'table main proto static',
+                    'route replace 2001:db8:1::/64 via 2001:db8::2 dev em1 '
+                    'table main proto static']
+        self.assertEqual(expected, commands)
+        self.assertEqual([(('/sbin/ip', '-force', '-batch', '-'),
+                           {'process_input': '\n'.join(expected) + '\n'})],
+                         self.batches)
+
+    def test_reconcile_multipath(self):
+        kernel_routes = json.dumps([
+            {'dst': '10.0.0.0/8', 'protocol': 'static', 'flags': [],
+             'nexthops': [{'gateway': '192.0.2.1', 'dev': 'em1', 'weight': 1,
+                           'flags': []},
+                          {'gateway': '198.51.100.1', 'dev': 'em2',
+                           'weight': 1, 'flags': []}]}])
+        current = reconcile.parse_kernel_routes(kernel_routes, 4, ['em2'])
+        self.assertEqual(
+            {(4, 'main', '10.0.0.0/8', 0): (
+                (('192.0.2.1', 'em1', 1), ('198.51.100.1', 'em2', 1)),
+                None, ())}, current)
+        route = objects.Route(ip_netmask='10.0.0.0/8', next_hops=[
+            objects.NextHop('198.51.100.1', 'em2'),
+            objects.NextHop('192.0.2.1')])
+        provider = os_net_config.NetConfig()
+        provider._track_object(objects.Interface('em1', routes=[route]))
+        reconciler = reconcile.RouteReconciler(provider, ['em1', 'em2'])
+        self.assertEqual([], reconciler.commands(current))
+
+        route.next_hops[0].weight = 3
+        self.assertEqual(['route replace 10.0.0.0/8 table main proto static '
+                          'nexthop via 192.0.2.1 dev em1 weight 1 '
+                          'nexthop via 198.51.100.1 dev em2 weight 3'],
+                         reconciler.commands(current))
+        provider.device_routes = {}
+        self.assertEqual(['route del 10.0.0.0/8 table main'],
+                         reconciler.commands(current))
+
+    def test_reconcile_route_settings(self):
+        kernel_routes = json.dumps([
+            {'dst': '10.0.0.0/8', 'gateway': '192.0.2.1', 'dev': 'em1',
+             'table': '100', 'metric': 10, 'protocol': 'static',
+             'metrics': [{'mtu': 1400, 'lock': ['mtu']}, {'initcwnd': 10}],
+             'flags': []},
+            {'dst': '10.0.0.0/8', 'gateway': '192.0.2.1', 'dev': 'em1',
+             'metric': 20, 'protocol': 'static', 'flags': []}])
+        current = reconcile.parse_kernel_routes(kernel_routes, 4)
+        self.assertEqual(
+            {(4, '100', '10.0.0.0/8', 10): (
+                '192.0.2.1', 'em1', ('mtu lock 1400', 'initcwnd 10')),
+             (4, 'main', '10.0.0.0/8', 20): ('192.0.2.1', 'em1', ())},
+            current)
+        route = objects.Route('192.0.2.1', '10.0.0.0/8', table=100,
+                              metric=10, mtu=1400, mtu_lock=True,
+                              initcwnd=10)
+        provider = os_net_config.NetConfig()
+        provider._track_object(objects.Interface('em1', routes=[route]))
+        reconciler = reconcile.RouteReconciler(provider, ['em1'])
+        self.assertEqual(['route del 10.0.0.0/8 dev em1 table main '
+                          'metric 20'], reconciler.commands(current))
+
+        route.initcwnd = 20
+        route.congctl = 'bbr'
+        self.assertEqual(['route del 10.0.0.0/8 dev em1 table main '
+                          'metric 20',
+                          'route replace 10.0.0.0/8 via 192.0.2.1 dev em1 '
+                          'table 100 metric 10 proto static mtu lock 1400 '
+                          'initcwnd 20 congctl bbr'],
+                         reconciler.commands(current))
+
+    def test_reconcile_dhcp(self):
+        # the routes dhclient-script added to em1 are left alone, the
+        # routes of the config are still installed
+        provider = os_net_config.NetConfig()
+        routes = [objects.Route('192.0.2.1', '172.19.0.0/24'),
+                  objects.Route('2001:db8::2', '2001:db8:1::/64')]
+        provider._track_object(objects.Interface('em1', use_dhcp=True,
+                                                 routes=routes))
+        commands = reconcile.RouteReconciler(provider).reconcile()
+        self.assertEqual(['route replace 172.19.0.0/24 via 192.0.2.1 dev em1 '
+                          'table main proto static',
+                          'route replace 2001:db8:1::/64 via 2001:db8::2 '
+                          'dev em1 table main proto static'], commands)
+
+    def test_reconcile_dhcpv6(self):
+        # only the IPv6 routes are left alone on a DHCPv6 device
+        provider = os_net_config.NetConfig()
+        provider._track_object(objects.Interface('em1', use_dhcpv6=True))
+        commands = reconcile.RouteReconciler(provider).reconcile()
+        self.assertEqual(['route del 0.0.0.0/0 dev em1 table main',
+                          'route del 10.0.0.0/8 dev em1 table main',
+                          'route del 172.19.0.0/24 dev em1 table main'],
+                         commands)
+
+    def test_reconcile_devices(self):
+        reconciler = reconcile.RouteReconciler(self.provider, ['em2'])
+        self.assertEqual([], reconciler.reconcile())
+        self.assertEqual([], self.batches)
+
+    def test_reconcile_noop(self):
+        self.provider.noop = True
+        self.assertEqual(3, len(
+            reconcile.RouteReconciler(self.provider).reconcile()))
+        self.assertEqual([], self.batches)
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014-2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import shutil
+import tempfile
+
+from os_net_config import impl_eni
+from os_net_config import impl_ifcfg
+from os_net_config import objects
+from os_net_config import render_cache
+from os_net_config.tests import base
+from os_net_config import utils
+
+
+class TestRenderCache(base.TestCase):
+
+    def setUp(self):
+        super(TestRenderCache, self).setUp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        self.cache = render_cache.RenderCache(self.cache_dir, max_entries=4)
+
+    def test_key_is_stable(self):
+        self.assertEqual(render_cache.RenderCache.key({'a': 1, 'b': [2]}),
+                         render_cache.RenderCache.key({'b': [2], 'a': 1}))
+        self.assertNotEqual(render_cache.RenderCache.key({'a': 1}),
+                            render_cache.RenderCache.key({'a': 2}))
+
+    def test_get_set(self):
+        self.assertIsNone(self.cache.get('foo'))
+        self.cache.set('foo', ['data', 'data6'])
+        self.assertEqual(['data', 'data6'], self.cache.get('foo'))
+        self.assertEqual(1, self.cache.hits)
+        self.assertEqual(1, self.cache.misses)
+
+    def test_evict_least_recently_used(self):
+        for i in range(4):
+            self.cache.set('key%i' % i, 'data')
+            os.utime(os.path.join(self.cache_dir, 'key%i' % i), (i, i))
+        self.cache.get('key0')
+        self.cache.set('key4', 'data')
+        self.cache.evict()
+        self.assertEqual(['key0', 'key2', 'key3', 'key4'],
+                         sorted(os.listdir(self.cache_dir)))
+
+    def test_unwritable_cache_is_disabled(self):
+        cache = render_cache.RenderCache(os.path.join(self.cache_dir, 'file'))
+        open(cache.cache_dir, 'w').close()
+        cache.set('foo', 'data')
+        self.assertFalse(cache.enabled)
+        self.assertIsNone(cache.get('foo'))
+
+
+class TestMemoryRenderCache(base.TestCase):
+
+    def test_evict_least_recently_used(self):
+        cache = render_cache.MemoryRenderCache(max_entries=2)
+        cache.set('a', 'data a')
+        cache.set('b', 'data b')
+        self.assertEqual('data a', cache.get('a'))
+        cache.set('c', 'data c')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual('data a', cache.get('a'))
+        self.assertEqual('data c', cache.get('c'))
+        self.assertEqual((3, 1), (cache.hits, cache.misses))
+
+
+class TestProviderRenderCache(base.TestCase):
+
+    def setUp(self):
+        super(TestProviderRenderCache, self).setUp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+
+    def _provider(self, provider_class):
+        provider = provider_class()
+        provider.render_cache = render_cache.RenderCache(self.cache_dir)
+        return provider
+
+    def _bridge(self, address='192.0.2.1/24'):
+        route = objects.Route('192.0.2.254', '198.51.100.0/24')
+        interface = objects.Interface('em1', primary=True)
+        return objects.OvsBridge('br-ctlplane', members=[interface],
+                                 addresses=[objects.Address(address)],
+                                 routes=[route])
+
+    def test_ifcfg_cache_hit(self):
+        self.stubs.Set(utils, 'interface_mac', lambda name: 'a1:b2:c3:d4:e5')
+        uncached = impl_ifcfg.IfcfgNetConfig()
+        uncached.add_object(self._bridge())
+
+        self._provider(impl_ifcfg.IfcfgNetConfig).add_object(self._bridge())
+        provider = self._provider(impl_ifcfg.IfcfgNetConfig)
+        provider.add_object(self._bridge())
+        # bridge, interface and routes
+        self.assertEqual(3, provider.render_cache.hits)
+        self.assertEqual(uncached.bridge_data, provider.bridge_data)
+        self.assertEqual(uncached.interface_data, provider.interface_data)
+        self.assertEqual(uncached.route_data, provider.route_data)
+        self.assertEqual(uncached.route6_data, provider.route6_data)
+        self.assertEqual(['em1'], provider.topology.children('br-ctlplane'))
+
+    def test_ifcfg_cache_miss_on_change(self):
+        self.stubs.Set(utils, 'interface_mac', lambda name: 'a1:b2:c3:d4:e5')
+        self._provider(impl_ifcfg.IfcfgNetConfig).add_object(self._bridge())
+        provider = self._provider(impl_ifcfg.IfcfgNetConfig)
+        provider.add_object(self._bridge('192.0.2.2/24'))
+        # the member interface and the routes are unchanged
+        self.assertEqual(2, provider.render_cache.hits)
+        self.assertIn('IPADDR=192.0.2.2', provider.bridge_data['br-ctlplane'])
+
+    def test_ifcfg_cache_miss_on_mac_change(self):
+        self.stubs.Set(utils, 'interface_mac', lambda name: 'a1:b2:c3:d4:e5')
+        self._provider(impl_ifcfg.IfcfgNetConfig).add_object(self._bridge())
+        self.stubs.Set(utils, 'interface_mac', lambda name: 'a1:b2:c3:d4:e6')
+        provider = self._provider(impl_ifcfg.IfcfgNetConfig)
+        provider.add_object(self._bridge())
+        self.assertIn('hwaddr=a1:b2:c3:d4:e6',
+                      provider.bridge_data['br-ctlplane'])
+
+    def test_ifcfg_cache_miss_on_pci_change(self):
+        def dpdk_port():
+            return objects.OvsDpdkPort(
+                'dpdk0', members=[objects.Interface('em2')])
+        self.stubs.Set(utils, 'get_pci_address', lambda name: '0000:00:09.0')
+        self._provider(impl_ifcfg.IfcfgNetConfig).add_object(dpdk_port())
+        # the NIC was replaced
+        self.stubs.Set(utils, 'get_pci_address', lambda name: '0000:00:0a.0')
+        provider = self._provider(impl_ifcfg.IfcfgNetConfig)
+        provider.add_object(dpdk_port())
+        self.assertIn('dpdk-devargs=0000:00:0a.0',
+                      provider.interface_data['dpdk0'])
+
+    def test_eni_cache_hit(self):
+        self.stubs.Set(utils, 'interface_mac', lambda name: 'a1:b2:c3:d4:e5')
+        uncached = impl_eni.ENINetConfig()
+        uncached.add_object(self._bridge())
+
+        self._provider(impl_eni.ENINetConfig).add_object(self._bridge())
+        provider = self._provider(impl_eni.ENINetConfig)
+        provider.add_object(self._bridge())
+        self.assertEqual(3, provider.render_cache.hits)
+        self.assertEqual(uncached.bridges, provider.bridges)
+        self.assertEqual(uncached.interfaces, provider.interfaces)
+        self.assertEqual(uncached.routes, provider.routes)
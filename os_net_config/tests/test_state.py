@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import shutil
+import tempfile
+
+import os_net_config
+from os_net_config import state
+from os_net_config.tests import base
+from os_net_config import utils
+
+
+class TestStateStore(base.TestCase):
+
+    def setUp(self):
+        super(TestStateStore, self).setUp()
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.store = state.StateStore(state.default_path(self.tmpdir))
+        self.addCleanup(self.store.close)
+        self.filename = os.path.join(self.tmpdir, 'ifcfg-em1')
+
+    def test_default_path(self):
+        self.assertTrue(os.path.exists(os.path.join(
+            self.tmpdir, 'var', 'lib', 'os-net-config', 'state.db')))
+
+    def test_file_changed(self):
+        self.assertIsNone(self.store.file_changed(self.filename, 'foo'))
+        utils.write_config(self.filename, 'foo')
+        self.store.record_file(self.filename, 'foo')
+        self.assertFalse(self.store.file_changed(self.filename, 'foo'))
+        self.assertTrue(self.store.file_changed(self.filename, 'bar'))
+
+    def test_file_changed_outside(self):
+        utils.write_config(self.filename, 'foo')
+        self.store.record_file(self.filename, 'foo')
+        utils.write_config(self.filename, 'bar')
+        self.assertIsNone(self.store.file_changed(self.filename, 'foo'))
+
+    def test_forget_file(self):
+        utils.write_config(self.filename, 'foo')
+        self.store.record_file(self.filename, 'foo')
+        self.store.forget_file(self.filename)
+        self.assertIsNone(self.store.file_changed(self.filename, 'foo'))
+
+    def test_applies(self):
+        self.assertIsNone(self.store.last_apply())
+        self.store.record_apply(100.0, 2.5, True, 'config.yaml',
+                                [{'name': 'em1'}], 2,
+                                {'em1': 1.5, 'em2': 0.5})
+        self.store.record_apply(200.0, 4.0, False, 'config.yaml',
+                                [{'name': 'em1'}, {'name': 'em2'}], 1,
+                                {'em1': 3.5})
+        last = self.store.last_apply()
+        self.assertEqual((100.0, 2.5, 2), (last['started'], last['duration'],
+                                           last['files_changed']))
+        self.assertEqual(200.0, self.store.last_apply(success=False)[
+            'started'])
+        self.assertEqual([200.0, 100.0], [entry['started'] for entry
+                                          in self.store.history()])
+        self.assertEqual([{'name': 'em1'}], self.store.last_model())
+        self.assertEqual([('em1', 3.5, 2.5, 2), ('em2', 0.5, 0.5, 1)],
+                         self.store.slowest_devices())
+
+    def test_unwritable_store_is_disabled(self):
+        open(os.path.join(self.tmpdir, 'file'), 'w').close()
+        store = state.StateStore(os.path.join(self.tmpdir, 'file', 'db'))
+        self.assertFalse(store.enabled)
+        self.assertIsNone(store.file_changed(self.filename, 'foo'))
+        self.assertIsNone(store.record_apply(100.0, 1.0, True))
+        self.assertEqual([], store.history())
+        store.close()
+
+
+class TestProviderState(base.TestCase):
+
+    def test_diff_config_uses_state(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        filename = os.path.join(tmpdir, 'ifcfg-em1')
+        provider = os_net_config.NetConfig()
+        provider.state = state.StateStore(os.path.join(tmpdir, 'state.db'))
+        self.addCleanup(provider.state.close)
+        self.assertTrue(provider.diff_config(filename, 'foo'))
+        provider.write_config(filename, 'foo')
+
+        def read_file(filename):
+            raise AssertionError('%s was read' % filename)
+        self.stubs.Set(utils, 'get_file_data', read_file)
+        self.assertFalse(provider.diff_config(filename, 'foo'))
+        self.assertTrue(provider.diff_config(filename, 'bar'))
+
+    def test_ifup_timings(self):
+        provider = os_net_config.NetConfig(noop=True)
+        provider.ifup('em1')
+        self.assertEqual(['em1'], list(provider.device_timings))
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import shutil
+import tempfile
+
+import os_net_config
+from os_net_config import cli
+from os_net_config import objects
+from os_net_config import steering
+from os_net_config.tests import base
+from os_net_config import utils
+
+
+_INTERRUPTS = """           CPU0       CPU1
+  0:         40          0   IO-APIC   2-edge      timer
+ 30:          0          0   PCI-MSI 524288-edge      em1
+ 31:        100          0   PCI-MSI 524289-edge      em1-TxRx-1
+ 32:        100          0   PCI-MSI 524290-edge      em1-TxRx-0
+ 33:        100          0   PCI-MSI 524291-edge      em10-TxRx-0
+"""
+
+
+class TestSteering(base.TestCase):
+
+    def setUp(self):
+        super(TestSteering, self).setUp()
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        sys_class_net = os.path.join(self.tmpdir, 'net')
+        proc_irq = os.path.join(self.tmpdir, 'irq')
+        self.stubs.Set(utils, '_SYS_CLASS_NET', sys_class_net)
+        self.stubs.Set(steering, '_PROC_IRQ', proc_irq)
+        self.stubs.Set(steering, '_PROC_INTERRUPTS',
+                       os.path.join(self.tmpdir, 'interrupts'))
+        self.stubs.Set(steering, '_SYS_DEVICES_CPU', self.tmpdir)
+        self._write('interrupts', _INTERRUPTS)
+        self._write('online', '0-7')
+        self._write('net/em1/device/local_cpulist', '2-3')
+        for queue in ('rx-0', 'rx-1', 'tx-0', 'tx-1', 'tx-2'):
+            attribute = 'rps_cpus' if queue.startswith('rx') else 'xps_cpus'
+            self._write('net/em1/queues/%s/%s' % (queue, attribute), '0')
+        for irq in (30, 31, 32):
+            self._write('irq/%i/smp_affinity_list' % irq, '0-7')
+
+    def _write(self, path, data):
+        path = os.path.join(self.tmpdir, path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(data)
+
+    def _read(self, path):
+        with open(os.path.join(self.tmpdir, path)) as f:
+            return f.read()
+
+    def test_cpu_list_and_mask(self):
+        self.assertEqual([0, 1, 2, 3, 8], steering.parse_cpu_list('0-3,8'))
+        self.assertEqual('0000000f', steering.cpu_mask([0, 1, 2, 3]))
+        self.assertEqual('00000001,00000000', steering.cpu_mask([32]))
+
+    def test_queue_irqs(self):
+        self.assertEqual(['30', '32', '31'], steering.queue_irqs('em1'))
+
+    def test_local_cpus(self):
+        self.assertEqual([2, 3], steering.local_cpus('em1'))
+        self.assertEqual(list(range(8)), steering.local_cpus('vlan10'))
+
+    def test_desired_settings(self):
+        queue_steering = objects.QueueSteering(rps_cpus='auto',
+                                               xps_cpus='4-5',
+                                               irq_affinity='6')
+        net = os.path.join(self.tmpdir, 'net/em1/queues')
+        irq = os.path.join(self.tmpdir, 'irq')
+        self.assertEqual(
+            [(net + '/rx-0/rps_cpus', '0000000c'),
+             (net + '/rx-1/rps_cpus', '0000000c'),
+             (net + '/tx-0/xps_cpus', '00000010'),
+             (net + '/tx-1/xps_cpus', '00000020'),
+             (net + '/tx-2/xps_cpus', '00000010'),
+             (irq + '/30/smp_affinity_list', '6'),
+             (irq + '/32/smp_affinity_list', '6'),
+             (irq + '/31/smp_affinity_list', '6')],
+            steering.desired_settings('em1', queue_steering))
+
+    def test_set_queue_steering(self):
+        self._write('net/em1/queues/rx-1/rps_cpus', '00000000,0000000c')
+        provider = os_net_config.NetConfig()
+        provider.device_queue_steering['em1'] = objects.QueueSteering(
+            rps_cpus='auto')
+        written = []
+        self.stubs.Set(provider, 'write_sysfs',
+                       lambda path, value, msg: written.append(path))
+        provider.set_queue_steering(['em1', 'em2'])
+        self.assertEqual([os.path.join(self.tmpdir,
+                                       'net/em1/queues/rx-0/rps_cpus')],
+                         written)
+
+    def test_persist_queue_steering(self):
+        provider = os_net_config.NetConfig(root_dir=self.tmpdir)
+        provider.device_queue_steering['em1'] = objects.QueueSteering(
+            rps_cpus='auto', xps_cpus='0-3')
+        self.assertEqual(1, len(provider.persist_queue_steering()))
+        rules = self._read(steering.UDEV_RULES_PATH.lstrip('/'))
+        # devices renamed after their add event match on NAME
+        self.assertIn('ACTION=="add", SUBSYSTEM=="net", NAME=="em1", '
+                      'RUN+="/usr/bin/os-net-config --steer-queues em1 '
+                      'rps_cpus=auto xps_cpus=0-3"\n', rules)
+        self.assertIn('ACTION=="add", SUBSYSTEM=="net", NAME=="", '
+                      'KERNEL=="em1", RUN+="/usr/bin/os-net-config '
+                      '--steer-queues em1 rps_cpus=auto xps_cpus=0-3"\n',
+                      rules)
+        self.assertEqual({}, provider.persist_queue_steering())
+
+        provider.device_queue_steering = {}
+        provider.persist_queue_steering()
+        self.assertFalse(os.path.exists(self.tmpdir +
+                                        steering.UDEV_RULES_PATH))
+
+    def test_persist_link_up_hook(self):
+        # the IRQs of the queues are steered again once the link is up
+        provider = os_net_config.NetConfig(root_dir=self.tmpdir)
+        provider.device_queue_steering['em1'] = objects.QueueSteering(
+            irq_affinity='auto')
+        path = os.path.join(self.tmpdir, 'sbin/ifup-local')
+        self.assertEqual([path], list(provider.persist_link_up_hook(
+            '/sbin/ifup-local', '$1')))
+        self.assertEqual('#!/bin/sh\n'
+                         '# This file is autogenerated by os-net-config\n'
+                         'case "$1" in\n'
+                         'em1)\n'
+                         '    /usr/bin/os-net-config --steer-queues em1 '
+                         'irq_affinity=auto\n'
+                         '    ;;\n'
+                         'esac\n', self._read('sbin/ifup-local'))
+        self.assertEqual(0o755, os.stat(path).st_mode & 0o777)
+        self.assertEqual({}, provider.persist_link_up_hook(
+            '/sbin/ifup-local', '$1'))
+
+        provider.device_queue_steering = {}
+        provider.persist_link_up_hook('/sbin/ifup-local', '$1')
+        self.assertFalse(os.path.exists(path))
+
+    def test_persist_link_up_hook_foreign(self):
+        self._write('sbin/ifup-local', '#!/bin/sh\nlogger "$1 is up"\n')
+        provider = os_net_config.NetConfig(root_dir=self.tmpdir)
+        provider.device_queue_steering['em1'] = objects.QueueSteering()
+        self.assertEqual({}, provider.persist_link_up_hook(
+            '/sbin/ifup-local', '$1'))
+        self.assertEqual('#!/bin/sh\nlogger "$1 is up"\n',
+                         self._read('sbin/ifup-local'))
+
+    def test_cli_steer_queues(self):
+        self.assertEqual(0, cli.main(['ARG0', '--steer-queues', 'em1',
+                                      'irq_affinity=1-2']))
+        self.assertEqual('1', self._read('irq/30/smp_affinity_list'))
+        self.assertEqual('2', self._read('irq/32/smp_affinity_list'))
+        self.assertEqual('1', self._read('irq/31/smp_affinity_list'))
+        self.assertEqual('0', self._read('net/em1/queues/rx-0/rps_cpus'))
+        self.assertEqual(1, cli.main(['ARG0', '--steer-queues', 'em1',
+                                      'rps=1']))
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014-2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+from os_net_config import objects
+from os_net_config.tests import base
+from os_net_config import topology
+
+
+class TestTopology(base.TestCase):
+
+    def setUp(self):
+        super(TestTopology, self).setUp()
+        self.topology = topology.Topology()
+        interface1 = objects.Interface('em1')
+        interface2 = objects.Interface('em2')
+        bond = objects.LinuxBond('bond0', members=[interface1, interface2])
+        bridge = objects.LinuxBridge('br-ex', members=[bond])
+        self.topology.add_object(bridge)
+        self.topology.add_object(objects.Vlan('bond0', 10))
+        self.topology.add_object(objects.Vlan('em3', 20))
+        self.topology.add_object(objects.Interface('em3'))
+
+    def test_kinds(self):
+        self.assertEqual('bridge', self.topology.kind('br-ex'))
+        self.assertEqual('linux_bond', self.topology.kind('bond0'))
+        self.assertEqual('interface', self.topology.kind('em1'))
+        self.assertEqual('vlan', self.topology.kind('vlan10'))
+
+    def test_descendants(self):
+        self.assertEqual(set(['bond0', 'em1', 'em2', 'vlan10']),
+                         self.topology.descendants('br-ex'))
+        self.assertEqual(set(['vlan20']), self.topology.descendants('em3'))
+        self.assertEqual(set(), self.topology.descendants('em1'))
+
+    def test_restart_set(self):
+        self.assertEqual(['br-ex', 'bond0', 'em1', 'em2', 'vlan10'],
+                         self.topology.restart_set(['em1', 'bond0', 'br-ex',
+                                                    'em2']))
+        self.assertEqual(['em3', 'vlan20'],
+                         self.topology.restart_set(['vlan20', 'em3']))
+        self.assertEqual([], self.topology.restart_set([]))
+
+    def test_lower_first(self):
+        self.assertEqual(['bond0'], self.topology.lower_devices('vlan10'))
+        self.assertEqual(['em1', 'em2'], self.topology.lower_devices('bond0'))
+        self.assertEqual(['em1', 'em2', 'bond0', 'br-ex', 'vlan10'],
+                         self.topology.lower_first(['vlan10', 'br-ex', 'em2',
+                                                    'bond0', 'em1']))
+        self.assertEqual(['em3', 'vlan20'],
+                         self.topology.lower_first(['vlan20', 'em3']))
+
+    def test_containers(self):
+        self.assertEqual(set(['bond0', 'br-ex']),
+                         self.topology.containers('em1'))
+        self.assertEqual(set(), self.topology.containers('br-ex'))
+        # the device of a VLAN does not contain it
+        self.assertEqual(set(), self.topology.containers('vlan10'))
+        self.topology.add_object(objects.LinuxBridge(
+            'br-vlan', members=[objects.Vlan('em3', 30)]))
+        self.assertEqual(set(['br-vlan']),
+                         self.topology.containers('vlan30'))
+
+    def test_edges_added_later(self):
+        self.assertEqual(set(), self.topology.descendants('vlan10'))
+        self.topology.add_edge('vlan10', 'em4')
+        self.assertEqual(set(['bond0', 'em1', 'em2', 'vlan10', 'em4']),
+                         self.topology.descendants('br-ex'))
+
+    def test_cycle(self):
+        self.topology.add_edge('em1', 'br-ex')
+        self.assertEqual(set(['bond0', 'em1', 'em2', 'vlan10']),
+                         self.topology.descendants('br-ex'))
@@ -14,9 +14,14 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import collections
 import os.path
 import shutil
+import stat
 import tempfile
+import threading
+
+from oslo_concurrency import processutils
 
 from os_net_config.tests import base
 from os_net_config import utils
@@ -49,3 +54,190 @@ class TestUtils(base.TestCase):
         self.assertEqual('z1', nics[7])
 
         shutil.rmtree(tmpdir)
+
+    def test_vfs_are_not_active_nics(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        self.stubs.Set(utils, '_SYS_CLASS_NET', tmpdir)
+        for nic in ['em1', 'em1v0', 'em1v1']:
+            os.makedirs(os.path.join(tmpdir, nic, 'device'))
+            with open(os.path.join(tmpdir, nic, 'operstate'), 'w') as f:
+                f.write('up\n')
+            with open(os.path.join(tmpdir, nic, 'address'), 'w') as f:
+                f.write('52:54:00:00:00:01\n')
+            if nic != 'em1':
+                os.symlink(os.path.join(tmpdir, 'em1', 'device'),
+                           os.path.join(tmpdir, nic, 'device', 'physfn'))
+        self.assertTrue(utils.is_sriov_vf('em1v0'))
+        self.assertFalse(utils.is_sriov_vf('em1'))
+        self.assertEqual(['em1'], utils.ordered_active_nics())
+
+    def test_ip_network(self):
+        ip_nw = utils.ip_network('192.0.2.5/24')
+        self.assertEqual('192.0.2.5', ip_nw.ip)
+        self.assertEqual('255.255.255.0', ip_nw.netmask)
+        self.assertEqual('192.0.2.0', ip_nw.network)
+        self.assertEqual(24, ip_nw.prefixlen)
+        self.assertEqual(4, ip_nw.version)
+
+        ip_nw = utils.ip_network('2001:abc:a::1/64')
+        self.assertEqual('2001:abc:a::1', ip_nw.ip)
+        self.assertEqual('2001:abc:a::', ip_nw.network)
+        self.assertEqual(64, ip_nw.prefixlen)
+        self.assertEqual(6, ip_nw.version)
+        self.assertEqual('ffff:ffff:ffff:ffff::', ip_nw.netmask)
+        self.assertEqual('0.0.0.0', utils.ip_network('0.0.0.0/0').netmask)
+
+    def test_ip_network_cached(self):
+        self.stubs.Set(utils, '_IP_NETWORK_CACHE',
+                       collections.OrderedDict())
+        self.stubs.Set(utils, '_IP_NETWORK_CACHE_SIZE', 2)
+        first = utils.ip_network('192.0.2.5/24')
+        self.assertIs(first, utils.ip_network('192.0.2.5/24'))
+
+        utils.ip_network('192.0.2.6/24')
+        utils.ip_network('192.0.2.7/24')
+        self.assertEqual(['192.0.2.6/24', '192.0.2.7/24'],
+                         list(utils._IP_NETWORK_CACHE))
+        self.assertIsNot(first, utils.ip_network('192.0.2.5/24'))
+
+    def test_ip_network_read_only(self):
+        ip_nw = utils.ip_network('192.0.2.5/24')
+        for name, value in (('prefixlen', 16), ('version', 6), ('value', 0),
+                            ('first', 0), ('last', 0), ('ip', '192.0.2.6'),
+                            ('netmask', '255.255.0.0'),
+                            ('network', '192.0.0.0')):
+            self.assertRaises(AttributeError, setattr, ip_nw, name, value)
+        self.assertRaises(AttributeError, setattr, ip_nw, 'foo', 1)
+        self.assertEqual(24, utils.ip_network('192.0.2.5/24').prefixlen)
+
+    def test_ip_network_threads(self):
+        self.stubs.Set(utils, '_IP_NETWORK_CACHE',
+                       collections.OrderedDict())
+        self.stubs.Set(utils, '_IP_NETWORK_CACHE_SIZE', 16)
+        errors = []
+
+        def parse():
+            try:
+                for i in range(500):
+                    ip_nw = utils.ip_network('10.0.%i.1/24' % (i % 32))
+                    self.assertEqual(i % 32, (ip_nw.value >> 8) & 0xff)
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=parse) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([], errors)
+        self.assertEqual(16, len(utils._IP_NETWORK_CACHE))
+
+    def test_nic_inventory(self):
+        inventory = {'em2': '52:54:00:00:00:02', 'z1': '52:54:00:00:00:03',
+                     'em1': '52:54:00:00:00:01'}
+        utils.set_nic_inventory(inventory)
+        self.addCleanup(utils.set_nic_inventory, None)
+
+        self.assertEqual(['em1', 'em2', 'z1'], utils.ordered_active_nics())
+        self.assertEqual('52:54:00:00:00:02', utils.interface_mac('em2'))
+        self.assertRaises(IOError, utils.interface_mac, 'em3')
+        self.assertTrue(utils._is_active_nic('z1'))
+        self.assertFalse(utils._is_active_nic('em3'))
+
+    def test_diff(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        self.stubs.Set(utils, '_DIFF_BLOCK_SIZE', 4)
+        filename = os.path.join(tmpdir, 'interfaces')
+        self.assertFalse(utils.diff(filename, ''))
+        self.assertTrue(utils.diff(filename, 'auto em1'))
+        utils.write_config(filename, 'auto em1\n')
+        self.assertFalse(utils.diff(filename, 'auto em1\n'))
+        self.assertTrue(utils.diff(filename, 'auto em1'))
+        self.assertTrue(utils.diff(filename, 'auto em1\n\n'))
+        self.assertTrue(utils.diff(filename, 'auto em2\n'))
+        self.assertTrue(utils.diff(filename, ''))
+
+    def test_write_config_keeps_mode(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        filename = os.path.join(tmpdir, 'ifcfg-em1')
+        utils.write_config(filename, 'DEVICE=em1\n')
+        os.chmod(filename, 0o600)
+        utils.write_config(filename, 'DEVICE=em2\n')
+        self.assertEqual('DEVICE=em2\n', utils.get_file_data(filename))
+        self.assertEqual(0o600, stat.S_IMODE(os.stat(filename).st_mode))
+        self.assertEqual(['ifcfg-em1'], os.listdir(tmpdir))
+
+    def test_nic_inventory_pci_address(self):
+        self.addCleanup(utils.set_nic_inventory, None)
+        utils.set_nic_inventory({'em1': {'mac_address': '52:54:00:00:00:01',
+                                         'pci_address': '0000:03:00.0',
+                                         'numa_node': 1},
+                                 'em2': '52:54:00:00:00:02'})
+        self.assertEqual('52:54:00:00:00:01', utils.interface_mac('em1'))
+        self.assertEqual('52:54:00:00:00:02', utils.interface_mac('em2'))
+        self.assertEqual('0000:03:00.0', utils.get_pci_address('em1'))
+        self.assertIsNone(utils.get_pci_address('em2'))
+        self.assertEqual(1, utils.get_pci_numa_node('0000:03:00.0'))
+        self.assertIsNone(utils.get_pci_numa_node('0000:04:00.0'))
+        self.assertIsNone(utils.get_numa_node_cpulist(1))
+
+    def test_pci_numa_node(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        self.stubs.Set(utils, '_SYS_BUS_PCI_DEVICES', tmpdir)
+        for pci_address, node in (('0000:03:00.0', '1'),
+                                  ('0000:03:00.1', '-1')):
+            os.mkdir(os.path.join(tmpdir, pci_address))
+            with open(os.path.join(tmpdir, pci_address, 'numa_node'),
+                      'w') as f:
+                f.write(node + '\n')
+        self.assertEqual(1, utils.get_pci_numa_node('0000:03:00.0'))
+        self.assertEqual(0, utils.get_pci_numa_node('0000:03:00.1'))
+        # not a device of this host
+        self.assertIsNone(utils.get_pci_numa_node('0000:04:00.0'))
+
+    def test_write_config_symlink(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        target = os.path.join(tmpdir, 'ifcfg-em1.managed')
+        filename = os.path.join(tmpdir, 'ifcfg-em1')
+        utils.write_config(target, 'DEVICE=em1\n')
+        os.symlink(target, filename)
+        utils.write_config(filename, 'DEVICE=em2\n')
+        self.assertTrue(os.path.islink(filename))
+        self.assertEqual('DEVICE=em2\n', utils.get_file_data(target))
+
+    def test_write_config_keeps_owner(self):
+        if os.getuid() != 0:
+            self.skipTest('changing the owner of a file needs root')
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        filename = os.path.join(tmpdir, 'ifcfg-em1')
+        utils.write_config(filename, 'DEVICE=em1\n')
+        os.chown(filename, 1234, 5678)
+        utils.write_config(filename, 'DEVICE=em2\n')
+        current = os.stat(filename)
+        self.assertEqual((1234, 5678), (current.st_uid, current.st_gid))
+
+    def test_write_config_selinux(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        enforce = os.path.join(tmpdir, 'enforce')
+        utils.write_config(enforce, '1')
+        self.stubs.Set(utils, '_SELINUX_ENFORCE', enforce)
+        filename = os.path.join(tmpdir, 'ifcfg-em1')
+        labelled = []
+
+        def test_execute(*args, **kwargs):
+            # the temporary file is labelled before it replaces the file
+            self.assertEqual('/sbin/restorecon', args[0])
+            self.assertTrue(os.path.basename(args[1]).startswith(
+                '.ifcfg-em1.'))
+            self.assertFalse(os.path.exists(filename))
+            labelled.append(args[1])
+        self.stubs.Set(processutils, 'execute', test_execute)
+        utils.write_config(filename, 'DEVICE=em1\n')
+        self.assertEqual(1, len(labelled))
+        self.assertEqual('DEVICE=em1\n', utils.get_file_data(filename))
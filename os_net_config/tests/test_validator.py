@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014-2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import six
+
+from os_net_config import objects
+from os_net_config.tests import base
+from os_net_config import utils
+from os_net_config import validator
+
+
+class TestConfigValidator(base.TestCase):
+
+    def _interface(self, name, addresses=None, routes=None, **kwargs):
+        addresses = [objects.Address(a) for a in addresses or []]
+        return objects.Interface(name, addresses=addresses,
+                                 routes=routes or [], **kwargs)
+
+    def _assert_invalid(self, objs, expected):
+        err = self.assertRaises(objects.InvalidConfigException,
+                                validator.validate_objects, objs)
+        self.assertIn(expected, six.text_type(err))
+
+    def test_valid_config(self):
+        route = objects.Route('192.0.2.254', '198.51.100.0/24')
+        default = objects.Route('2001:db8::1', default=True)
+        em1 = self._interface('em1', ['192.0.2.1/24', '192.0.2.10/32'],
+                              [route])
+        em2 = self._interface('em2', ['192.168.1.1/24', '2001:db8::2/64'],
+                              [default])
+        validator.validate_objects([em1, em2])
+
+    def test_duplicate_address(self):
+        em1 = self._interface('em1', ['192.0.2.1/24'])
+        em2 = self._interface('em2', ['192.0.2.1/25'])
+        self._assert_invalid([em1, em2],
+                             'Address 192.0.2.1/25 on em2 duplicates '
+                             '192.0.2.1/24 on em1')
+
+    def test_duplicate_address_bridge_member(self):
+        vlan = objects.Vlan(None, 10, addresses=[
+            objects.Address('2001:db8::1/64')])
+        bridge = objects.OvsBridge('br-ex', members=[vlan])
+        em1 = self._interface('em1', ['2001:db8::1/128'])
+        self._assert_invalid([bridge, em1], 'duplicates')
+
+    def test_overlapping_subnets(self):
+        em1 = self._interface('em1', ['10.0.0.1/8'])
+        em2 = self._interface('em2', ['10.1.0.1/16'])
+        self._assert_invalid([em1, em2],
+                             'Subnet of 10.1.0.1/16 on em2 overlaps '
+                             '10.0.0.1/8 on em1')
+
+    def test_duplicate_routes(self):
+        route1 = objects.Route('192.0.2.254', default=True)
+        route2 = objects.Route('192.168.1.254', '0.0.0.0/0')
+        em1 = self._interface('em1', ['192.0.2.1/24'], [route1])
+        em2 = self._interface('em2', ['192.168.1.1/24'], [route2])
+        self._assert_invalid([em1, em2],
+                             'Route 0.0.0.0/0 on em2 duplicates the route '
+                             'on em1')
+
+    def test_routes_in_other_tables(self):
+        route1 = objects.Route('192.0.2.254', default=True)
+        route2 = objects.Route('192.168.1.254', '0.0.0.0/0', table=100)
+        route3 = objects.Route('192.168.1.254', '0.0.0.0/0', metric=100)
+        em1 = self._interface('em1', ['192.0.2.1/24'], [route1])
+        em2 = self._interface('em2', ['192.168.1.1/24'], [route2, route3])
+        validator.validate_objects([em1, em2])
+
+    def test_unreachable_next_hop(self):
+        route = objects.Route('192.0.3.1', '198.51.100.0/24')
+        em1 = self._interface('em1', ['192.0.2.1/24'], [route])
+        self._assert_invalid([em1],
+                             'Next hop 192.0.3.1 for a route on em1 is not '
+                             'in any configured subnet')
+
+    def test_multipath_next_hops(self):
+        route = objects.Route(default=True, next_hops=[
+            objects.NextHop('192.0.2.254'),
+            objects.NextHop('192.0.3.254', 'em2')])
+        em1 = self._interface('em1', ['192.0.2.1/24'], [route])
+        em2 = self._interface('em2', ['192.0.4.1/24'])
+        self._assert_invalid([em1, em2],
+                             'Next hop 192.0.3.254 for a route on em2 is not '
+                             'in any configured subnet')
+        route.next_hops[1].next_hop = '2001:db8::1'
+        self._assert_invalid([em1, em2],
+                             'Route 0.0.0.0/0 on em1 has a next_hop from a '
+                             'different address family')
+
+    def test_next_hop_link_local(self):
+        route = objects.Route('fe80::1', default=True)
+        em1 = self._interface('em1', ['2001:db8::2/64'], [route])
+        validator.validate_objects([em1])
+
+    def test_next_hop_dhcp(self):
+        route = objects.Route('192.0.3.1', '198.51.100.0/24')
+        em1 = self._interface('em1', use_dhcp=True)
+        em2 = self._interface('em2', routes=[route])
+        validator.validate_objects([em1, em2])
+
+    def test_invalid_next_hop(self):
+        route = objects.Route('foo', '198.51.100.0/24')
+        em1 = self._interface('em1', ['192.0.2.1/24'], [route])
+        self._assert_invalid([em1], 'Invalid next_hop foo for route on em1')
+
+    def test_invalid_route_destination(self):
+        route = objects.Route('192.0.2.254', '198.51.100.0/33')
+        em1 = self._interface('em1', ['192.0.2.1/24'], [route])
+        self._assert_invalid([em1], 'Invalid route destination '
+                                    '198.51.100.0/33 on em1')
+
+    def test_many_addresses(self):
+        objs = []
+        for i in range(2000):
+            address = '10.%i.%i.1/24' % (i // 256, i % 256)
+            objs.append(self._interface('em%i' % i, [address]))
+        validator.validate_objects(objs)
+
+
+class TestPropagateMtus(base.TestCase):
+
+    def _config(self, bridge_mtu=None, bond_mtu=None, em1_mtu=None,
+                vlan_mtu=None):
+        self.em1 = objects.Interface('em1', mtu=em1_mtu)
+        self.em2 = objects.Interface('em2')
+        self.bond = objects.LinuxBond('bond0', mtu=bond_mtu,
+                                      members=[self.em1, self.em2])
+        self.bridge = objects.OvsBridge('br-ex', mtu=bridge_mtu,
+                                        members=[self.bond])
+        self.vlan = objects.Vlan('bond0', 10, mtu=vlan_mtu)
+        return [self.bridge, self.vlan]
+
+    def test_members_inherit(self):
+        validator.propagate_mtus(self._config(bridge_mtu=9000))
+        self.assertEqual([9000, 9000, 9000],
+                         [self.bond.mtu, self.em1.mtu, self.em2.mtu])
+        self.assertIsNone(self.vlan.mtu)
+
+    def test_vlan_raises_device(self):
+        validator.propagate_mtus(self._config(vlan_mtu=9000))
+        self.assertIsNone(self.bridge.mtu)
+        self.assertEqual([9000, 9000, 9000],
+                         [self.bond.mtu, self.em1.mtu, self.em2.mtu])
+
+    def test_inferred_mtu_raised(self):
+        em1 = objects.Interface('em1')
+        bond = objects.LinuxBond('bond0', mtu=9000, members=[em1])
+        vlan = objects.Vlan('em1', 10, mtu=1600)
+        validator.propagate_mtus([vlan, bond])
+        self.assertEqual(9000, em1.mtu)
+
+    def test_vlan_port_of_bridge(self):
+        vlan = objects.Vlan(None, 10, mtu=9000)
+        bridge = objects.OvsBridge('br-ex', members=[vlan])
+        validator.propagate_mtus([bridge])
+        self.assertEqual(9000, bridge.mtu)
+
+    def test_mtu_inference(self):
+        inference = validator.MtuInference()
+        for obj in self._config(vlan_mtu=9000):
+            inference.add_object(obj)
+        self.assertIsNone(self.bond.mtu)
+        mtus = inference.infer()
+        self.assertEqual({'bond0': 9000, 'em1': 9000, 'em2': 9000}, mtus)
+        self.assertEqual([self.bridge],
+                         validator.set_mtus([self.bridge, self.vlan], mtus))
+        self.assertEqual(9000, self.em2.mtu)
+
+    def test_lacks_mtu(self):
+        self._config(bond_mtu=9000, em1_mtu=9000)
+        self.assertTrue(validator.lacks_mtu(self.bridge))
+        self.assertFalse(validator.lacks_mtu(self.em1))
+        self.assertFalse(validator.lacks_mtu(self.vlan))
+
+    def test_mtu_inference_sriov_vf(self):
+        # VFs are no devices of their own and have no MTU
+        vf = objects.SriovVF('em1', 0)
+        inference = validator.MtuInference()
+        inference.add_object(vf)
+        self.assertEqual({}, inference.mtus)
+        self.assertEqual([], validator.set_mtus([vf], {'em1_vf0': 9000}))
+
+    def test_member_mtu_too_small(self):
+        err = self.assertRaises(objects.InvalidConfigException,
+                                validator.propagate_mtus,
+                                self._config(bond_mtu=9000, em1_mtu=1500))
+        self.assertIn('em1 has MTU 1500, less than the 9000 of bond0',
+                      six.text_type(err))
+
+    def test_device_mtu_too_small(self):
+        err = self.assertRaises(objects.InvalidConfigException,
+                                validator.propagate_mtus,
+                                self._config(bond_mtu=1500, vlan_mtu=9000))
+        self.assertIn('bond0 has MTU 1500, less than the 9000 of vlan10',
+                      six.text_type(err))
+
+
+class TestValidateDpdk(base.TestCase):
+
+    def setUp(self):
+        super(TestValidateDpdk, self).setUp()
+        pci_addresses = {'em1': '0000:00:01.0', 'em2': '0000:81:00.0'}
+        numa_nodes = {'0000:00:01.0': 0, '0000:81:00.0': 1}
+        cpulists = {0: '0-7', 1: '8-15'}
+        self.stubs.Set(utils, 'get_pci_address', pci_addresses.get)
+        self.stubs.Set(utils, 'get_pci_numa_node', numa_nodes.get)
+        self.stubs.Set(utils, 'get_numa_node_cpulist', cpulists.get)
+
+    def _bridge(self, pmd_cpus=None, socket_mem=None):
+        ports = [objects.OvsDpdkPort('dpdk%i' % i,
+                                     members=[objects.Interface(nic)])
+                 for i, nic in enumerate(['em1', 'em2'])]
+        bond = objects.OvsDpdkBond('dpdkbond0', members=ports)
+        return objects.OvsUserBridge('br-link', members=[bond],
+                                     pmd_cpus=pmd_cpus, socket_mem=socket_mem)
+
+    def test_fits(self):
+        validator.validate_dpdk([self._bridge()])
+        validator.validate_dpdk([self._bridge('2,10', '1024,1024')])
+
+    def test_unknown_numa_node(self):
+        # e.g. rendering the config of another host
+        self.stubs.Set(utils, 'get_pci_numa_node', lambda pci_address: None)
+        validator.validate_dpdk([self._bridge('2-3', '1024')])
+
+    def test_no_pmd_core(self):
+        err = self.assertRaises(objects.InvalidConfigException,
+                                validator.validate_dpdk,
+                                [self._bridge(pmd_cpus='2-3')])
+        self.assertEqual('dpdk1 is on NUMA node 1, where br-link has no PMD '
+                         'core', six.text_type(err))
+
+    def test_no_socket_memory(self):
+        err = self.assertRaises(objects.InvalidConfigException,
+                                validator.validate_dpdk,
+                                [self._bridge(socket_mem='0,1024')])
+        self.assertEqual('dpdk0 is on NUMA node 0, where br-link has no '
+                         'DPDK socket memory', six.text_type(err))
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import shutil
+import struct
+import tempfile
+
+import os_net_config
+from os_net_config import cli
+from os_net_config import render_cache
+from os_net_config.tests import base
+from os_net_config import watch
+
+
+def _link_message(msg_type, index, name):
+    attr_data = name.encode('utf-8') + b'\0'
+    attr = struct.pack('=HH', 4 + len(attr_data), watch.IFLA_IFNAME)
+    attr += attr_data
+    attr += b'\0' * (watch._align(len(attr)) - len(attr))
+    body = struct.pack('=BxHiII', 0, 1, index, 0, 0) + attr
+    return struct.pack('=IHHII', 16 + len(body), msg_type, 0, 0, 0) + body
+
+
+class TestLinkMessages(base.TestCase):
+
+    def test_parse_link_messages(self):
+        data = (_link_message(watch.RTM_NEWLINK, 2, 'em1') +
+                struct.pack('=IHHII', 16, 3, 0, 0, 0) +
+                _link_message(watch.RTM_DELLINK, 5, 'vlan1234'))
+        self.assertEqual([(watch.RTM_NEWLINK, 2, 'em1'),
+                          (watch.RTM_DELLINK, 5, 'vlan1234')],
+                         list(watch.parse_link_messages(data)))
+
+    def test_parse_truncated_message(self):
+        data = _link_message(watch.RTM_NEWLINK, 2, 'em1')
+        self.assertEqual([], list(watch.parse_link_messages(data[:12])))
+
+
+class TestWatcher(base.TestCase):
+
+    def setUp(self):
+        super(TestWatcher, self).setUp()
+        self.tmpdir = tempfile.mkdtemp()
+        self.config_file = os.path.join(self.tmpdir, 'config.yaml')
+        self.mapping_file = os.path.join(self.tmpdir, 'mapping.yaml')
+        self.watcher = watch.Watcher([self.config_file, self.mapping_file],
+                                     debounce=0.05, links=False)
+
+    def tearDown(self):
+        self.watcher.close()
+        shutil.rmtree(self.tmpdir)
+        super(TestWatcher, self).tearDown()
+
+    def _write(self, filename, data):
+        with open(filename, 'w') as f:
+            f.write(data)
+
+    def test_wait_timeout(self):
+        self.assertEqual(set(), self.watcher.wait(0))
+
+    def test_debounced_changes(self):
+        self._write(self.config_file, 'network_config: []\n')
+        self._write(self.config_file, 'network_config: [{}]\n')
+        self._write(os.path.join(self.tmpdir, 'other.yaml'), 'foo')
+        self._write(self.mapping_file, 'interface_mapping: {}\n')
+        self.assertEqual(set([self.config_file, self.mapping_file]),
+                         self.watcher.wait(1))
+        self.assertEqual(set(), self.watcher.wait(0))
+
+    def test_replaced_file(self):
+        tmp_file = os.path.join(self.tmpdir, '.config.yaml.tmp')
+        self._write(tmp_file, 'network_config: []\n')
+        os.rename(tmp_file, self.config_file)
+        self.assertEqual(set([self.config_file]), self.watcher.wait(1))
+
+    def test_drain(self):
+        self._write(self.config_file, 'network_config: []\n')
+        self.watcher.drain()
+        self.assertEqual(set(), self.watcher.wait(0))
+
+
+class TestWatchApply(base.TestCase):
+
+    def setUp(self):
+        super(TestWatchApply, self).setUp()
+        self.applied = []
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.config_file = os.path.join(self.tmpdir, 'config.yaml')
+        applied = self.applied
+
+        class TestImpl(os_net_config.NetConfig):
+
+            def add_interface(self, interface):
+                self.render_cached(self._render, interface)
+
+            def _render(self, interface):
+                applied.append('render %s' % interface.name)
+                return interface.name
+
+            apply_error = None
+
+            def apply(self, cleanup=False, activate=True):
+                applied.append('apply')
+                if self.apply_error:
+                    raise self.apply_error
+                return {}
+
+            def wait_for_dhcp(self, timeout=None):
+                applied.append('wait for DHCP %s' % timeout)
+                return {}
+
+        self.impl_class = TestImpl
+        self.stubs.Set(cli, 'get_provider', lambda *args, **kwargs:
+                       TestImpl())
+        self.opts = cli.parse_opts(['ARG0', '--watch', '-c',
+                                    self.config_file, '-m',
+                                    os.path.join(self.tmpdir, 'none')])
+
+    def _write_config(self, names):
+        with open(self.config_file, 'w') as f:
+            f.write('network_config:\n')
+            for name in names:
+                f.write('  - {type: interface, name: %s}\n' % name)
+
+    def test_watch_apply(self):
+        cache = render_cache.MemoryRenderCache()
+        resolver = cli.objects.NicResolver()
+        self._write_config(['em1', 'em2'])
+        model = cli.watch_apply(self.opts, cache, resolver, None)
+        # DHCP leases are left to the background
+        self.assertEqual(['render em1', 'render em2', 'apply',
+                          'wait for DHCP 0'], self.applied)
+
+        del self.applied[:]
+        self.assertEqual(model, cli.watch_apply(self.opts, cache, resolver,
+                                                model))
+        self.assertEqual([], self.applied)
+
+        self._write_config(['em1', 'em3'])
+        new_model = cli.watch_apply(self.opts, cache, resolver, model)
+        self.assertNotEqual(model, new_model)
+        self.assertEqual(['render em3', 'apply', 'wait for DHCP 0'],
+                         self.applied)
+
+    def test_watch_apply_invalid_config(self):
+        cache = render_cache.MemoryRenderCache()
+        resolver = cli.objects.NicResolver()
+        with open(self.config_file, 'w') as f:
+            f.write('network_config: [')
+        self.assertEqual('model', cli.watch_apply(self.opts, cache, resolver,
+                                                  'model'))
+        self.assertEqual([], self.applied)
+
+    def test_watch_apply_invalid_address(self):
+        cache = render_cache.MemoryRenderCache()
+        resolver = cli.objects.NicResolver()
+        with open(self.config_file, 'w') as f:
+            f.write('network_config:\n'
+                    '  - type: interface\n'
+                    '    name: em1\n'
+                    '    addresses: [{ip_netmask: 192.168.1.300/24}]\n')
+        self.assertEqual('model', cli.watch_apply(self.opts, cache, resolver,
+                                                  'model'))
+        self.assertEqual([], self.applied)
+
+    def test_watch_apply_error(self):
+        cache = render_cache.MemoryRenderCache()
+        resolver = cli.objects.NicResolver()
+        self._write_config(['em1'])
+        self.impl_class.apply_error = OSError(13, 'Permission denied')
+        self.assertEqual('model', cli.watch_apply(self.opts, cache, resolver,
+                                                  'model'))
+        self.assertEqual(['render em1', 'apply'], self.applied)
+
+
+class TestWatchConfig(base.TestCase):
+
+    stub_numbered_nics = False
+
+    def setUp(self):
+        super(TestWatchConfig, self).setUp()
+        self.applied = []
+        self.active_nics = ['em1', 'em2']
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        self.config_file = os.path.join(tmpdir, 'config.yaml')
+        with open(self.config_file, 'w') as f:
+            f.write('network_config:\n'
+                    '  - {type: interface, name: nic1}\n'
+                    '  - {type: interface, name: nic3}\n')
+        test = self
+
+        class TestImpl(os_net_config.NetConfig):
+
+            def add_interface(self, interface):
+                self.render_cached(self._render, interface)
+
+            def _render(self, interface):
+                test.applied.append('render %s' % interface.name)
+                return interface.name
+
+            def apply(self, cleanup=False, activate=True):
+                test.applied.append('apply')
+                return {}
+
+        class FakeWatcher(object):
+
+            def __init__(self, files):
+                pass
+
+            def events(self):
+                # em0 and em3 come up
+                test.active_nics = ['em0', 'em1', 'em2', 'em3']
+                yield set([watch.LINK_CHANGE])
+                yield set([watch.LINK_CHANGE])
+
+            def drain(self):
+                pass
+
+            def close(self):
+                pass
+
+        self.stubs.Set(cli, 'get_provider', lambda *args, **kwargs:
+                       TestImpl())
+        self.stubs.Set(watch, 'Watcher', FakeWatcher)
+        self.stubs.Set(cli.utils, 'ordered_active_nics',
+                       lambda: list(self.active_nics))
+        self.opts = cli.parse_opts(['ARG0', '--watch', '-c',
+                                    self.config_file, '-m',
+                                    os.path.join(tmpdir, 'none')])
+
+    def test_new_nics_keep_aliases(self):
+        self.assertEqual(0, cli.watch_config(self.opts))
+        # nic1 stays on em1, nic3 is em0 which came up after em1 and em2
+        self.assertEqual(['render em1', 'render nic3', 'apply',
+                          'render em0', 'apply'], self.applied)
+
+    def test_refresh_nics(self):
+        resolver = cli.objects.NicResolver()
+        self.assertFalse(cli.refresh_nics(resolver))
+        self.assertEqual({'nic1': 'em1', 'nic2': 'em2'},
+                         resolver.numbered_nics())
+        self.assertFalse(cli.refresh_nics(resolver))
+        self.active_nics = ['em0', 'em1']
+        self.assertTrue(cli.refresh_nics(resolver))
+        self.assertEqual({'nic1': 'em1', 'nic2': 'em2', 'nic3': 'em0'},
+                         resolver.numbered_nics())
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014-2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import heapq
+import logging
+
+from os_net_config import objects
+
+
+logger = logging.getLogger(__name__)
+
+
+def device_kind(obj):
+    """Return the kind of restart a device needs, e.g. bridge or vlan."""
+    if isinstance(obj, (objects.OvsBridge, objects.LinuxBridge,
+                        objects.IvsBridge)):
+        return 'bridge'
+    elif isinstance(obj, objects.LinuxBond):
+        return 'linux_bond'
+    elif isinstance(obj, objects.Vlan):
+        return 'vlan'
+    return 'interface'
+
+
+class Topology(object):
+    """Parent/child graph of the devices of a network config.
+
+    A device's children are the devices which have to be restarted along
+    with it: the members of bridges and bonds, and the VLANs on top of a
+    device.
+    """
+
+    def __init__(self):
+        self._order = {}
+        self._kinds = {}
+        self._children = {}
+        self._parents = {}
+        self._descendants = {}
+        self._vlan_devices = {}
+
+    def _add_device(self, name, kind=None):
+        if name not in self._order:
+            self._order[name] = len(self._order)
+            self._children[name] = []
+            self._parents[name] = []
+        if kind:
+            self._kinds[name] = kind
+
+    def add_edge(self, parent, child):
+        """Make child depend on parent."""
+        self._add_device(parent)
+        self._add_device(child)
+        if child not in self._children[parent]:
+            self._children[parent].append(child)
+            self._parents[child].append(parent)
+            self._descendants.clear()
+
+    def add_object(self, obj):
+        """Add an object, its members and their edges to the graph.
+
+        :param obj: The objects._BaseOpts instance to add.
+        """
+        self._add_device(obj.name, device_kind(obj))
+        if isinstance(obj, objects.Vlan) and obj.device:
+            self.add_edge(obj.device, obj.name)
+            self._vlan_devices[obj.name] = obj.device
+        if isinstance(obj, (objects.OvsDpdkPort, objects.OvsDpdkBond)):
+            # their nics and ports are not devices of their own
+            return
+        for member in getattr(obj, 'members', []):
+            self.add_object(member)
+            self.add_edge(obj.name, member.name)
+
+    def devices(self):
+        """Return the names of all the devices, in the order added."""
+        return sorted(self._order, key=self._order.get)
+
+    def kind(self, name):
+        return self._kinds.get(name, 'interface')
+
+    def children(self, name):
+        return list(self._children.get(name, []))
+
+    def lower_devices(self, name):
+        """Return the devices a device sits on.
+
+        Those are the members of a bond or bridge (VLAN ports aside) and
+        the device of a VLAN.
+        """
+        lower = [child for child in self._children.get(name, [])
+                 if self.kind(child) != 'vlan']
+        if self.kind(name) == 'vlan':
+            lower.extend(self._parents.get(name, []))
+        return lower
+
+    def lower_first(self, names):
+        """Order devices so that each comes after those it sits on.
+
+        :param names: An iterable of device names.
+        :returns: the list of the names, devices are in the order they
+            were added otherwise.
+        """
+        names = set(names)
+        order = []
+        visited = set()
+
+        def visit(name):
+            if name in visited:
+                return
+            visited.add(name)
+            for lower in self.lower_devices(name):
+                visit(lower)
+            if name in names:
+                order.append(name)
+        for name in sorted(names, key=lambda name: self._order.get(name, -1)):
+            visit(name)
+        return order
+
+    def stacked_on(self, name):
+        """Return the set of the devices a VLAN is stacked on.
+
+        Those are the device of the VLAN and, transitively, the devices
+        it sits on. Members are not stacked on their bond or bridge, so
+        the set is empty for devices other than VLANs.
+        """
+        stacked_on = set()
+        if self.kind(name) != 'vlan':
+            return stacked_on
+        lower = self.lower_devices(name)
+        while lower:
+            device = lower.pop()
+            if device not in stacked_on and device != name:
+                stacked_on.add(device)
+                lower.extend(self.lower_devices(device))
+        return stacked_on
+
+    def containers(self, name):
+        """Return the set of the bonds and bridges a device is a member of.
+
+        The bonds and bridges those are members of are included, the
+        device of a VLAN is not.
+        """
+        containers = set()
+        parents = [parent for parent in self._parents.get(name, [])
+                   if parent != self._vlan_devices.get(name)]
+        while parents:
+            parent = parents.pop()
+            if parent not in containers and parent != name:
+                containers.add(parent)
+                parents.extend(self._parents.get(parent, []))
+        return containers
+
+    def descendants(self, name):
+        """Return the set of all the devices depending on a device."""
+        if name not in self._descendants:
+            # guard against cycles while the closure is computed
+            self._descendants[name] = set()
+            descendants = set()
+            for child in self._children.get(name, []):
+                descendants.add(child)
+                descendants.update(self.descendants(child))
+            descendants.discard(name)
+            self._descendants[name] = descendants
+        return self._descendants[name]
+
+    def restart_set(self, changed):
+        """Return the devices to restart when some devices changed.
+
+        :param changed: An iterable of the names of the changed devices.
+        :returns: a list without duplicates of the changed devices and of
+            the devices depending on them. Parents come before their
+            children, devices are in the order they were added otherwise.
+        """
+        devices = set()
+        for name in changed:
+            devices.add(name)
+            devices.update(self.descendants(name))
+
+        parents = dict((name, 0) for name in devices)
+        for name in devices:
+            for child in self._children.get(name, []):
+                if child in parents:
+                    parents[child] += 1
+        ready = [(self._order.get(name, -1), name)
+                 for name, count in parents.items() if not count]
+        heapq.heapify(ready)
+        restart = []
+        while ready:
+            order, name = heapq.heappop(ready)
+            restart.append(name)
+            for child in self._children.get(name, []):
+                if child in parents:
+                    parents[child] -= 1
+                    if not parents[child]:
+                        heapq.heappush(ready, (self._order[child], child))
+        # devices in a cycle are restarted last
+        restart.extend(sorted(devices - set(restart),
+                              key=lambda name: self._order.get(name, -1)))
+        logger.debug('devices to restart: %s' % restart)
+        return restart
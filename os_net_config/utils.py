@@ -14,19 +14,95 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import collections
 import glob
 import logging
 import os
 import re
+import stat
+import tempfile
+import threading
+
+import netaddr
+from oslo_concurrency import processutils
+import yaml
 
 
 logger = logging.getLogger(__name__)
 _SYS_CLASS_NET = '/sys/class/net'
+_SYS_BUS_PCI_DEVICES = '/sys/bus/pci/devices'
+_SYS_DEVICES_NODE = '/sys/devices/system/node'
+
+# Exists when SELinux is enabled
+_SELINUX_ENFORCE = '/sys/fs/selinux/enforce'
+
+# The nics bound to DPDK drivers, which have no netdev anymore
+DPDK_MAPPING_FILE = '/var/lib/os-net-config/dpdk_mapping.yaml'
+
+# Active nic name -> MAC, used instead of sysfs when set
+_NIC_INVENTORY = None
+
+# Parsed ip_netmask strings, most recently used last.
+_IP_NETWORK_CACHE = collections.OrderedDict()
+_IP_NETWORK_CACHE_SIZE = 65536
+_IP_NETWORK_LOCK = threading.Lock()
+
 
+# Block size of the incremental file comparison of diff
+_DIFF_BLOCK_SIZE = 65536
 
-def write_config(filename, data):
-    with open(filename, 'w') as f:
-        f.write(str(data))
+
+def write_config(filename, data, mode=None):
+    """Write a file through a temporary file renamed over it.
+
+    Readers see either the old or the new content, never a partial
+    write. A symlink is written through rather than replaced, the mode
+    and owner of an existing file are kept, the SELinux label of the file
+    is restored and missing parent directories are created.
+
+    :param mode: The mode of the file if it is new, by default that of
+        the umask.
+    """
+    filename = os.path.realpath(filename)
+    dirname = os.path.dirname(filename) or '.'
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    fd, tmp_path = tempfile.mkstemp(
+        dir=dirname, prefix='.%s.' % os.path.basename(filename))
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(str(data))
+        try:
+            current = os.stat(filename)
+        except OSError:
+            current = None
+        if current is not None:
+            mode = stat.S_IMODE(current.st_mode)
+            tmp = os.stat(tmp_path)
+            if (tmp.st_uid, tmp.st_gid) != (current.st_uid, current.st_gid):
+                os.chown(tmp_path, current.st_uid, current.st_gid)
+        elif mode is None:
+            umask = os.umask(0)
+            os.umask(umask)
+            mode = 0o666 & ~umask
+        os.chmod(tmp_path, mode)
+        _restorecon(tmp_path)
+        os.rename(tmp_path, filename)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+
+def _restorecon(path):
+    """Give a file the SELinux label of its directory's files, if enabled.
+    """
+    if not os.path.exists(_SELINUX_ENFORCE):
+        return
+    try:
+        processutils.execute('/sbin/restorecon', path)
+    except (processutils.ProcessExecutionError, OSError) as e:
+        logger.warning('Could not restore the SELinux label of %s: %s' %
+                       (path, e))
 
 
 def get_file_data(filename):
@@ -41,7 +117,184 @@ def get_file_data(filename):
         return ''
 
 
+class IPNetworkInfo(object):
+    """An address in CIDR notation parsed by ip_network.
+
+    The numeric fields (prefixlen, version, value, first and last) are
+    set when parsing, the string forms (ip, netmask and network) are only
+    formatted when first used. All of them are read-only, as the cached
+    instances are shared by every caller of ip_network.
+    """
+
+    __slots__ = ('_prefixlen', '_version', '_value', '_first', '_last',
+                 '_ip', '_netmask', '_network')
+
+    def __init__(self, prefixlen, version, value, first, last):
+        self._prefixlen = prefixlen
+        self._version = version
+        self._value = value
+        self._first = first
+        self._last = last
+        self._ip = None
+        self._netmask = None
+        self._network = None
+
+    @property
+    def prefixlen(self):
+        return self._prefixlen
+
+    @property
+    def version(self):
+        return self._version
+
+    @property
+    def value(self):
+        return self._value
+
+    @property
+    def first(self):
+        return self._first
+
+    @property
+    def last(self):
+        return self._last
+
+    @property
+    def ip(self):
+        if self._ip is None:
+            self._ip = str(netaddr.IPAddress(self._value, self._version))
+        return self._ip
+
+    @property
+    def netmask(self):
+        if self._netmask is None:
+            width = 32 if self._version == 4 else 128
+            mask = ((1 << width) - 1) ^ ((1 << (width - self._prefixlen)) - 1)
+            self._netmask = str(netaddr.IPAddress(mask, self._version))
+        return self._netmask
+
+    @property
+    def network(self):
+        if self._network is None:
+            self._network = str(netaddr.IPAddress(self._first,
+                                                  self._version))
+        return self._network
+
+
+def ip_network(ip_netmask):
+    """Parse an address in CIDR notation.
+
+    Results are cached, so configs which repeat the same prefixes (VIPs,
+    routes) only pay the netaddr parsing cost once. The cache is shared
+    by all threads, e.g. the background DHCP ifups.
+
+    :param ip_netmask: An address such as 192.0.2.1/24 or 2001:db8::1/64.
+    :returns: an IPNetworkInfo.
+    :raises: netaddr.AddrFormatError if the address can't be parsed.
+    """
+    with _IP_NETWORK_LOCK:
+        info = _IP_NETWORK_CACHE.pop(ip_netmask, None)
+        if info is not None:
+            _IP_NETWORK_CACHE[ip_netmask] = info
+            return info
+    ip_nw = netaddr.IPNetwork(ip_netmask)
+    parsed = IPNetworkInfo(ip_nw.prefixlen, ip_nw.version, ip_nw.value,
+                           ip_nw.first, ip_nw.last)
+    with _IP_NETWORK_LOCK:
+        # another thread may have parsed it meanwhile
+        info = _IP_NETWORK_CACHE.pop(ip_netmask, parsed)
+        if (info is parsed and
+                len(_IP_NETWORK_CACHE) >= _IP_NETWORK_CACHE_SIZE):
+            _IP_NETWORK_CACHE.popitem(last=False)
+        _IP_NETWORK_CACHE[ip_netmask] = info
+    return info
+
+
+def route_via(route, device):
+    """Return the `ip route` arguments of the next hops of a route.
+
+    :param route: An objects.Route.
+    :param device: The device of the route, and of the next hops of a
+        multipath route which do not set theirs.
+    """
+    if not route.next_hops:
+        return 'via %s dev %s' % (route.next_hop, device)
+    args = []
+    for hop in route.next_hops:
+        args.append('nexthop via %s dev %s' % (hop.next_hop,
+                                               hop.device or device))
+        if hop.weight:
+            args.append('weight %i' % hop.weight)
+    return ' '.join(args)
+
+
+def route_metrics(route):
+    """Return the `ip route` arguments of the TCP settings of a route.
+
+    :param route: An objects.Route.
+    :returns: a list of arguments such as "mtu lock 1400", in the order
+        of objects.Route.METRICS.
+    """
+    metrics = []
+    if route.mtu:
+        metrics.append('mtu %s%i' % ('lock ' if route.mtu_lock else '',
+                                     route.mtu))
+    for name in ('advmss', 'initcwnd', 'initrwnd'):
+        if getattr(route, name):
+            metrics.append('%s %i' % (name, getattr(route, name)))
+    if route.quickack:
+        # delayed ACKs are the default
+        metrics.append('quickack 1')
+    if route.congctl:
+        metrics.append('congctl %s' % route.congctl)
+    return metrics
+
+
+def route_args(route, device):
+    """Return the `ip route` arguments of a route, after its destination.
+
+    :param route: An objects.Route.
+    :param device: The device of the route, see route_via.
+    """
+    args = []
+    if route.table:
+        args.append('table %s' % route.table)
+    if route.metric is not None:
+        args.append('metric %i' % route.metric)
+    args.extend(route_metrics(route))
+    if route.next_hops:
+        # ip takes everything after the first nexthop as next hops
+        return ' '.join(args + [route_via(route, device)])
+    return ' '.join([route_via(route, device)] + args)
+
+
+def set_nic_inventory(inventory):
+    """Use a static inventory of active nics instead of sysfs.
+
+    This allows rendering the config of another host.
+
+    :param inventory: A dict of active nic name -> MAC address, or dict of
+        its mac_address and optionally its pci_address and numa_node, or
+        None to go back to reading the local system's nics.
+    """
+    global _NIC_INVENTORY
+    _NIC_INVENTORY = inventory
+
+
+def _inventory_nic(name):
+    nic = _NIC_INVENTORY.get(name)
+    if nic is None or isinstance(nic, dict):
+        return nic
+    return {'mac_address': nic}
+
+
 def interface_mac(name):
+    if _NIC_INVENTORY is not None:
+        nic = _inventory_nic(name)
+        if not nic or not nic.get('mac_address'):
+            logger.error("Unable to read mac address: %s" % name)
+            raise IOError("%s is not in the nic inventory" % name)
+        return nic['mac_address']
     try:
         with open('/sys/class/net/%s/address' % name, 'r') as f:
             return f.read().rstrip()
@@ -50,11 +303,116 @@ def interface_mac(name):
         raise
 
 
+def interface_mtu(name):
+    """Return the MTU of a live link, or None if it doesn't exist."""
+    try:
+        with open(_SYS_CLASS_NET + '/%s/mtu' % name, 'r') as f:
+            return int(f.read().strip())
+    except (IOError, ValueError):
+        return None
+
+
+def get_dpdk_mapping():
+    """Return the nics bound to DPDK drivers by os-net-config.
+
+    :returns: a dict of nic name: dict of its pci_address, mac_address
+        and driver.
+    """
+    try:
+        with open(DPDK_MAPPING_FILE, 'r') as f:
+            return yaml.safe_load(f) or {}
+    except IOError:
+        return {}
+    except yaml.YAMLError as e:
+        logger.warning('Invalid DPDK mapping %s: %s' % (DPDK_MAPPING_FILE, e))
+        return {}
+
+
+def get_pci_address(name):
+    """Return the PCI address of a nic, or None if it is unknown."""
+    if _NIC_INVENTORY is not None:
+        return (_inventory_nic(name) or {}).get('pci_address')
+    try:
+        return os.path.basename(os.readlink(_SYS_CLASS_NET + '/%s/device' %
+                                            name))
+    except OSError:
+        return get_dpdk_mapping().get(name, {}).get('pci_address')
+
+
+def get_pci_driver(pci_address):
+    """Return the driver a PCI device is bound to, or None."""
+    try:
+        return os.path.basename(os.readlink(
+            _SYS_BUS_PCI_DEVICES + '/%s/driver' % pci_address))
+    except OSError:
+        return None
+
+
+def get_pci_numa_node(pci_address):
+    """Return the NUMA node of a PCI device, 0 if it has none.
+
+    None is returned for a device this host doesn't have. With a nic
+    inventory, the numa_node of the nic with that PCI address is
+    returned, or None if it is unknown.
+    """
+    if _NIC_INVENTORY is not None:
+        for name in _NIC_INVENTORY:
+            nic = _inventory_nic(name)
+            if nic.get('pci_address') == pci_address:
+                return nic.get('numa_node')
+        return None
+    try:
+        with open(_SYS_BUS_PCI_DEVICES + '/%s/numa_node' % pci_address,
+                  'r') as f:
+            return max(int(f.read().strip()), 0)
+    except IOError:
+        return None
+    except ValueError:
+        return 0
+
+
+def get_numa_node_cpulist(node):
+    """Return the CPU list of a NUMA node, or None if it doesn't exist.
+
+    The CPUs of another host's nodes are unknown, so None is returned
+    with a nic inventory.
+    """
+    if _NIC_INVENTORY is not None:
+        return None
+    try:
+        with open(_SYS_DEVICES_NODE + '/node%i/cpulist' % node, 'r') as f:
+            return f.read().strip()
+    except IOError:
+        return None
+
+
+def get_sriov_numvfs(name):
+    """Return the number of VFs of a PF, None if it has no SR-IOV."""
+    try:
+        with open(_SYS_CLASS_NET + '/%s/device/sriov_numvfs' % name,
+                  'r') as f:
+            return int(f.read().strip())
+    except (IOError, ValueError):
+        return None
+
+
+def is_sriov_vf(name):
+    """Tell whether a nic is an SR-IOV virtual function."""
+    return os.path.exists(_SYS_CLASS_NET + '/%s/device/physfn' % name)
+
+
 def _is_active_nic(interface_name):
+    if _NIC_INVENTORY is not None:
+        return interface_name in _NIC_INVENTORY
     try:
         if interface_name == 'lo':
             return False
 
+        # VFs belong to their PF (and usually to VMs), not to the nicN
+        # aliases
+        if is_sriov_vf(interface_name):
+            return False
+
         device_dir = _SYS_CLASS_NET + '/%s/device' % interface_name
         has_device_dir = os.path.isdir(device_dir)
 
@@ -84,9 +442,16 @@ def ordered_active_nics():
     embedded_nics = []
     nics = []
     logger.debug("Finding active nics")
-    for name in glob.iglob(_SYS_CLASS_NET + '/*'):
-        nic = name[(len(_SYS_CLASS_NET) + 1):]
-        if _is_active_nic(nic):
+    if _NIC_INVENTORY is not None:
+        names = list(_NIC_INVENTORY)
+    else:
+        names = [name[(len(_SYS_CLASS_NET) + 1):]
+                 for name in glob.iglob(_SYS_CLASS_NET + '/*')]
+    # nics bound to DPDK drivers are still in use, without a netdev
+    dpdk_nics = set(get_dpdk_mapping()) if _NIC_INVENTORY is None else set()
+    names.extend(sorted(dpdk_nics - set(names)))
+    for nic in names:
+        if nic in dpdk_nics or _is_active_nic(nic):
             if nic.startswith('em') or nic.startswith('eth') or \
                     nic.startswith('eno'):
                 logger.debug("%s is an embedded active nic" % nic)
@@ -106,8 +471,26 @@ def ordered_active_nics():
 
 
 def diff(filename, data):
-    file_data = get_file_data(filename)
-    logger.debug("Diff file data:\n%s" % file_data)
+    """Tell whether data differs from the content of a file.
+
+    The file is compared block by block as it is read, and reading stops
+    at the first difference. A missing file is the same as an empty one.
+    """
     logger.debug("Diff data:\n%s" % data)
-    # convert to string as JSON may have unicode in it
-    return not file_data == data
+    if not os.path.exists(filename):
+        return data != ''
+    offset = 0
+    try:
+        with open(filename, 'r') as f:
+            while True:
+                block = f.read(_DIFF_BLOCK_SIZE)
+                if not block:
+                    return offset != len(data)
+                # JSON may have unicode in it, which compares fine with
+                # str as long as it is ASCII
+                if block != data[offset:offset + len(block)]:
+                    return True
+                offset += len(block)
+    except IOError:
+        logger.error("Error reading file: %s" % filename)
+        return data != ''
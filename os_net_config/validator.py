@@ -0,0 +1,420 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014-2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import bisect
+import logging
+
+import netaddr
+
+from os_net_config import objects
+from os_net_config import steering
+from os_net_config import utils
+
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_ROUTES = {4: '0.0.0.0/0', 6: '::/0'}
+_LINK_LOCAL_V6 = utils.ip_network('fe80::/10')
+
+
+def _ip_network(ip_netmask, what, dev):
+    try:
+        return utils.ip_network(ip_netmask)
+    except (netaddr.AddrFormatError, ValueError, TypeError):
+        msg = 'Invalid %s %s on %s' % (what, ip_netmask, dev)
+        raise objects.InvalidConfigException(msg)
+
+
+class ConfigValidator(object):
+    """Pre-flight checks across every address and route in a config.
+
+    Objects are added one at a time (members included) and only the
+    information needed for the checks is kept, so validation can run
+    alongside streaming config loading. All checks are done by sorting
+    the collected intervals, making validate() O(n log n).
+    """
+
+    def __init__(self):
+        self.addresses = []  # (version, first, last, ip, ip_netmask, dev)
+        # (version, first, last, table, metric, ip_netmask, dev)
+        self.routes = []
+        self.next_hops = []  # (version, ip, next_hop, dev)
+        self.dhcp_versions = set()
+
+    def add_object(self, obj):
+        """Collect the addresses and routes of an object and its members.
+
+        :param obj: The object to add, see objects.py.
+        """
+        if isinstance(obj, objects.VlanRange):
+            for vlan in obj.vlans():
+                self.add_object(vlan)
+        elif isinstance(obj, objects._BaseOpts):
+            if obj.use_dhcp:
+                self.dhcp_versions.add(4)
+            if obj.use_dhcpv6:
+                self.dhcp_versions.add(6)
+            for address in obj.addresses:
+                ip_nw = _ip_network(address.ip_netmask, 'address', obj.name)
+                self.addresses.append((ip_nw.version, ip_nw.first,
+                                       ip_nw.last, ip_nw.value,
+                                       address.ip_netmask, obj.name))
+            for route in obj.routes:
+                self._add_route(route, obj.name)
+        for member in getattr(obj, 'members', []):
+            self.add_object(member)
+
+    def _add_route(self, route, dev):
+        next_hops = []
+        for gateway in route.gateways():
+            try:
+                next_hops.append(netaddr.IPAddress(gateway))
+            except (netaddr.AddrFormatError, ValueError, TypeError):
+                msg = 'Invalid next_hop %s for route on %s' % (gateway, dev)
+                raise objects.InvalidConfigException(msg)
+        if route.default:
+            destination = _DEFAULT_ROUTES[next_hops[0].version]
+        else:
+            destination = route.ip_netmask
+        ip_nw = _ip_network(destination, 'route destination', dev)
+        if any(ip_nw.version != next_hop.version for next_hop in next_hops):
+            msg = ('Route %s on %s has a next_hop from a different address '
+                   'family' % (destination, dev))
+            raise objects.InvalidConfigException(msg)
+        metric = -1 if route.metric is None else route.metric
+        self.routes.append((ip_nw.version, ip_nw.first, ip_nw.last,
+                            str(route.table or 'main'), metric, destination,
+                            dev))
+        hop_devs = [hop.device or dev for hop in route.next_hops] or [dev]
+        for next_hop, gateway, hop_dev in zip(next_hops, route.gateways(),
+                                              hop_devs):
+            self.next_hops.append((next_hop.version, int(next_hop),
+                                   gateway, hop_dev))
+
+    def validate(self):
+        """Check the collected addresses and routes for conflicts.
+
+        :raises: objects.InvalidConfigException describing every
+            duplicate address, overlapping subnet, duplicate route or
+            unreachable next hop that was found.
+        """
+        errors = []
+        errors.extend(self._duplicate_addresses())
+        errors.extend(self._overlapping_subnets())
+        errors.extend(self._duplicate_routes())
+        errors.extend(self._unreachable_next_hops())
+        if errors:
+            raise objects.InvalidConfigException('\n'.join(errors))
+
+    def _duplicate_addresses(self):
+        errors = []
+        by_ip = sorted(self.addresses, key=lambda a: (a[0], a[3]))
+        for prev, cur in zip(by_ip, by_ip[1:]):
+            if prev[0] == cur[0] and prev[3] == cur[3]:
+                errors.append('Address %s on %s duplicates %s on %s' %
+                              (cur[4], cur[5], prev[4], prev[5]))
+        return errors
+
+    def _overlapping_subnets(self):
+        # CIDR blocks are either nested or disjoint, so keeping the
+        # enclosing block while sweeping in sorted order is enough.
+        errors = []
+        reported = set()
+        enclosing = None
+        for cur in sorted(self.addresses, key=lambda a: (a[0], a[1], -a[2])):
+            if (enclosing and enclosing[0] == cur[0] and
+                    cur[1] <= enclosing[2]):
+                pair = (enclosing[5], cur[5])
+                if enclosing[5] != cur[5] and pair not in reported:
+                    reported.add(pair)
+                    errors.append('Subnet of %s on %s overlaps %s on %s' %
+                                  (cur[4], cur[5], enclosing[4],
+                                   enclosing[5]))
+                if cur[2] <= enclosing[2]:
+                    continue
+            enclosing = cur
+        return errors
+
+    def _duplicate_routes(self):
+        errors = []
+        by_dest = sorted(self.routes)
+        for prev, cur in zip(by_dest, by_dest[1:]):
+            # routes in other tables or with other metrics can coexist
+            if prev[:5] == cur[:5]:
+                errors.append('Route %s on %s duplicates the route on %s' %
+                              (cur[5], cur[6], prev[6]))
+        return errors
+
+    def _unreachable_next_hops(self):
+        # Merge all configured subnets per address family into disjoint
+        # sorted intervals which can then be searched with bisect.
+        merged = {4: [], 6: []}
+        for version, first, last, _, _, _ in sorted(self.addresses):
+            intervals = merged[version]
+            if intervals and first <= intervals[-1][1]:
+                intervals[-1][1] = max(intervals[-1][1], last)
+            else:
+                intervals.append([first, last])
+        starts = dict((v, [i[0] for i in merged[v]]) for v in merged)
+
+        errors = []
+        for version, ip, next_hop, dev in self.next_hops:
+            if version in self.dhcp_versions:
+                # The next hop may be reachable through a leased subnet
+                continue
+            if (version == 6 and _LINK_LOCAL_V6.first <= ip <=
+                    _LINK_LOCAL_V6.last):
+                continue
+            index = bisect.bisect_right(starts[version], ip) - 1
+            if index < 0 or ip > merged[version][index][1]:
+                errors.append('Next hop %s for a route on %s is not in any '
+                              'configured subnet' % (next_hop, dev))
+        return errors
+
+
+def validate_objects(objs):
+    """Validate a list of objects, see ConfigValidator.
+
+    :param objs: The objects to validate.
+    :raises: objects.InvalidConfigException
+    """
+    validator = ConfigValidator()
+    for obj in objs:
+        validator.add_object(obj)
+    validator.validate()
+
+
+def _flatten(objs, container=None):
+    for obj in objs:
+        yield obj, container
+        for member in _flatten(getattr(obj, 'members', []), obj):
+            yield member
+
+
+class MtuInference(object):
+    """Infer the missing MTUs of a config and check they are consistent.
+
+    A VLAN needs its device (or the bridge it is a port of) to have an
+    MTU at least as large as its own, a device without an MTU gets the
+    largest MTU of its VLANs. The members of bonds and bridges, VLANs
+    aside, need an MTU at least as large as their container's and get it
+    when they have none.
+
+    Objects are added one at a time as the config is read and only the
+    MTUs and the edges they are inferred along are kept, so the objects
+    can be handed to the provider right away; see set_mtus for updating
+    them once the MTUs are known. The MTU of VLANs is never inferred.
+    """
+
+    def __init__(self):
+        self.mtus = {}  # device: MTU or None, VLANs aside
+        self.members = {}  # bond or bridge: members, VLANs aside
+        self.roots = []  # the top level devices, VLANs aside
+        self.vlans = []  # (VLAN, MTU, device) of the VLANs with an MTU
+
+    def add_object(self, obj, container=None):
+        """Collect the MTUs of an object and its members.
+
+        :param obj: The object to add, see objects.py.
+        :param container: The bond or bridge obj is a member of, if any.
+        """
+        if isinstance(obj, objects.VlanRange):
+            for vlan in obj.vlans():
+                self.add_object(vlan)
+        elif isinstance(obj, objects.Vlan):
+            if obj.mtu:
+                lower = obj.device or (container.name if container else None)
+                self.vlans.append((obj.name, obj.mtu, lower))
+        elif isinstance(obj, objects._BaseOpts):
+            self.mtus[obj.name] = obj.mtu
+            if container is None:
+                self.roots.append(obj.name)
+            members = getattr(obj, 'members', [])
+            if members:
+                self.members[obj.name] = [
+                    member.name for member in members
+                    if not isinstance(member, (objects.Vlan,
+                                               objects.VlanRange))]
+            for member in members:
+                self.add_object(member, obj)
+
+    def infer(self):
+        """Infer the missing MTUs.
+
+        :returns: a dict of device name: inferred MTU.
+        :raises: objects.InvalidConfigException listing every
+            inconsistency.
+        """
+        mtus = dict(self.mtus)
+        inferred = {}
+        errors = []
+
+        def require(name, mtu, reason):
+            if mtus[name] is None or (name in inferred and mtus[name] < mtu):
+                logger.info('%s: MTU %i inferred from %s' %
+                            (name, mtu, reason))
+                mtus[name] = inferred[name] = mtu
+            elif mtus[name] < mtu:
+                errors.append('%s has MTU %i, less than the %i of %s' %
+                              (name, mtus[name], mtu, reason))
+
+        # VLANs first, they can raise the MTU of bonds and bridges, which
+        # is then pushed down to their members
+        for name, mtu, lower in self.vlans:
+            if lower in mtus:
+                require(lower, mtu, name)
+
+        def push_down(name):
+            for member in self.members.get(name, []):
+                if mtus[name]:
+                    require(member, mtus[name], name)
+                push_down(member)
+        for name in self.roots:
+            push_down(name)
+
+        if errors:
+            raise objects.InvalidConfigException('\n'.join(errors))
+        return inferred
+
+
+def set_mtus(objs, mtus):
+    """Set the inferred MTUs of a config on its objects.
+
+    :param objs: The objects of the config, members are walked.
+    :param mtus: A dict of device name: MTU, see MtuInference.infer.
+    :returns: the list of the objects of objs which changed, themselves
+        or a member.
+    """
+    changed = []
+    for obj in objs:
+        found = False
+        for item, container in _flatten([obj]):
+            if (item.name in mtus and isinstance(item, objects._BaseOpts)
+                    and not isinstance(item, objects.Vlan)):
+                item.mtu = mtus[item.name]
+                found = True
+        if found:
+            changed.append(obj)
+    return changed
+
+
+def propagate_mtus(objs):
+    """Infer the missing MTUs of a list of objects, see MtuInference.
+
+    MTUs are inferred by setting the mtu attribute of the objects.
+
+    :param objs: The objects of the config, members are walked.
+    :raises: objects.InvalidConfigException listing every inconsistency.
+    """
+    inference = MtuInference()
+    for obj in objs:
+        inference.add_object(obj)
+    set_mtus(objs, inference.infer())
+
+
+def lacks_mtu(obj):
+    """Tell whether an object or a member is a device without an MTU.
+
+    Only such objects can get an inferred MTU, see set_mtus.
+    """
+    for item, container in _flatten([obj]):
+        if (isinstance(item, objects._BaseOpts) and
+                not isinstance(item, objects.Vlan) and item.mtu is None):
+            return True
+    return False
+
+
+class DpdkValidator(object):
+    """Check userspace bridges can serve the NUMA node of their DPDK ports.
+
+    The NIC of a DPDK port is only polled efficiently by PMD threads of
+    its own NUMA node, from hugepages of that node. For the bridges which
+    set them, pmd_cpus has to include a CPU of the node of each of their
+    DPDK ports, and socket_mem memory for that node. Ports whose PCI
+    address or NUMA node is unknown, e.g. when rendering the config of
+    another host, are not checked, nor are PMD cores against a node whose
+    CPUs are unknown.
+
+    Objects are added one at a time and only the PMD cores, the socket
+    memory and the PCI addresses of the DPDK ports of the bridges are
+    kept.
+    """
+
+    def __init__(self):
+        # (bridge, PMD CPUs or None, socket_mem or None,
+        #  [(DPDK port, PCI address or None)])
+        self.bridges = []
+
+    def add_object(self, obj):
+        """Collect the userspace bridges of an object and its members.
+
+        :param obj: The object to add, see objects.py.
+        """
+        for bridge, container in _flatten([obj]):
+            if not isinstance(bridge, objects.OvsUserBridge):
+                continue
+            pmd_cpus = None
+            if bridge.pmd_cpus:
+                pmd_cpus = set(steering.parse_cpu_list(bridge.pmd_cpus))
+            socket_mem = None
+            if bridge.socket_mem:
+                socket_mem = [int(mem)
+                              for mem in bridge.socket_mem.split(',')]
+            ports = [(port.name, port.pci_address or
+                      utils.get_pci_address(port.members[0].name))
+                     for port, port_container in _flatten(bridge.members)
+                     if isinstance(port, objects.OvsDpdkPort)]
+            self.bridges.append((bridge.name, pmd_cpus, socket_mem, ports))
+
+    def validate(self):
+        """Check the NUMA node of the collected DPDK ports.
+
+        :raises: objects.InvalidConfigException listing every port which
+            does not fit.
+        """
+        errors = []
+        for bridge, pmd_cpus, socket_mem, ports in self.bridges:
+            for port, pci_address in ports:
+                if not pci_address:
+                    continue
+                node = utils.get_pci_numa_node(pci_address)
+                if node is None:
+                    continue
+                node_cpulist = utils.get_numa_node_cpulist(node)
+                if pmd_cpus is not None and node_cpulist is not None:
+                    node_cpus = steering.parse_cpu_list(node_cpulist)
+                    if not pmd_cpus.intersection(node_cpus):
+                        errors.append('%s is on NUMA node %i, where %s has '
+                                      'no PMD core' % (port, node, bridge))
+                if socket_mem is not None and (node >= len(socket_mem) or
+                                               not socket_mem[node]):
+                    errors.append('%s is on NUMA node %i, where %s has no '
+                                  'DPDK socket memory' % (port, node, bridge))
+        if errors:
+            raise objects.InvalidConfigException('\n'.join(errors))
+
+
+def validate_dpdk(objs):
+    """Check the NUMA node of the DPDK ports of objects, see DpdkValidator.
+
+    :param objs: The objects of the config, members are walked.
+    :raises: objects.InvalidConfigException listing every port which does
+        not fit.
+    """
+    dpdk_validator = DpdkValidator()
+    for obj in objs:
+        dpdk_validator.add_object(obj)
+    dpdk_validator.validate()
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014-2015 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import socket
+import struct
+
+
+logger = logging.getLogger(__name__)
+
+# see inotify(7)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_INOTIFY_EVENT = struct.Struct('=iIII')
+
+# see rtnetlink(7)
+NETLINK_ROUTE = 0
+RTMGRP_LINK = 1
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+IFLA_IFNAME = 3
+_NLMSGHDR = struct.Struct('=IHHII')
+_IFINFOMSG = struct.Struct('=BxHiII')
+_RTATTR = struct.Struct('=HH')
+
+LINK_CHANGE = 'link'
+
+
+def _align(length):
+    return (length + 3) & ~3
+
+
+class Inotify(object):
+    """Minimal inotify(7) binding watching files through their directory.
+
+    Directories are watched rather than the files themselves, so files
+    replaced by a rename (as editors and config management tools do) keep
+    being watched.
+    """
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library('c') or 'libc.so.6'
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, 'inotify_init1: %s' % os.strerror(err))
+        self._dirs = {}
+
+    def add_file(self, filename):
+        """Watch a file for writes, creation, removal and replacement."""
+        dirname, basename = os.path.split(os.path.abspath(filename))
+        mask = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE |
+                IN_DELETE)
+        wd = self._libc.inotify_add_watch(self.fd, dirname.encode('utf-8'),
+                                          mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, 'inotify_add_watch %s: %s' %
+                          (dirname, os.strerror(err)))
+        self._dirs.setdefault(wd, (dirname, {}))[1][basename] = filename
+
+    def read(self):
+        """Return the set of watched files changed since the last read."""
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EINTR):
+                    break
+                raise
+            if not data:
+                break
+            offset = 0
+            while offset + _INOTIFY_EVENT.size <= len(data):
+                wd, mask, cookie, length = _INOTIFY_EVENT.unpack_from(
+                    data, offset)
+                offset += _INOTIFY_EVENT.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                files = self._dirs.get(wd, (None, {}))[1]
+                filename = files.get(name.decode('utf-8'))
+                if filename:
+                    changed.add(filename)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+def parse_link_messages(data):
+    """Parse rtnetlink messages and yield their link changes.
+
+    :param data: The raw data read from a NETLINK_ROUTE socket.
+    :returns: a generator of (RTM_NEWLINK or RTM_DELLINK, interface index,
+        interface name or None) tuples.
+    """
+    offset = 0
+    while offset + _NLMSGHDR.size <= len(data):
+        length, msg_type, flags, seq, pid = _NLMSGHDR.unpack_from(data,
+                                                                  offset)
+        if length < _NLMSGHDR.size:
+            break
+        if msg_type in (RTM_NEWLINK, RTM_DELLINK):
+            start = offset + _NLMSGHDR.size
+            family, if_type, index, if_flags, change = \
+                _IFINFOMSG.unpack_from(data, start)
+            name = None
+            attr = start + _IFINFOMSG.size
+            while attr + _RTATTR.size <= offset + length:
+                attr_len, attr_type = _RTATTR.unpack_from(data, attr)
+                if attr_len < _RTATTR.size:
+                    break
+                if attr_type == IFLA_IFNAME:
+                    value = data[attr + _RTATTR.size:attr + attr_len]
+                    name = value.rstrip(b'\0').decode('utf-8')
+                    break
+                attr += _align(attr_len)
+            yield (msg_type, index, name)
+        offset += _align(length)
+
+
+class LinkMonitor(object):
+    """Receive the link change notifications of the kernel."""
+
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW,
+                                  NETLINK_ROUTE)
+        self.sock.bind((0, RTMGRP_LINK))
+        self.sock.setblocking(False)
+        self.fd = self.sock.fileno()
+
+    def read(self):
+        """Return the list of link changes received since the last read."""
+        changes = []
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except socket.error as e:
+                if e.errno in (errno.EAGAIN, errno.EINTR):
+                    break
+                if e.errno == errno.ENOBUFS:
+                    # we missed messages, just report that links changed
+                    changes.append((RTM_NEWLINK, 0, None))
+                    continue
+                raise
+            if not data:
+                break
+            changes.extend(parse_link_messages(data))
+        return changes
+
+    def close(self):
+        self.sock.close()
+
+
+class Watcher(object):
+    """Wait for changes of config files and of the host's links.
+
+    Events are debounced: once something changed, the watcher keeps
+    collecting events until none arrived for debounce seconds, so that a
+    burst of events (an editor saving a file, a bond coming up) results
+    in a single change set. Waiting costs no CPU time.
+    """
+
+    def __init__(self, files, debounce=0.5, links=True):
+        self.debounce = debounce
+        self.inotify = Inotify()
+        for filename in files:
+            if filename:
+                self.inotify.add_file(filename)
+        self.link_monitor = LinkMonitor() if links else None
+        self.link_changes = []
+
+    def _fds(self):
+        fds = [self.inotify.fd]
+        if self.link_monitor:
+            fds.append(self.link_monitor.fd)
+        return fds
+
+    def _read(self, ready, changes):
+        if self.inotify.fd in ready:
+            changes.update(self.inotify.read())
+        if self.link_monitor and self.link_monitor.fd in ready:
+            link_changes = self.link_monitor.read()
+            if link_changes:
+                self.link_changes.extend(link_changes)
+                changes.add(LINK_CHANGE)
+
+    def drain(self):
+        """Discard the pending events, e.g. those caused by an apply."""
+        ready = select.select(self._fds(), [], [], 0)[0]
+        self._read(ready, set())
+        self.link_changes = []
+
+    def wait(self, timeout=None):
+        """Wait for changes.
+
+        :param timeout: The maximum number of seconds to wait for a first
+            event, forever if None.
+        :returns: a set of the changed file names, plus LINK_CHANGE if
+            links changed (see link_changes). Empty on timeout.
+        """
+        changes = set()
+        self.link_changes = []
+        ready = select.select(self._fds(), [], [], timeout)[0]
+        while ready:
+            self._read(ready, changes)
+            ready = select.select(self._fds(), [], [], self.debounce)[0]
+        if changes:
+            logger.info('Changes detected: %s' % ', '.join(sorted(changes)))
+        return changes
+
+    def events(self):
+        """Generate the sets of changes, see wait."""
+        while True:
+            changes = self.wait()
+            if changes:
+                yield changes
+
+    def close(self):
+        self.inotify.close()
+        if self.link_monitor:
+            self.link_monitor.close()